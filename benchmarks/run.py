@@ -0,0 +1,303 @@
+"""Benchmark core and the task processes on synthetic datasets"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, NamedTuple
+
+from .synthetic import Dataset, DatasetSpec, generate
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# Dataset sizes to run, smallest first.
+GRIDS = {
+    "quick": [
+        DatasetSpec(individuals=40, spartitions=5, subsets=8),
+    ],
+    "default": [
+        DatasetSpec(individuals=40, spartitions=5, subsets=8),
+        DatasetSpec(individuals=80, spartitions=10, subsets=16),
+        DatasetSpec(individuals=120, spartitions=10, subsets=24, localities=30),
+    ],
+    "large": [
+        DatasetSpec(individuals=200, spartitions=20, subsets=32, localities=40),
+        DatasetSpec(individuals=400, spartitions=20, subsets=48, localities=80),
+        DatasetSpec(individuals=800, spartitions=40, subsets=64, localities=160),
+    ],
+    # The sizes the scaling work targets. Only run when asked for: the last
+    # dataset alone is a SPART file of some 360 MB, which takes minutes to
+    # generate before any benchmark starts.
+    "huge": [
+        DatasetSpec(
+            individuals=5000, species=64, spartitions=100, subsets=250, localities=1000
+        ),
+        DatasetSpec(
+            individuals=20000,
+            species=256,
+            spartitions=500,
+            subsets=1000,
+            localities=4000,
+        ),
+    ],
+}
+
+# A benchmark counts as a regression once it is this much slower than the
+# baseline, relative and absolute, so that noise on quick ones is ignored.
+TOLERANCE = 0.25
+MIN_DELTA = 0.05
+
+
+class Regression(NamedTuple):
+    dataset: str
+    benchmark: str
+    baseline: float
+    seconds: float
+
+
+def time_call(setup: Callable[[], tuple], function: Callable, repeat: int) -> float:
+    """Best of several runs, each on fresh arguments from `setup`, which is
+    not timed. Whatever the function prints is discarded."""
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup()
+        with redirect_stdout(io.StringIO()):
+            ts = perf_counter()
+            function(*args)
+            tf = perf_counter()
+        best = min(best, tf - ts)
+    return best
+
+
+def benchmark_core(dataset: Dataset, repeat: int) -> dict[str, float]:
+    from itaxotools.spart_parser import Spart
+    from itaxotools.taxi2.sequences import SequenceHandler, Sequences
+
+    import core
+
+    latlons = core.read_latlons_from_tabfile(dataset.latlon_path)
+    morphometrics = core.read_morphometrics_from_tabfile(dataset.morphometrics_path)
+    sequences = [
+        Sequences.fromPath(path, SequenceHandler.Fasta)
+        for path in dataset.sequence_paths
+    ]
+
+    def fresh(*args):
+        return lambda: (Spart.fromXML(dataset.spart_path), *args)
+
+    def process_haplostats(spart, sequences):
+        for marker in sequences:
+            core.process_haplostats(spart, marker)
+
+    return {
+        "core.read_spart": time_call(
+            lambda: (dataset.spart_path,), Spart.fromXML, repeat
+        ),
+        "core.read_latlons_from_tabfile": time_call(
+            lambda: (dataset.latlon_path,), core.read_latlons_from_tabfile, repeat
+        ),
+        "core.read_morphometrics_from_tabfile": time_call(
+            lambda: (dataset.morphometrics_path,),
+            core.read_morphometrics_from_tabfile,
+            repeat,
+        ),
+        "core.process_polygons": time_call(
+            fresh(latlons), core.process_polygons, repeat
+        ),
+        "core.process_coocurrences": time_call(
+            fresh(latlons, 5.0), core.process_coocurrences, repeat
+        ),
+        "core.process_morphometrics_multiple": time_call(
+            fresh(morphometrics, 0.05), core.process_morphometrics_multiple, repeat
+        ),
+        "core.process_haplostats": time_call(
+            fresh(sequences), process_haplostats, repeat
+        ),
+    }
+
+
+def benchmark_tasks(dataset: Dataset, directory: Path, repeat: int) -> dict[str, float]:
+    """Each task on a single worker, chained the way they are used."""
+    from itaxotools.spart_parser import Spart
+
+    from cli import run_score
+    from tasks.profile import process as profile
+    from tasks.review import process as review
+    from tasks.review.types import SCORE_COLUMNS
+    from tasks.shuffle import process as shuffle
+    from tasks.visualize import process as visualize
+
+    concordances = directory / "concordances.xml"
+    scored = directory / "scored.xml"
+    spartitions = Spart.fromXML(dataset.spart_path).getSpartitions()
+    keys = [column.key for column in SCORE_COLUMNS if column.key is not None]
+
+    def run_profile():
+        profile.execute(
+            dataset.spart_path,
+            concordances,
+            dataset.latlon_path,
+            dataset.morphometrics_path,
+            dataset.sequence_paths,
+            5.0,
+            0.05,
+            False,
+            {},
+            cache_path=None,
+            workers=1,
+        )
+
+    def run_score_task():
+        run_score(
+            concordances,
+            scored,
+            weights={},
+            evidence_weights={},
+            evidence_behaviours={},
+            conspecific_path=None,
+            heterospecific_path=None,
+            workers=1,
+        )
+
+    def run_shuffle():
+        shuffle.execute(
+            dataset.spart_path,
+            directory / "reshuffled.xml",
+            spartitions,
+            len(spartitions),
+            2,
+            2,
+            2,
+            shuffle.BELL_SIGMA,
+            seed=0,
+            workers=1,
+        )
+
+    def run_review():
+        review.execute([scored], workers=1)
+
+    def run_export():
+        chosen = [(0, position) for position in range(len(spartitions))]
+        review.export([scored], directory / "reviewed.xml", chosen, keys)
+
+    nothing = tuple
+    return {
+        "profile.execute": time_call(nothing, run_profile, repeat),
+        "score.execute": time_call(nothing, run_score_task, repeat),
+        "shuffle.execute": time_call(nothing, run_shuffle, repeat),
+        "review.execute": time_call(nothing, run_review, repeat),
+        "review.export": time_call(nothing, run_export, repeat),
+        "visualize.execute": time_call(lambda: (scored,), visualize.execute, repeat),
+    }
+
+
+def run_grid(specs: list[DatasetSpec], repeat: int) -> dict[str, dict]:
+    datasets = {}
+    for spec in specs:
+        print(f"Dataset {spec.name}:", flush=True)
+        with TemporaryDirectory(prefix="benchmark_") as temp:
+            directory = Path(temp)
+            dataset = generate(spec, directory / "data")
+            timings = benchmark_core(dataset, repeat)
+            timings.update(benchmark_tasks(dataset, directory, repeat))
+        for name, seconds in timings.items():
+            print(f"  {name.ljust(40)} {seconds:>9.4f}s")
+        datasets[spec.name] = dict(spec=spec._asdict(), timings=timings)
+    return datasets
+
+
+def find_regressions(
+    datasets: dict[str, dict],
+    baseline: dict[str, dict],
+    tolerance: float,
+    min_delta: float,
+) -> list[Regression]:
+    """Benchmarks slower than in the baseline. Datasets or benchmarks the
+    baseline does not know about are skipped."""
+    regressions = []
+    for name, dataset in datasets.items():
+        reference = baseline.get(name, {}).get("timings", {})
+        for benchmark, seconds in dataset["timings"].items():
+            if benchmark not in reference:
+                continue
+            before = reference[benchmark]
+            if seconds > before * (1 + tolerance) and seconds - before > min_delta:
+                regressions.append(Regression(name, benchmark, before, seconds))
+    return regressions
+
+
+def run(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time core and the task processes on synthetic datasets."
+    )
+    parser.add_argument("--grid", choices=list(GRIDS), default="default")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="merge the results into the baseline instead of comparing",
+    )
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA)
+    args = parser.parse_args(argv)
+
+    results = dict(
+        grid=args.grid,
+        repeat=args.repeat,
+        machine=dict(
+            platform=platform.platform(),
+            python=platform.python_version(),
+            processors=os.cpu_count(),
+        ),
+        datasets=run_grid(GRIDS[args.grid], args.repeat),
+    )
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    baseline = {}
+    if args.baseline.exists():
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    if args.update_baseline:
+        datasets = baseline.get("datasets", {})
+        datasets.update(results["datasets"])
+        baseline = dict(results, grid=None, datasets=datasets)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2)
+            file.write("\n")
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"\nNo baseline to compare with: {args.baseline}")
+        return 0
+
+    regressions = find_regressions(
+        results["datasets"],
+        baseline["datasets"],
+        args.tolerance,
+        args.min_delta,
+    )
+    print()
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression.dataset} {regression.benchmark}: "
+            f"{regression.baseline:.4f}s -> {regression.seconds:.4f}s"
+        )
+    print(f"{len(regressions)} regressions against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
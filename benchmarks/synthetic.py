@@ -0,0 +1,208 @@
+"""Deterministic synthetic datasets for benchmarking"""
+
+import argparse
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+NUCLEOTIDES = np.array(list("ACGT"))
+
+# Fraction of sites where a haplotype differs from its species consensus.
+HAPLOTYPE_DIVERGENCE = 0.02
+
+# Spread of localities around their species center, in degrees.
+LOCALITY_SPREAD = 1.0
+
+
+class DatasetSpec(NamedTuple):
+    """Everything that shapes a dataset. The same spec always gives the
+    same files, byte for byte.
+
+    Individuals are split into `species` true groups, each with its own
+    localities, measurements and haplotypes. Spartitions range from two
+    subsets up to `subsets`, cutting preferably along species boundaries,
+    much like the output of a species delimitation program.
+    """
+
+    individuals: int = 100
+    species: int = 8
+    localities: int = 20
+    spartitions: int = 10
+    subsets: int = 16
+    characters: int = 4
+    markers: int = 2
+    haplotypes: int = 3
+    sequence_length: int = 100
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return (
+            f"n{self.individuals}_p{self.spartitions}_k{self.subsets}"
+            f"_c{self.characters}_m{self.markers}"
+        )
+
+
+class Dataset(NamedTuple):
+    spart_path: Path
+    latlon_path: Path
+    morphometrics_path: Path
+    sequence_paths: list[Path]
+
+
+def get_species(spec: DatasetSpec, rng: np.random.Generator) -> np.ndarray:
+    """Species of each individual, in contiguous blocks of random size."""
+    species = min(spec.species, spec.individuals)
+    cuts = rng.choice(np.arange(1, spec.individuals), species - 1, replace=False)
+    boundaries = np.zeros(spec.individuals, dtype=np.int64)
+    boundaries[cuts] = 1
+    return np.cumsum(boundaries)
+
+
+def get_localities(
+    spec: DatasetSpec, species: np.ndarray, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray]:
+    """Locality of each individual, and the coordinates of each locality.
+
+    Localities are dealt out to species in turn, so that with fewer
+    localities than species, several species share the same places.
+    """
+    species_count = species.max() + 1
+    centers = np.column_stack(
+        [
+            rng.uniform(-60.0, 60.0, species_count),
+            rng.uniform(-180.0, 180.0, species_count),
+        ]
+    )
+    owners = np.arange(spec.localities) % species_count
+    coords = centers[owners] + rng.normal(0.0, LOCALITY_SPREAD, (spec.localities, 2))
+
+    localities = np.empty(len(species), dtype=np.int64)
+    for index, group in enumerate(species):
+        owned = np.flatnonzero(owners == group)
+        if not len(owned):
+            owned = np.array([group % spec.localities])
+        localities[index] = rng.choice(owned)
+    return localities, coords
+
+
+def get_spartitions(
+    spec: DatasetSpec, species: np.ndarray, rng: np.random.Generator
+) -> list[list[list[int]]]:
+    """Subsets of each spartition, as lists of individual indices."""
+    boundaries = np.flatnonzero(np.diff(species)) + 1
+    others = np.setdiff1d(np.arange(1, spec.individuals), boundaries)
+    most = min(spec.subsets, spec.individuals)
+    counts = np.linspace(min(2, most), most, spec.spartitions).round().astype(int)
+
+    spartitions = []
+    for count in counts:
+        needed = count - 1
+        if needed <= len(boundaries):
+            cuts = rng.choice(boundaries, needed, replace=False)
+        else:
+            extra = rng.choice(others, needed - len(boundaries), replace=False)
+            cuts = np.concatenate([boundaries, extra])
+        edges = [0, *sorted(cuts.tolist()), spec.individuals]
+        spartitions.append(
+            [list(range(start, end)) for start, end in zip(edges, edges[1:])]
+        )
+    return spartitions
+
+
+def get_haplotypes(
+    spec: DatasetSpec, species_count: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Haplotypes per species for one marker, shaped (species, haplotypes, sites)."""
+    consensus = rng.integers(4, size=(species_count, 1, spec.sequence_length))
+    haplotypes = np.repeat(consensus, spec.haplotypes, axis=1)
+    mutated = rng.random(haplotypes.shape) < HAPLOTYPE_DIVERGENCE
+    haplotypes[mutated] = rng.integers(4, size=mutated.sum())
+    return haplotypes
+
+
+def generate(spec: DatasetSpec, directory: Path) -> Dataset:
+    """Write the dataset for the spec into the directory."""
+    from itaxotools.spart_parser import Spart
+    from tasks.shuffle.process import add_partition
+
+    rng = np.random.default_rng(spec.seed)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    width = len(str(spec.individuals))
+    ids = [f"ind_{index:0{width}}" for index in range(1, spec.individuals + 1)]
+
+    species = get_species(spec, rng)
+    species_count = species.max() + 1
+    localities, coords = get_localities(spec, species, rng)
+    latlons = coords[localities] + rng.normal(0.0, 0.01, (spec.individuals, 2))
+
+    spart = Spart()
+    spart.spartDict["project_name"] = spec.name
+    for id, locality, (lat, lon) in zip(ids, localities, latlons):
+        spart.addIndividual(
+            id, locality=f"loc_{locality + 1}", lat=f"{lat:.5f}", lon=f"{lon:.5f}"
+        )
+    for number, subsets in enumerate(get_spartitions(spec, species, rng), start=1):
+        add_partition(
+            spart,
+            f"{spec.name}_{number}",
+            [[ids[index] for index in subset] for subset in subsets],
+        )
+    spart_path = directory / f"{spec.name}.xml"
+    spart.toXML(spart_path)
+
+    latlon_path = directory / f"{spec.name}_latlons.tab"
+    with open(latlon_path, "w") as file:
+        file.write("id\tlat\tlon\n")
+        for id, (lat, lon) in zip(ids, latlons):
+            file.write(f"{id}\t{lat:.5f}\t{lon:.5f}\n")
+
+    means = rng.normal(100.0, 20.0, (species_count, spec.characters))
+    values = means[species] + rng.normal(0.0, 5.0, (spec.individuals, spec.characters))
+    morphometrics_path = directory / f"{spec.name}_morphometrics.tab"
+    with open(morphometrics_path, "w") as file:
+        headers = [f"character_{index}" for index in range(1, spec.characters + 1)]
+        file.write("\t".join(["id", *headers]) + "\n")
+        for id, row in zip(ids, values):
+            file.write("\t".join([id, *(f"{value:.3f}" for value in row)]) + "\n")
+
+    sequence_paths = []
+    for marker in range(1, spec.markers + 1):
+        haplotypes = get_haplotypes(spec, species_count, rng)
+        choices = rng.integers(spec.haplotypes, size=(spec.individuals, 2))
+        path = directory / f"{spec.name}_marker{marker}.fas"
+        with open(path, "w") as file:
+            for id, group, pair in zip(ids, species, choices):
+                for allele, choice in zip("ab", pair):
+                    sequence = "".join(NUCLEOTIDES[haplotypes[group, choice]])
+                    file.write(f">{id}_{allele}\n{sequence}\n")
+        sequence_paths.append(path)
+
+    return Dataset(spart_path, latlon_path, morphometrics_path, sequence_paths)
+
+
+def run(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic SPART dataset with matching evidence files."
+    )
+    parser.add_argument("directory", type=Path)
+    for field, default in DatasetSpec._field_defaults.items():
+        option = "--" + field.replace("_", "-")
+        parser.add_argument(option, type=int, default=default)
+    args = parser.parse_args(argv)
+
+    spec = DatasetSpec(**{field: getattr(args, field) for field in DatasetSpec._fields})
+    dataset = generate(spec, args.directory)
+    for path in [
+        dataset.spart_path,
+        dataset.latlon_path,
+        dataset.morphometrics_path,
+        *dataset.sequence_paths,
+    ]:
+        print(path)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,661 @@
+"""Command line entry point"""
+
+import argparse
+import glob
+import io
+import json
+import multiprocessing
+import sys
+import traceback
+from contextlib import redirect_stdout
+from pathlib import Path
+from time import perf_counter
+from typing import NamedTuple
+
+from tasks.common.process import (
+    pool_map,
+    resolve_workers,
+    with_profiling,
+    with_stages,
+)
+
+SPART_GLOBS = ["xml", "spart", "sqlite"]
+SEQUENCE_GLOBS = ["fa", "fas", "fasta"]
+
+# Appended to the input stem when no output name is given, as in the GUI.
+OUTPUT_SUFFIXES = {
+    "profile": "_concordances",
+    "score": "_scored",
+    "shuffle": "_reshuffled",
+    "review": "_reviewed",
+    "null": "_null",
+}
+
+
+class Job(NamedTuple):
+    task: str
+    input_path: Path
+    output_path: Path
+    options: dict[str, object]
+
+
+class JobResult(NamedTuple):
+    input_path: Path
+    output_path: Path
+    succeeded: bool
+    seconds_taken: float
+    log: str
+    error: str | None
+    stages: list[dict[str, object]]
+
+
+def expand_paths(patterns: list[str], globs: list[str]) -> list[Path]:
+    """Files are kept, directories are searched for the given extensions
+    and anything else is expanded as a glob pattern, like the file lists
+    of the GUI do. Each path appears once, in sorted order."""
+    all = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_file():
+            all.add(path)
+        elif path.is_dir():
+            for extension in globs:
+                all.update(path.glob(f"*.{extension}"))
+        else:
+            all.update(Path(match) for match in glob.glob(pattern, recursive=True))
+    return list(sorted(path for path in all if path.is_file()))
+
+
+def parse_weights(items: list[str]) -> dict[str, float]:
+    """Parse LABEL=WEIGHT pairs. Labels may themselves contain '='."""
+    weights = {}
+    for item in items:
+        label, sep, weight = item.rpartition("=")
+        if not sep or not label:
+            raise ValueError(f"Expected LABEL=WEIGHT, got: {repr(item)}")
+        weights[label] = float(weight)
+    return weights
+
+
+def read_constraints(path: Path | None, individuals: list[str]) -> list[list[str]]:
+    """Groups of individuals, one per line, with groups separated by blank
+    lines. Validated the same way as in the Score task."""
+    if path is None:
+        return []
+    names = set(individuals)
+    groups = []
+    group = set()
+    for line in (path.read_text() + "\n\n").splitlines():
+        name = line.strip()
+        if name:
+            if name not in names:
+                raise Exception(f"Individual not found: {repr(name)}")
+            if name in group:
+                raise Exception(
+                    f"Individual appears twice in the same group: {repr(name)}"
+                )
+            group.add(name)
+        elif group:
+            if len(group) < 2:
+                raise Exception("Groups must have at least two individuals")
+            groups.append(list(group))
+            group = set()
+    return groups
+
+
+def run_profile(input_path: Path, output_path: Path, **options):
+    from tasks.profile import process
+
+    return process.execute(
+        subset_path=input_path,
+        output_path=output_path,
+        asapy_mode=False,
+        asapy_options={},
+        **options,
+    )
+
+
+def run_score(
+    input_path: Path,
+    output_path: Path,
+    weights: dict[str, float],
+    evidence_weights: dict[str, float],
+    evidence_behaviours: dict[str, bool],
+    conspecific_path: Path | None,
+    heterospecific_path: Path | None,
+    **options,
+):
+    from tasks.score import process
+
+    concordance_data, individuals = process.open_spart(input_path)
+
+    # Same defaults as the Score task: boolean concordances weigh 1,
+    # the others are left out, and every evidence type counts fully.
+    concordance_weights = {
+        id: 1.0
+        for id, data in concordance_data.items()
+        if data["evidenceDiscriminationDataType"] == "Boolean"
+    }
+    concordance_weights.update(weights)
+    evidence_types = {data["evidenceType"] for data in concordance_data.values()}
+    evidence_types_weights = {dtype: 1.0 for dtype in evidence_types}
+    evidence_types_weights.update(evidence_weights)
+    evidence_types_behaviours = {dtype: True for dtype in evidence_types}
+    evidence_types_behaviours.update(evidence_behaviours)
+
+    return process.execute(
+        concordance_path=input_path,
+        output_path=output_path,
+        concordance_weights=concordance_weights,
+        evidence_types_weights=evidence_types_weights,
+        evidence_types_behaviours=evidence_types_behaviours,
+        conspecific_constraints=read_constraints(conspecific_path, individuals),
+        heterospecific_constraints=read_constraints(heterospecific_path, individuals),
+        **options,
+    )
+
+
+def run_shuffle(input_path: Path, output_path: Path, partitions: list[str], **options):
+    from itaxotools.spart_parser import Spart
+    from tasks.shuffle import process
+
+    if not partitions:
+        partitions = Spart.fromXML(input_path).getSpartitions()
+
+    return process.execute(
+        input_path=input_path,
+        output_path=output_path,
+        selected_partitions=partitions,
+        **options,
+    )
+
+
+def run_null(input_path: Path, output_path: Path, spartition: str | None, **options):
+    from itaxotools.spart_parser import Spart
+
+    import null
+
+    if spartition is None:
+        spartition = Spart.fromXML(input_path).getSpartitions()[0]
+
+    return null.execute(
+        input_path=input_path,
+        output_path=output_path,
+        spartition=spartition,
+        **options,
+    )
+
+
+def run_review(
+    input_path: Path,
+    output_path: Path,
+    sort: str | None,
+    descending: bool,
+    top: int,
+    columns: list[str],
+    filter: str | None,
+):
+    from tasks.review import process
+    from tasks.review.types import SCORE_COLUMNS
+
+    results = process.execute([input_path])
+    scores = results.scores
+
+    indices = range(len(scores.spartitions))
+    if sort is not None:
+        indices = scores.argsort(sort, descending).tolist()
+    if filter:
+        matches = process.ScoreFilter(filter)(scores)
+        indices = [index for index in indices if matches[index]]
+    order = [results.origins[index] for index in indices]
+    if top > 0:
+        order = order[:top]
+
+    keys = [
+        column.key
+        for column in SCORE_COLUMNS
+        if column.key is not None and (not columns or column.name in columns)
+    ]
+
+    return process.export([input_path], output_path, order, keys)
+
+
+def run_index(input_path: Path, output_path: Path):
+    from tasks.common.process import (
+        StageRecorder,
+        build_spart_index,
+        print_stages,
+        store_spart_index,
+    )
+    from tasks.common.store import is_store_path
+    from tasks.common.types import Results
+
+    if is_store_path(input_path):
+        raise ValueError(f"Stores need no index: {input_path.name}")
+
+    ts = perf_counter()
+    recorder = StageRecorder()
+
+    with recorder.stage("Index") as counters:
+        index = build_spart_index(input_path)
+        store_spart_index(input_path, index)
+        counters["spartitions"] = len(index.spartitions)
+
+    tf = perf_counter()
+
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return Results(output_path, tf - ts, stages)
+
+
+def run_convert(input_path: Path, output_path: Path):
+    from tasks.common.process import StageRecorder, print_stages
+    from tasks.common.store import read_spart, write_spart
+    from tasks.common.types import Results
+
+    ts = perf_counter()
+    recorder = StageRecorder()
+
+    with recorder.stage("Read") as counters:
+        spart = read_spart(input_path)
+        counters["spartitions"] = len(spart.getSpartitions())
+
+    with recorder.stage("Write") as counters:
+        rows = write_spart(spart, output_path)
+        if rows is not None:
+            counters["rows"] = rows
+
+    tf = perf_counter()
+
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return Results(output_path, tf - ts, stages)
+
+
+RUNNERS = {
+    "profile": run_profile,
+    "score": run_score,
+    "shuffle": run_shuffle,
+    "null": run_null,
+    "review": run_review,
+    "index": run_index,
+    "convert": run_convert,
+}
+
+
+def run_job(job: Job) -> JobResult:
+    """Run one task on one file, for use on a worker pool.
+
+    Whatever the task prints is captured, so that logs of jobs running
+    side by side are not interleaved. Setting CONCORDANCE_PROFILE_DIR
+    profiles each job, and CONCORDANCE_STAGES_DIR dumps its stages, the
+    same as in the GUI. Failures are recorded,
+    not raised, so that one bad file does not stop the batch.
+    """
+    log = io.StringIO()
+    ts = perf_counter()
+    error = None
+    stages = ()
+    try:
+        with redirect_stdout(log):
+            runner = with_profiling(with_stages(RUNNERS[job.task]))
+            results = runner(job.input_path, job.output_path, **job.options)
+        stages = results.stages
+    except Exception:
+        error = traceback.format_exc()
+    tf = perf_counter()
+    return JobResult(
+        job.input_path,
+        job.output_path,
+        error is None,
+        tf - ts,
+        log.getvalue(),
+        error,
+        [stats._asdict() for stats in stages],
+    )
+
+
+def get_output_path(input_path: Path, task: str, output_dir: Path | None) -> Path:
+    if task == "index":
+        from tasks.common.process import get_spart_index_path
+
+        # Indexes are only ever looked for next to their file.
+        return get_spart_index_path(input_path)
+    if task == "convert":
+        from tasks.common.store import is_store_path
+
+        suffix = ".xml" if is_store_path(input_path) else ".sqlite"
+        output_path = input_path.with_suffix(suffix)
+    elif task == "null":
+        # The null distribution is a table, not a SPART file.
+        output_path = input_path.with_name(
+            input_path.stem + OUTPUT_SUFFIXES[task] + ".tsv"
+        )
+    else:
+        output_path = input_path.with_stem(input_path.stem + OUTPUT_SUFFIXES[task])
+    if output_dir is not None:
+        output_path = output_dir / output_path.name
+    return output_path
+
+
+def get_options(args: argparse.Namespace, workers: int) -> dict[str, object]:
+    """Task keyword arguments, other than the input and output paths."""
+    if args.task == "profile":
+        from tasks.profile.process import EVIDENCE_CACHE_PATH
+
+        cache_path = args.cache_dir or EVIDENCE_CACHE_PATH
+        return dict(
+            coord_path=args.coords,
+            morphometrics_path=args.morphometrics,
+            sequence_paths=expand_paths(args.sequences, SEQUENCE_GLOBS),
+            co_ocurrence_threshold=args.co_ocurrence_threshold,
+            morphometrics_threshold=args.morphometrics_threshold,
+            cache_path=None if args.no_cache else cache_path,
+            workers=workers,
+            columnar_format=args.columnar,
+        )
+    if args.task == "score":
+        from tasks.score.types import BootstrapMode
+
+        modes = {mode.key: mode for mode in BootstrapMode}
+        return dict(
+            weights=parse_weights(args.weight),
+            evidence_weights=parse_weights(args.evidence_weight),
+            evidence_behaviours={dtype: False for dtype in args.no_member_weighting},
+            conspecific_path=args.conspecific,
+            heterospecific_path=args.heterospecific,
+            bootstrap_mode=modes[args.bootstrap],
+            bootstrap_replicates=args.replicates,
+            bootstrap_seed=args.seed,
+            workers=workers,
+            columnar_format=args.columnar,
+        )
+    if args.task == "shuffle":
+        return dict(
+            partitions=args.partition,
+            add_partitions=args.add,
+            merge_count=args.merges,
+            split_count=args.splits,
+            swap_count=args.swaps,
+            spread=args.spread,
+            seed=args.seed,
+            workers=workers,
+        )
+    if args.task == "null":
+        return dict(
+            spartition=args.spartition,
+            coord_path=args.coords,
+            morphometrics_path=args.morphometrics,
+            sequence_paths=expand_paths(args.sequences, SEQUENCE_GLOBS),
+            co_ocurrence_threshold=args.co_ocurrence_threshold,
+            morphometrics_threshold=args.morphometrics_threshold,
+            null_partitions=args.null,
+            merge_count=args.merges,
+            split_count=args.splits,
+            swap_count=args.swaps,
+            spread=args.spread,
+            seed=args.seed,
+            batch_size=args.batch_size,
+            workers=workers,
+        )
+    if args.task == "review":
+        return dict(
+            sort=args.sort,
+            descending=args.descending,
+            top=args.top,
+            columns=args.columns,
+            filter=args.filter,
+        )
+    if args.task in ["index", "convert"]:
+        return {}
+    raise ValueError(args.task)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    from tasks.common.columnar import COLUMNAR_FORMATS
+    from tasks.review.types import SCORE_COLUMNS
+    from tasks.score.types import BootstrapMode
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "inputs",
+        nargs="+",
+        help="SPART files or stores, directories or glob patterns",
+    )
+    common.add_argument(
+        "-o",
+        "--output-dir",
+        type=Path,
+        help="where to write results, next to each input by default",
+    )
+    common.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=0,
+        help="files processed at once, or 0 for one per processor",
+    )
+    common.add_argument(
+        "-s",
+        "--summary",
+        type=Path,
+        help="write a JSON run summary to this file",
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Run concordance tasks on SPART files without the GUI."
+    )
+    subparsers = parser.add_subparsers(dest="task", required=True)
+
+    profile = subparsers.add_parser(
+        "profile", parents=[common], help="add evidence concordances"
+    )
+    profile.add_argument("--coords", type=Path, help="coordinates file")
+    profile.add_argument("--morphometrics", type=Path, help="morphometrics file")
+    profile.add_argument(
+        "--sequences",
+        nargs="+",
+        default=[],
+        help="sequence files, directories or glob patterns",
+    )
+    profile.add_argument("--co-ocurrence-threshold", type=float, default=5.0)
+    profile.add_argument("--morphometrics-threshold", type=float, default=0.05)
+    profile.add_argument("--cache-dir", type=Path, help="evidence cache location")
+    profile.add_argument(
+        "--no-cache", action="store_true", help="do not use the evidence cache"
+    )
+    profile.add_argument(
+        "--columnar",
+        choices=list(COLUMNAR_FORMATS),
+        help="also write the limits and scores as columnar files in this format",
+    )
+
+    score = subparsers.add_parser(
+        "score", parents=[common], help="calculate concordance scores"
+    )
+    score.add_argument(
+        "--weight",
+        action="append",
+        default=[],
+        metavar="LABEL=WEIGHT",
+        help="concordance weight, boolean ones weigh 1 by default",
+    )
+    score.add_argument(
+        "--evidence-weight",
+        action="append",
+        default=[],
+        metavar="TYPE=WEIGHT",
+        help="evidence type weight, 1 by default",
+    )
+    score.add_argument(
+        "--no-member-weighting",
+        action="append",
+        default=[],
+        metavar="TYPE",
+        help="do not weigh this evidence type by its member count",
+    )
+    score.add_argument("--conspecific", type=Path, help="conspecific groups file")
+    score.add_argument("--heterospecific", type=Path, help="heterospecific groups file")
+    score.add_argument(
+        "--bootstrap",
+        choices=[mode.key for mode in BootstrapMode],
+        default=BootstrapMode.Off.key,
+    )
+    score.add_argument("--replicates", type=int, default=1000)
+    score.add_argument("--seed", type=int, default=-1, help="-1 for a random seed")
+    score.add_argument(
+        "--columnar",
+        choices=list(COLUMNAR_FORMATS),
+        help="also write the limits and scores as columnar files in this format",
+    )
+
+    shuffle = subparsers.add_parser(
+        "shuffle", parents=[common], help="generate reshuffled partitions"
+    )
+    shuffle.add_argument(
+        "--partition",
+        action="append",
+        default=[],
+        help="base partition, all of them by default",
+    )
+    shuffle.add_argument("--add", type=int, required=True, help="new partitions")
+    shuffle.add_argument("--merges", type=int, default=0)
+    shuffle.add_argument("--splits", type=int, default=0)
+    shuffle.add_argument("--swaps", type=int, default=0)
+    shuffle.add_argument("--spread", type=float, default=0.6)
+    shuffle.add_argument("--seed", type=int, default=-1, help="-1 for a random seed")
+
+    null = subparsers.add_parser(
+        "null",
+        parents=[common],
+        help="score reshuffled partitions against the observed one",
+    )
+    null.add_argument("--spartition", help="observed spartition, the first by default")
+    null.add_argument("--coords", type=Path, help="coordinates file")
+    null.add_argument("--morphometrics", type=Path, help="morphometrics file")
+    null.add_argument(
+        "--sequences",
+        nargs="+",
+        default=[],
+        help="sequence files, directories or glob patterns",
+    )
+    null.add_argument("--co-ocurrence-threshold", type=float, default=5.0)
+    null.add_argument("--morphometrics-threshold", type=float, default=0.05)
+    null.add_argument("--null", type=int, required=True, help="null partitions")
+    null.add_argument("--merges", type=int, default=0)
+    null.add_argument("--splits", type=int, default=0)
+    null.add_argument("--swaps", type=int, default=0)
+    null.add_argument("--spread", type=float, default=0.6)
+    null.add_argument("--seed", type=int, default=-1, help="-1 for a random seed")
+    null.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="null partitions profiled together on a worker",
+    )
+
+    names = [column.name for column in SCORE_COLUMNS]
+    review = subparsers.add_parser(
+        "review", parents=[common], help="export sorted spartitions and scores"
+    )
+    review.add_argument("--sort", choices=names, help="score to order by")
+    review.add_argument("--descending", action="store_true")
+    review.add_argument("--top", type=int, default=0, help="keep this many, 0 for all")
+    review.add_argument(
+        "--columns",
+        nargs="+",
+        choices=names,
+        default=[],
+        help="scores to keep, all of them by default",
+    )
+    review.add_argument(
+        "--filter",
+        help="keep only spartitions matching this expression over the scores, "
+        "such as 'BayesPP > 0.05 and Nsub between 5 and 12'",
+    )
+
+    subparsers.add_parser(
+        "index",
+        parents=[common],
+        help="index spartitions for fast access, written next to each input",
+    )
+
+    subparsers.add_parser(
+        "convert",
+        parents=[common],
+        help="copy SPART files into SQLite stores, and stores back into SPART",
+    )
+
+    return parser
+
+
+def run(argv: list[str] | None = None) -> int:
+    """
+    Run a task over every input file and report how each one went.
+    Files are processed side by side, each on a single worker; a lone
+    file gets all workers to itself instead.
+    """
+    args = get_parser().parse_args(argv)
+
+    inputs = expand_paths(args.inputs, SPART_GLOBS)
+    if not inputs:
+        print("No input files found.", file=sys.stderr)
+        return 2
+    if args.output_dir is not None:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    workers = min(resolve_workers(args.workers), len(inputs))
+    options = get_options(args, 1 if workers > 1 else args.workers)
+    jobs = [
+        Job(args.task, path, get_output_path(path, args.task, args.output_dir), options)
+        for path in inputs
+    ]
+
+    print(f"Running {args.task} on {len(jobs)} files with {workers} workers")
+
+    ts = perf_counter()
+    results = pool_map(run_job, jobs, workers)
+    tf = perf_counter()
+
+    for result in results:
+        status = "done" if result.succeeded else "FAILED"
+        print(f"\n{result.input_path}: {status} in {result.seconds_taken:.2f}s")
+        if result.log:
+            print(result.log, end="")
+        if result.error:
+            print(result.error, end="", file=sys.stderr)
+
+    failed = [result for result in results if not result.succeeded]
+    print(f"\n{len(results) - len(failed)} done, {len(failed)} failed")
+    print(f"Time taken: {tf - ts:.2f}s")
+
+    if args.summary is not None:
+        summary = dict(
+            task=args.task,
+            workers=workers,
+            seconds_taken=tf - ts,
+            succeeded=len(results) - len(failed),
+            failed=len(failed),
+            jobs=[
+                dict(
+                    input_path=str(result.input_path),
+                    output_path=str(result.output_path),
+                    succeeded=result.succeeded,
+                    seconds_taken=result.seconds_taken,
+                    error=result.error,
+                    stages=result.stages,
+                )
+                for result in results
+            ],
+        )
+        with open(args.summary, "w") as file:
+            json.dump(summary, file, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(run())
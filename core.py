@@ -35,7 +35,9 @@ def read_latlons_from_tabfile(path: Path) -> dict[str, tuple[float, float]]:
         return {id: (lat, lon) for id, lat, lon in file}
 
 
-def process_polygons(spart: Spart, latlons: dict[str, tuple[float, float]]):
+def process_polygons(spart: Spart, latlons: dict[str, tuple[float, float]]) -> int:
+    """Returns the number of subset pairs evaluated"""
+    pairs = 0
     for spartition in spart.getSpartitions():
         hulls = {}
         numbers = {}
@@ -62,6 +64,7 @@ def process_polygons(spart: Spart, latlons: dict[str, tuple[float, float]]):
         spart.addConcordance(spartition, "polygon overlap bool", **kwargs)
 
         for subset_a, subset_b in combinations(hulls.keys(), 2):
+            pairs += 1
             hull_a = hulls[subset_a]
             hull_b = hulls[subset_b]
             overlap = hull_a.intersection(hull_b)
@@ -88,10 +91,14 @@ def process_polygons(spart: Spart, latlons: dict[str, tuple[float, float]]):
                 concordanceSupport=bool(area),
             )
 
+    return pairs
+
 
 def process_coocurrences(
     spart: Spart, latlons: dict[str, tuple[float, float]], threshold_kilometers: float
-):
+) -> int:
+    """Returns the number of subset pairs evaluated"""
+    pairs = 0
     for spartition in spart.getSpartitions():
         points = {}
         numbers = {}
@@ -125,6 +132,7 @@ def process_coocurrences(
         for subset_a, subset_b in combinations(
             spart.getSpartitionSubsets(spartition), 2
         ):
+            pairs += 1
             points_a = points[subset_a]
             points_b = points[subset_b]
 
@@ -153,6 +161,8 @@ def process_coocurrences(
                 concordanceSupport=bool(min_distance <= threshold_kilometers),
             )
 
+    return pairs
+
 
 def is_id_allele_of_individual(id: str, individual: str) -> bool:
     if not id.startswith(individual):
@@ -162,7 +172,9 @@ def is_id_allele_of_individual(id: str, individual: str) -> bool:
     return True
 
 
-def process_haplostats(spart: Spart, sequences: Sequences, label: str = ""):
+def process_haplostats(spart: Spart, sequences: Sequences, label: str = "") -> int:
+    """Returns the number of subset pairs evaluated"""
+    pairs = 0
     for spartition in spart.getSpartitions():
         stats = HaploStats()
         stats.set_subset_labels(
@@ -203,6 +215,7 @@ def process_haplostats(spart: Spart, sequences: Sequences, label: str = ""):
 
         data = stats.get_haplotypes_shared_between_subsets(include_empty=True)
         for chunk in data:
+            pairs += 1
             subset_a: str = chunk["subset_a"]
             subset_b: str = chunk["subset_b"]
             common: dict[str, int] = chunk["common"]
@@ -241,6 +254,8 @@ def process_haplostats(spart: Spart, sequences: Sequences, label: str = ""):
                 concordanceSupport=not bool(common),
             )
 
+    return pairs
+
 
 def read_morphometrics_from_tabfile(path: Path) -> dict[str, dict[str, float]]:
     data: dict[str, dict[str, float]] = defaultdict(dict)
@@ -264,7 +279,9 @@ def process_morphometrics(
     label: str,
     individual_data: dict[str, float],
     alpha: float | None = None,
-):
+) -> int:
+    """Returns the number of subset pairs tested"""
+    pairs = 0
     for spartition in spart.getSpartitions():
         subset_data = defaultdict(list)
         numbers = {}
@@ -326,6 +343,7 @@ def process_morphometrics(
             if len(subset_data[subset_b]) < 2:
                 continue
 
+            pairs += 1
             u, p = mannwhitneyu(
                 subset_data[subset_a], subset_data[subset_b], alternative="two-sided"
             )
@@ -379,12 +397,16 @@ def process_morphometrics(
                 concordanceSupport=g,
             )
 
+    return pairs
+
 
 def process_morphometrics_multiple(
     spart: Spart, data: dict[str, dict], alpha: float = None
-):
-    for header in data:
-        process_morphometrics(spart, header, data[header], alpha)
+) -> int:
+    """Returns the number of subset pairs tested, over all measurements"""
+    return sum(
+        process_morphometrics(spart, header, data[header], alpha) for header in data
+    )
 
 
 def main():
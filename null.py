@@ -0,0 +1,300 @@
+"""In-memory null distributions of the partition scores.
+
+Perturbs one spartition with the Shuffle operations, profiles every perturbed
+partition with the evidence functions of core, in the same stages as Profile,
+and scores them like Score does, without writing any intermediate SPART file.
+Null partitions are generated, profiled and scored in batches, each batch
+held in a Spart of its own on a worker.
+"""
+
+import math
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+from itaxotools.spart_parser import Spart
+from itaxotools.taxi2.handlers import FileHandler
+
+from tasks.common.process import StageRecorder, pool_map, print_stages
+from tasks.common.types import Results
+from tasks.profile.process import (
+    compute_stage,
+    get_stages,
+    reduce_spart,
+    write_stage_result,
+)
+from tasks.profile.types import StageInput
+from tasks.score.process import read_spartition_limits, score_spartition
+from tasks.shuffle.process import (
+    BELL_SIGMA,
+    Partition,
+    add_partition,
+    apply_recipe,
+    plan_new_partitions,
+)
+
+# Null partitions generated and scored together on a worker. Every batch
+# reads the evidence files once per stage, so larger batches read less.
+BATCH_SIZE = 256
+
+
+def get_subsets(partition: Partition) -> list[list[str]]:
+    return [
+        [partition.individuals[i] for i in members] for members in partition.members()
+    ]
+
+
+def profile_partitions(
+    individuals: list[str],
+    partitions: list[tuple[str, list[list[str]]]],
+    stages: list[StageInput],
+) -> Spart:
+    """A Spart holding the partitions, given by label and subsets, with the
+    concordances of every evidence stage added, as Profile adds them."""
+    spart = Spart()
+    spart.spartDict["individuals"] = {individual: {} for individual in individuals}
+    for label, subsets in partitions:
+        add_partition(spart, label, subsets)
+
+    labels = spart.getSpartitions()
+    for stage in stages:
+        results, _ = compute_stage((stage, reduce_spart(spart, labels)))
+        for label in labels:
+            write_stage_result(spart, label, results[label])
+    return spart
+
+
+def get_default_weights(
+    spart: Spart, spartition: str
+) -> tuple[dict[str, float], set[str]]:
+    """The concordances Score weighs by default for a profiled spartition,
+    which are the Boolean ones, and the evidence types of all concordances."""
+    weights = {}
+    evidence_types = set()
+    for concordance in spart.getSpartitionConcordances(spartition):
+        data = spart.getConcordanceData(spartition, concordance)
+        if data["evidenceDiscriminationDataType"] == "Boolean":
+            weights[concordance] = 1.0
+        evidence_types.add(data["evidenceType"])
+    return weights, evidence_types
+
+
+def score_batch(
+    job: tuple[list[dict[str, int]], list[np.random.SeedSequence]],
+    base: Partition,
+    individuals: list[str],
+    stages: list[StageInput],
+    **kwargs,
+) -> list[tuple[int, dict[str, float], float | None] | None]:
+    """Generate, profile and score one batch of null partitions, for use on
+    a pool.
+
+    Only the scores leave the worker. Partitions with a single subset cannot
+    be scored and come back as None.
+    """
+    partitions = {}
+    for index, (recipe, seed) in enumerate(zip(*job)):
+        partition = apply_recipe(base, recipe, np.random.default_rng(seed))
+        subsets = get_subsets(partition)
+        if len(subsets) >= 2:
+            partitions[index] = (f"null_{index + 1}", subsets)
+
+    spart = profile_partitions(individuals, list(partitions.values()), stages)
+
+    rows = []
+    for index in range(len(job[0])):
+        if index not in partitions:
+            rows.append(None)
+            continue
+        label, subsets = partitions[index]
+        limits = read_spartition_limits(spart, label, kwargs["concordance_weights"])
+        data, log_posterior = score_spartition(limits, **kwargs)
+        rows.append((len(subsets), data, log_posterior))
+    return rows
+
+
+def get_quantile(observed: float, values: np.ndarray) -> float:
+    """Share of the null values below the observed one, counting ties as half."""
+    below = np.count_nonzero(values < observed)
+    equal = np.count_nonzero(values == observed)
+    return float((below + 0.5 * equal) / len(values))
+
+
+def execute(
+    input_path: Path,
+    output_path: Path,
+    spartition: str,
+    coord_path: Path | None,
+    morphometrics_path: Path | None,
+    sequence_paths: list[Path],
+    co_ocurrence_threshold: float,
+    morphometrics_threshold: float,
+    null_partitions: int,
+    merge_count: int,
+    split_count: int,
+    swap_count: int,
+    spread: float = BELL_SIGMA,
+    seed: int = -1,
+    concordance_weights: dict[str, float] | None = None,
+    evidence_types_weights: dict[str, float] | None = None,
+    evidence_types_behaviours: dict[str, bool] | None = None,
+    batch_size: int = BATCH_SIZE,
+    workers: int = 0,
+) -> Results:
+    """Score `null_partitions` perturbations of a spartition against its own score.
+
+    Evidence inputs and thresholds are those of Profile, operation totals
+    and spread those of Shuffle, and weights those of Score, defaulting to
+    1 for every Boolean concordance and evidence type, as Score does. Writes the null distribution
+    to `output_path`, one row per null partition, and the observed scores
+    with their empirical quantiles next to it, with a "_summary" suffix.
+
+    When the operation totals add up to fewer than `null_partitions`, some
+    partitions get no operation at all. Those would be copies of the observed
+    spartition, so they are left out of the distribution and counted.
+    """
+    ts = perf_counter()
+    recorder = StageRecorder()
+
+    with recorder.stage("Read"):
+        spart = Spart.fromXML(input_path)
+        individuals = spart.getIndividuals()
+        base = Partition.from_subsets(
+            [
+                list(spart.getSubsetIndividuals(spartition, subset))
+                for subset in spart.getSpartitionSubsets(spartition)
+            ]
+        )
+    N = len(individuals)
+
+    stages = get_stages(
+        coord_path,
+        morphometrics_path,
+        sequence_paths,
+        co_ocurrence_threshold,
+        morphometrics_threshold,
+    )
+
+    # The observed spartition is profiled the same way as the null ones, so
+    # that both are scored against evidence computed alike.
+    with recorder.stage("Observed"):
+        profiled = profile_partitions(
+            individuals, [(spartition, get_subsets(base))], stages
+        )
+    default_weights, evidence_types = get_default_weights(profiled, spartition)
+    if concordance_weights is None:
+        concordance_weights = default_weights
+    if evidence_types_weights is None:
+        evidence_types_weights = {
+            evidence_type: 1.0 for evidence_type in evidence_types
+        }
+    if evidence_types_behaviours is None:
+        evidence_types_behaviours = {
+            evidence_type: True for evidence_type in evidence_types
+        }
+    score_kwargs = dict(
+        N=N,
+        concordance_weights=concordance_weights,
+        evidence_types_weights=evidence_types_weights,
+        evidence_types_behaviours=evidence_types_behaviours,
+    )
+
+    print(f"Spart file: {input_path.name}")
+    print(f"Spartition: {spartition}")
+    print(f"Concordances: {[label for label in concordance_weights]}")
+    print(f"Null partitions: {null_partitions}")
+    print(f"Seed: {seed if seed >= 0 else 'random'}")
+    print()
+
+    observed_limits = read_spartition_limits(profiled, spartition, concordance_weights)
+    observed, observed_log_posterior = score_spartition(observed_limits, **score_kwargs)
+
+    root = np.random.SeedSequence(None if seed < 0 else seed)
+    planning, *streams = root.spawn(null_partitions + 1)
+    _, recipes = plan_new_partitions(
+        null_partitions,
+        {"split": split_count, "merge": merge_count, "swap": swap_count},
+        np.random.default_rng(planning),
+        spread,
+    )
+    # With fewer operations than null partitions, some recipes are left
+    # empty, and would only reproduce the observed spartition.
+    planned = [(recipe, stream) for recipe, stream in zip(recipes, streams) if recipe]
+    recipes = [recipe for recipe, _ in planned]
+    streams = [stream for _, stream in planned]
+    empty = null_partitions - len(planned)
+    jobs = [
+        (recipes[start : start + batch_size], streams[start : start + batch_size])
+        for start in range(0, len(planned), batch_size)
+    ]
+    with recorder.stage("Null") as counters:
+        batches = pool_map(
+            partial(
+                score_batch,
+                base=base,
+                individuals=individuals,
+                stages=stages,
+                **score_kwargs,
+            ),
+            jobs,
+            workers,
+        )
+        counters["batches"] = len(jobs)
+    rows = [row for batch in batches for row in batch]
+    scored = [(recipe, row) for recipe, row in zip(recipes, rows) if row is not None]
+    print(f"Scored null partitions: {len(scored)}")
+    if empty:
+        print(f"Skipped without operations: {empty}")
+    if len(scored) < len(rows):
+        print(f"Skipped with a single subset: {len(rows) - len(scored)}")
+    print()
+
+    # BayesPP is normalized over the observed and all null partitions.
+    log_posteriors = [observed_log_posterior] + [row[2] for _, row in scored]
+    defined = [value for value in log_posteriors if value is not None]
+    if defined:
+        top = max(defined)
+        denom = sum(math.exp(value - top) for value in defined)
+        for data, value in zip(
+            [observed] + [row[1] for _, row in scored], log_posteriors
+        ):
+            if value is not None:
+                data["BayesPP"] = math.exp(value - top) / denom
+
+    keys = list(observed)
+    for _, (_, data, _) in scored:
+        keys.extend(key for key in data if key not in keys)
+
+    operations = ["merge", "split", "swap"]
+    with FileHandler.Tabfile(
+        output_path, "w", columns=["partition", *operations, "subsets", *keys]
+    ) as file:
+        for number, (recipe, (subset_count, data, _)) in enumerate(scored, start=1):
+            file.write(
+                [str(number)]
+                + [str(recipe.get(name, 0)) for name in operations]
+                + [str(subset_count)]
+                + [str(data.get(key, "")) for key in keys]
+            )
+
+    summary_path = output_path.with_stem(output_path.stem + "_summary")
+    with FileHandler.Tabfile(
+        summary_path, "w", columns=["score", "observed", "null_count", "quantile"]
+    ) as file:
+        for key in keys:
+            values = np.array(
+                [data[key] for _, (_, data, _) in scored if key in data], dtype=float
+            )
+            if key not in observed or not len(values):
+                continue
+            quantile = get_quantile(observed[key], values)
+            print(f"{key}: observed {observed[key]:.6g}, quantile {quantile:.4f}")
+            file.write([key, str(observed[key]), str(len(values)), str(quantile)])
+
+    tf = perf_counter()
+
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return Results(output_path, tf - ts, stages)
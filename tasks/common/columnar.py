@@ -0,0 +1,190 @@
+"""Concordant limits and spartition scores as columnar files, for analysis
+with pandas and the like, without going through a SPART parser.
+
+Files are either Arrow IPC, which can be memory-mapped, or Parquet. Both
+need pyarrow, which is optional, since nothing else in the program uses it.
+"""
+
+import os
+from pathlib import Path
+
+# Output format by key, with the suffix of its files.
+COLUMNAR_FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# Appended to the stem of the SPART output for each columnar file.
+LIMITS_SUFFIX = "_limits"
+SCORES_SUFFIX = "_scores"
+
+# Limits are written in batches of at least this many rows, a concordance
+# at a time, each its own row group, so that memory stays flat however many
+# limits there are.
+BATCH_ROWS = 65536
+
+# Limit columns holding labels, which repeat a lot and are dictionary-encoded.
+LIMIT_LABELS = ["spartition", "concordance", "evidence_type", "subset_a", "subset_b"]
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as exception:
+        raise ImportError(
+            "Columnar export needs pyarrow, which is not installed"
+        ) from exception
+    return pyarrow
+
+
+def get_columnar_paths(output_path: Path, format: str) -> tuple[Path, Path]:
+    """Where the limits and the scores go, next to the SPART output."""
+    suffix = COLUMNAR_FORMATS[format]
+    return (
+        output_path.with_name(output_path.stem + LIMITS_SUFFIX + suffix),
+        output_path.with_name(output_path.stem + SCORES_SUFFIX + suffix),
+    )
+
+
+def open_writer(path: Path, schema, format: str):
+    """A writer with `write_batch` and `write_table`, for use in a with."""
+    pa = import_pyarrow()
+
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(path, schema)
+
+    # Dictionaries only ever grow, so each batch just adds to the last one.
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    return pa.ipc.new_file(path, schema, options=options)
+
+
+def get_support(value: object) -> float | None:
+    """Concordance support as a number, with booleans as 1 and 0."""
+    if isinstance(value, str):
+        if value in ("Yes", "True"):
+            return 1.0
+        if value in ("No", "False"):
+            return 0.0
+    if value is None:
+        return None
+    return float(value)
+
+
+def write_limits(spart, path: Path, format: str) -> int:
+    """One row per concordant limit, in file order. Returns the row count."""
+    pa = import_pyarrow()
+
+    label = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema(
+        [pa.field(name, label) for name in LIMIT_LABELS]
+        + [
+            pa.field("individuals_a", pa.int32()),
+            pa.field("individuals_b", pa.int32()),
+            pa.field("support", pa.float64()),
+        ]
+    )
+    dictionaries = {name: {} for name in LIMIT_LABELS}
+    columns = {name: [] for name in schema.names}
+
+    def encode(name: str, value: str | None) -> int | None:
+        if value is None:
+            return None
+        codes = dictionaries[name]
+        return codes.setdefault(value, len(codes))
+
+    def write_batch(writer):
+        arrays = [
+            pa.DictionaryArray.from_arrays(
+                pa.array(columns[name], pa.int32()),
+                pa.array(list(dictionaries[name]), pa.string()),
+            )
+            for name in LIMIT_LABELS
+        ]
+        arrays += [
+            pa.array(columns[name], field.type)
+            for name, field in zip(schema.names, schema)
+            if name not in dictionaries
+        ]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    rows = 0
+    with open_writer(path, schema, format) as writer:
+        for spartition in spart.getSpartitions():
+            for concordance in spart.getSpartitionConcordances(spartition):
+                data = spart.getConcordanceData(spartition, concordance)
+                limits = spart.getConcordantLimits(spartition, concordance)
+                for name, value in [
+                    ("spartition", spartition),
+                    ("concordance", concordance),
+                    ("evidence_type", data.get("evidenceType")),
+                ]:
+                    columns[name] += [encode(name, value)] * len(limits)
+                for limit in limits:
+                    columns["subset_a"].append(
+                        encode("subset_a", limit["subsetnumberA"])
+                    )
+                    columns["subset_b"].append(
+                        encode("subset_b", limit["subsetnumberB"])
+                    )
+                    columns["individuals_a"].append(limit.get("NIndividualsSubsetA"))
+                    columns["individuals_b"].append(limit.get("NIndividualsSubsetB"))
+                    columns["support"].append(get_support(limit["concordanceSupport"]))
+                rows += len(limits)
+                if len(columns["support"]) >= BATCH_ROWS:
+                    write_batch(writer)
+        if columns["support"]:
+            write_batch(writer)
+    return rows
+
+
+def write_scores(spart, path: Path, format: str) -> int:
+    """One row per spartition, with a column for every score any of them
+    has. Columns of numbers are written as such, any others as text.
+    Returns the row count."""
+    pa = import_pyarrow()
+
+    spartitions = spart.getSpartitions()
+    scores = [spart.getSpartitionData(spartition) for spartition in spartitions]
+    keys = list(dict.fromkeys(key for data in scores for key in data))
+
+    arrays = [pa.array(spartitions, pa.string())]
+    for key in keys:
+        values = [data.get(key) for data in scores]
+        try:
+            arrays.append(
+                pa.array(
+                    [None if value is None else float(value) for value in values],
+                    pa.float64(),
+                )
+            )
+        except (TypeError, ValueError):
+            arrays.append(
+                pa.array(
+                    [None if value is None else str(value) for value in values],
+                    pa.string(),
+                )
+            )
+    table = pa.table(arrays, names=["spartition", *keys])
+
+    with open_writer(path, table.schema, format) as writer:
+        writer.write_table(table)
+    return len(spartitions)
+
+
+def export_columnar(spart, output_path: Path, format: str) -> dict[str, int]:
+    """Write the limits and the scores next to the SPART output, each to a
+    temporary file first. Returns how many rows went into each."""
+    counters = {}
+    limits_path, scores_path = get_columnar_paths(output_path, format)
+    for name, path, write in [
+        ("limits", limits_path, write_limits),
+        ("scores", scores_path, write_scores),
+    ]:
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            counters[name] = write(spart, temp, format)
+            os.replace(temp, path)
+        finally:
+            temp.unlink(missing_ok=True)
+    return counters
@@ -1,7 +1,9 @@
 from PySide6 import QtCore
 
 import os
+from functools import lru_cache
 from pathlib import Path
+from typing import Callable
 
 from itaxotools.common.bindings import Binder, Instance, Property, PropertyObject
 from itaxotools.common.utility import override
@@ -9,6 +11,7 @@ from itaxotools.taxi_gui.loop import DataQuery
 from itaxotools.taxi_gui.model.tasks import TaskModel
 from itaxotools.taxi_gui.threading import ReportDone, ReportStop
 
+from ..common.process import with_profiling, with_stages
 from ..common.types import Results
 
 
@@ -34,18 +37,82 @@ class BlastTaskModel(TaskModel):
     def onStop(self, report: ReportStop):
         self.busy = False
 
+    @override
+    def exec(self, task, *args, **kwargs):
+        super().exec(with_profiling(with_stages(task)), *args, **kwargs)
+
+
+# Directory listings kept in memory, for as long as the directory is unchanged.
+DIRECTORY_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=DIRECTORY_CACHE_SIZE)
+def list_directory(
+    path: Path, globs: tuple[str, ...], mtime_ns: int
+) -> tuple[Path, ...]:
+    # Names are compared like glob does, which ignores case on Windows.
+    suffixes = tuple(os.path.normcase(f".{glob}") for glob in globs)
+    with os.scandir(path) as entries:
+        return tuple(
+            Path(entry.path)
+            for entry in entries
+            if (not suffixes or os.path.normcase(entry.name).endswith(suffixes))
+            and entry.is_file()
+        )
+
+
+def scan_directory(path: Path, globs: list[str]) -> tuple[Path, ...]:
+    """Files right in the directory with any of the extensions, or all of
+    them if none are given, from a single pass over its entries. Listings
+    are reused until the modification time of the directory changes, which
+    it does whenever an entry is added, removed or renamed."""
+    try:
+        return list_directory(path, tuple(globs), path.stat().st_mtime_ns)
+    except OSError:
+        return ()
+
+
+def expand_paths(
+    paths: list[Path],
+    folders: set[Path],
+    globs: list[str],
+    progress: Callable[[int], None] | None = None,
+) -> set[Path]:
+    """Files are kept while they exist, folders are replaced by their files.
+    Progress is given the count so far after each folder."""
+    all = set()
+    for path in paths:
+        if path not in folders:
+            if path.is_file():
+                all.add(path)
+            continue
+        all.update(scan_directory(path, globs))
+        if progress:
+            progress(len(all))
+    return all
+
 
 class PathListModel(QtCore.QAbstractListModel):
+    """Files and folders, each folder standing for its files with any of
+    the extensions in `globs`. Whether a path is a folder is only checked
+    once, when it is added, and folders are listed off the GUI thread."""
+
+    counted = QtCore.Signal(int)
+    _progress = QtCore.Signal(int, int)
+
     def __init__(self, paths=None):
         super().__init__()
         self.paths: list[Path] = paths or []
+        self.folders: set[Path] = {path for path in self.paths if path.is_dir()}
         self.globs = ["fa", "fas", "fasta", "fq", "fastq"]
+        self.generation = 0
+        self._progress.connect(self._handle_progress)
 
     @override
     def data(self, index, role):
         if role == QtCore.Qt.DisplayRole:
             path = self.paths[index.row()]
-            if path.is_dir():
+            if path in self.folders:
                 if self.globs:
                     globs = ",".join(self.globs)
                     return str(path.absolute()) + os.path.sep + f"*.{{{globs}}}"
@@ -64,6 +131,7 @@ class PathListModel(QtCore.QAbstractListModel):
     def add_paths(self, paths: list[Path]):
         paths = [path for path in paths if path not in self.paths]
         paths.sort()
+        self.folders.update(path for path in paths if path.is_dir())
         self.beginInsertRows(
             QtCore.QModelIndex(), self.rowCount(), self.rowCount() + len(paths)
         )
@@ -76,26 +144,40 @@ class PathListModel(QtCore.QAbstractListModel):
         self.beginRemoveRows(QtCore.QModelIndex(), indices[-1], indices[0])
         for index in indices:
             if 0 <= index < len(self.paths):
+                self.folders.discard(self.paths[index])
                 del self.paths[index]
         self.endRemoveRows()
 
     def clear(self):
         self.beginResetModel()
         self.paths = []
+        self.folders = set()
         self.endResetModel()
 
     def get_all_paths(self) -> list[Path]:
-        all = set()
-        for path in self.paths:
-            if path.is_file():
-                all.add(path)
-            elif path.is_dir():
-                if self.globs:
-                    for glob in self.globs:
-                        all.update(path.glob(f"*.{glob}"))
-                else:
-                    all.update(x for x in path.iterdir() if x.is_file())
-        return list(sorted(all))
+        return list(sorted(expand_paths(self.paths, self.folders, self.globs)))
+
+    def count_all_paths(self):
+        """Count the files on the thread pool, emitting `counted` with the
+        count so far after each folder and once more when done. Counts of an
+        earlier call are dropped once the paths have changed since."""
+        self.generation += 1
+        generation = self.generation
+        paths = list(self.paths)
+        folders = set(self.folders)
+        globs = list(self.globs)
+
+        def count():
+            def progress(count: int):
+                self._progress.emit(generation, count)
+
+            progress(len(expand_paths(paths, folders, globs, progress)))
+
+        QtCore.QThreadPool.globalInstance().start(count)
+
+    def _handle_progress(self, generation: int, count: int):
+        if generation == self.generation:
+            self.counted.emit(count)
 
 
 class BatchFileModel(PropertyObject):
@@ -119,13 +201,12 @@ class BatchFileModel(PropertyObject):
         ]:
             self.binder.bind(handle, self._update_file_list_rows)
             self.binder.bind(handle, self._update_file_list_total)
+        self.binder.bind(self.file_list.counted, self.properties.file_list_total)
 
         for handle in [
             self.properties.batch_mode,
             self.properties.file_path,
-            self.file_list.rowsInserted,
-            self.file_list.rowsRemoved,
-            self.file_list.modelReset,
+            self.properties.file_list_total,
         ]:
             self.binder.bind(handle, self.check_ready)
 
@@ -138,7 +219,7 @@ class BatchFileModel(PropertyObject):
 
     def is_ready(self):
         if self.batch_mode:
-            if not self.file_list.get_all_paths():
+            if not self.file_list_total:
                 return False
         if not self.batch_mode:
             if self.file_path == Path():
@@ -154,10 +235,11 @@ class BatchFileModel(PropertyObject):
         self.file_list_rows = len(self.file_list.paths)
 
     def _update_file_list_total(self):
-        self.file_list_total = len(self.file_list.get_all_paths())
+        self.file_list.count_all_paths()
 
     def set_globs(self, globs: list[str]):
         self.file_list.globs = globs
+        self.file_list.count_all_paths()
 
     def delete_paths(self, indices: list[int]):
         if not indices:
@@ -190,7 +272,7 @@ class BatchFileModel(PropertyObject):
                 self.parent_path = Path()
             else:
                 first: Path = paths[0]
-                if first.is_dir():
+                if first in self.file_list.folders:
                     self.parent_path = first
                 else:
                     self.parent_path = first.parent
@@ -0,0 +1,467 @@
+import json
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache, partial, update_wrapper
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterator, TypeVar
+
+from .types import ElementRange, SpartIndex, SpartitionRange, StageStats
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Profile every task run by setting this to the directory for the reports.
+PROFILE_DIR_VARIABLE = "CONCORDANCE_PROFILE_DIR"
+
+# Which profilers to run: "cpu" for cProfile, "memory" for tracemalloc,
+# or both separated by a comma, which is the default.
+PROFILE_MODES_VARIABLE = "CONCORDANCE_PROFILE"
+PROFILE_MODES = frozenset(["cpu", "memory"])
+
+# Write the stages of every task run as JSON by setting this to a directory.
+STAGES_DIR_VARIABLE = "CONCORDANCE_STAGES_DIR"
+
+# Allocation sites listed in the memory report, and the stack depth kept.
+PROFILE_TOP_ALLOCATIONS = 25
+PROFILE_TRACE_FRAMES = 8
+
+# Bump when the index layout changes, so that old index files are rebuilt.
+SPART_INDEX_VERSION = 1
+SPART_INDEX_SUFFIX = ".index.json"
+SPART_INDEX_CACHE_SIZE = 8
+
+
+def resolve_workers(workers: int) -> int:
+    """Zero or less means one worker per CPU."""
+    if workers > 0:
+        return workers
+    return os.cpu_count() or 1
+
+
+@contextmanager
+def allow_children() -> Iterator[None]:
+    """Let the current process start child processes while inside the block.
+
+    Tasks run inside the taxi_gui worker, which is a daemonic process, and
+    multiprocessing refuses to start children from those. There is no public
+    way around that check: it reads the "daemon" entry of the private
+    `_config` dict of the current process, which is a CPython detail. The
+    entry is lifted only for the lifetime of a pool, and put back as it was
+    however the block exits, even if the pool failed to start. Where there
+    is no such dict, the block runs unchanged.
+    """
+    config = getattr(multiprocessing.current_process(), "_config", None)
+    if not isinstance(config, dict):
+        yield
+        return
+
+    missing = object()
+    daemon = config.get("daemon", missing)
+    config["daemon"] = False
+    try:
+        yield
+    finally:
+        if daemon is missing:
+            config.pop("daemon", None)
+        else:
+            config["daemon"] = daemon
+
+
+def pool_map(
+    function: Callable[[T], R],
+    items: list[T],
+    workers: int = 0,
+    min_items: int = 2,
+) -> list[R]:
+    """Apply `function` to every item on a process pool, keeping their order.
+
+    Falls back to a plain loop for a single worker, or when there are fewer
+    than `min_items` items, since starting a pool costs more than it saves on
+    small inputs. The function and items must be picklable.
+    """
+    workers = min(resolve_workers(workers), len(items))
+    if workers <= 1 or len(items) < min_items:
+        return [function(item) for item in items]
+
+    chunksize = max(1, len(items) // (workers * 4))
+    # Pool creation and worker start both happen inside allow_children,
+    # which restores the daemon flag even if either of them raises.
+    with allow_children(), ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(function, items, chunksize=chunksize))
+
+
+def cpu_time() -> float:
+    """CPU seconds used by this process and by its children that exited,
+    which includes the workers of a pool once it has been shut down."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StageRecorder:
+    """Collects wall time, CPU time, calls and counters per stage of a task.
+
+    Stages are listed in the order they first ran. Running a stage again,
+    or adding stats recorded elsewhere under the same name, adds up.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, StageStats] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[dict[str, int]]:
+        """Time the block, which may increment the yielded counters."""
+        counters = defaultdict(int)
+        ts = perf_counter()
+        cs = cpu_time()
+        try:
+            yield counters
+        finally:
+            tf = perf_counter()
+            cf = cpu_time()
+            self.add(StageStats(name, tf - ts, cf - cs, 1, dict(counters)))
+
+    def add(self, stats: StageStats):
+        previous = self.stages.get(stats.name)
+        if previous is not None:
+            counters = dict(previous.counters)
+            for key, value in stats.counters.items():
+                counters[key] = counters.get(key, 0) + value
+            stats = StageStats(
+                stats.name,
+                previous.wall_seconds + stats.wall_seconds,
+                previous.cpu_seconds + stats.cpu_seconds,
+                previous.calls + stats.calls,
+                counters,
+            )
+        self.stages[stats.name] = stats
+
+    def get_stages(self) -> tuple[StageStats, ...]:
+        return tuple(self.stages.values())
+
+
+def format_stages(stages: tuple[StageStats, ...]) -> str:
+    """A plain text table of the stages, for the task log."""
+    width = max([len(stats.name) for stats in stages] + [5])
+    lines = [f"{'Stage'.ljust(width)}  {'Wall':>9}  {'CPU':>9}  {'Calls':>5}"]
+    for stats in stages:
+        counters = ", ".join(f"{k}={v}" for k, v in stats.counters.items())
+        lines.append(
+            f"{stats.name.ljust(width)}  {stats.wall_seconds:>8.3f}s  "
+            f"{stats.cpu_seconds:>8.3f}s  {stats.calls:>5}  {counters}".rstrip()
+        )
+    return "\n".join(lines)
+
+
+def print_stages(stages: tuple[StageStats, ...]):
+    print()
+    print(format_stages(stages))
+    print()
+
+
+def dump_stages(stages: tuple[StageStats, ...], path: Path):
+    """Write the stages as a JSON list of objects, for monitoring."""
+    with open(path, "w") as file:
+        json.dump([stats._asdict() for stats in stages], file, indent=2)
+
+
+def get_run_stem(function: Callable) -> str:
+    """Name for the reports of one run, after the function and the time."""
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return f"{function.__module__}.{function.__qualname__}-{timestamp}"
+
+
+def recorded(function: Callable[..., R], directory: Path, *args, **kwargs) -> R:
+    """Call the function and dump the stages of the results it returns
+    to a .stages.json file in the directory."""
+    results = function(*args, **kwargs)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{get_run_stem(function)}.stages.json"
+    dump_stages(results.stages, path)
+    print(f"Stages: {path}")
+    return results
+
+
+def with_stages(function: Callable[..., R]) -> Callable[..., R]:
+    """The function itself, or a picklable wrapper that dumps its stages
+    when the environment asks for it."""
+    directory = os.environ.get(STAGES_DIR_VARIABLE)
+    if not directory:
+        return function
+    return update_wrapper(partial(recorded, function, Path(directory)), function)
+
+
+def get_profile_options() -> tuple[Path, frozenset[str]] | None:
+    """Where to write profiles and which profilers to run, as requested
+    by the environment, or None if profiling is off."""
+    directory = os.environ.get(PROFILE_DIR_VARIABLE)
+    if not directory:
+        return None
+    modes = os.environ.get(PROFILE_MODES_VARIABLE, ",".join(sorted(PROFILE_MODES)))
+    modes = frozenset(mode.strip() for mode in modes.split(",") if mode.strip())
+    unknown = modes - PROFILE_MODES
+    if unknown:
+        raise ValueError(
+            f"Unknown {PROFILE_MODES_VARIABLE}: {', '.join(sorted(unknown))}"
+        )
+    return Path(directory), modes
+
+
+def write_memory_report(path: Path, snapshot, current: int, peak: int):
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+    )
+    statistics = snapshot.statistics("traceback")
+    with open(path, "w") as file:
+        file.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n")
+        file.write(f"Still allocated at exit: {current / 1024 / 1024:.1f} MiB\n")
+        file.write(f"\nTop {PROFILE_TOP_ALLOCATIONS} allocation sites:\n")
+        for rank, stat in enumerate(statistics[:PROFILE_TOP_ALLOCATIONS], start=1):
+            file.write(
+                f"\n#{rank}: {stat.size / 1024:.1f} KiB in {stat.count} blocks\n"
+            )
+            for line in stat.traceback.format(most_recent_first=True):
+                file.write(f"{line}\n")
+
+
+def profiled(
+    function: Callable[..., R],
+    directory: Path,
+    modes: frozenset[str],
+    *args,
+    **kwargs,
+) -> R:
+    """Call the function under cProfile and/or tracemalloc.
+
+    A .prof file, readable with pstats or snakeviz, and a report of the top
+    allocation sites are written to the directory, named after the function
+    and the time of the run. Only the calling process is profiled, not the
+    pools it starts.
+    """
+    import cProfile
+    import tracemalloc
+
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = get_run_stem(function)
+
+    profiler = cProfile.Profile() if "cpu" in modes else None
+    tracing = "memory" in modes and not tracemalloc.is_tracing()
+
+    if tracing:
+        tracemalloc.start(PROFILE_TRACE_FRAMES)
+    if profiler:
+        profiler.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        if profiler:
+            profiler.disable()
+            path = directory / f"{stem}.prof"
+            profiler.dump_stats(path)
+            print(f"CPU profile: {path}")
+        if tracing:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            path = directory / f"{stem}.memory.txt"
+            write_memory_report(path, snapshot, current, peak)
+            print(f"Memory report: {path}")
+
+
+def with_profiling(function: Callable[..., R]) -> Callable[..., R]:
+    """The function itself, or a picklable wrapper that profiles it when
+    the environment asks for it."""
+    options = get_profile_options()
+    if options is None:
+        return function
+    return update_wrapper(partial(profiled, function, *options), function)
+
+
+def build_spart_index(path: Path) -> SpartIndex:
+    """Index a SPART file in one streaming pass.
+
+    Expat reports the byte offset of every tag, so each element is taken
+    to end where the next tag begins. That leaves trailing whitespace in
+    the range, which parsing ignores.
+    """
+    from xml.parsers import expat
+
+    size = path.stat().st_size
+    mtime_ns = path.stat().st_mtime_ns
+    parser = expat.ParserCreate()
+
+    # Records are [label, start, stop] lists while the file is read, with
+    # subsets and concordances added for spartitions.
+    sections: dict[str, list] = {}
+    spartitions: list[list] = []
+    encoding = None
+    tags: list[str] = []
+    opened: list[list | None] = []
+    ended: list[list] = []
+
+    def settle(offset: int):
+        for record in ended:
+            record[2] = offset
+        ended.clear()
+
+    def start_element(name: str, attrs: dict[str, str]):
+        settle(parser.CurrentByteIndex)
+        tags.append(name.lower())
+        start = parser.CurrentByteIndex
+        record = None
+        if len(tags) == 2:
+            record = [tags[1], start, start]
+            sections.setdefault(tags[1], record)
+        elif tags[1:] == ["spartitions", "spartition"]:
+            record = [attrs.get("label"), start, start, [], []]
+            spartitions.append(record)
+        elif tags[3:] == ["subsets", "subset"]:
+            record = [attrs.get("label"), start, start]
+            spartitions[-1][3].append(record)
+        elif tags[3:] == ["concordances", "concordance"]:
+            record = [attrs.get("evidenceName", attrs.get("label")), start, start]
+            spartitions[-1][4].append(record)
+        opened.append(record)
+
+    def end_element(name: str):
+        settle(parser.CurrentByteIndex)
+        record = opened.pop()
+        if record is not None:
+            ended.append(record)
+        tags.pop()
+
+    def xml_declaration(version: str, declared: str | None, standalone: int):
+        nonlocal encoding
+        encoding = declared
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.XmlDeclHandler = xml_declaration
+    with open(path, "rb") as file:
+        parser.ParseFile(file)
+    settle(size)
+
+    def get_range(record: list) -> ElementRange:
+        return ElementRange(*record[:3])
+
+    return SpartIndex(
+        size,
+        mtime_ns,
+        encoding,
+        {tag: get_range(record) for tag, record in sections.items()},
+        [
+            SpartitionRange(
+                *record[:3],
+                [get_range(subset) for subset in record[3]],
+                [get_range(concordance) for concordance in record[4]],
+            )
+            for record in spartitions
+        ],
+    )
+
+
+def get_spart_index_path(path: Path) -> Path:
+    return path.with_name(path.name + SPART_INDEX_SUFFIX)
+
+
+def store_spart_index(path: Path, index: SpartIndex):
+    """Write the index next to the file, or give up quietly if that is not
+    allowed, since it can always be built again."""
+    content = dict(
+        version=SPART_INDEX_VERSION,
+        size=index.size,
+        mtime_ns=index.mtime_ns,
+        encoding=index.encoding,
+        sections={tag: list(section[1:]) for tag, section in index.sections.items()},
+        spartitions=[
+            [
+                *spartition[:3],
+                [list(subset) for subset in spartition.subsets],
+                [list(concordance) for concordance in spartition.concordances],
+            ]
+            for spartition in index.spartitions
+        ],
+    )
+    target = get_spart_index_path(path)
+    temp = target.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(temp, "w") as file:
+            json.dump(content, file, separators=(",", ":"))
+        os.replace(temp, target)
+    except OSError:
+        temp.unlink(missing_ok=True)
+
+
+def load_spart_index(path: Path) -> SpartIndex | None:
+    """The stored index of the file, or None if there is none, or if it is
+    outdated or unreadable."""
+    try:
+        with open(get_spart_index_path(path)) as file:
+            content = json.load(file)
+        stat = path.stat()
+        if content["version"] != SPART_INDEX_VERSION:
+            return None
+        if (content["size"], content["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return SpartIndex(
+            content["size"],
+            content["mtime_ns"],
+            content["encoding"],
+            {
+                tag: ElementRange(tag, *section)
+                for tag, section in content["sections"].items()
+            },
+            [
+                SpartitionRange(
+                    label,
+                    start,
+                    stop,
+                    [ElementRange(*subset) for subset in subsets],
+                    [ElementRange(*concordance) for concordance in concordances],
+                )
+                for label, start, stop, subsets, concordances in content["spartitions"]
+            ],
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+@lru_cache(maxsize=SPART_INDEX_CACHE_SIZE)
+def get_current_spart_index(path: Path, size: int, mtime_ns: int) -> SpartIndex:
+    index = load_spart_index(path)
+    if index is None:
+        index = build_spart_index(path)
+        store_spart_index(path, index)
+    return index
+
+
+def get_spart_index(path: Path) -> SpartIndex:
+    """The index of a SPART file, built and stored next to it when missing
+    or outdated. Recent ones are also kept in memory, for as long as the
+    file does not change."""
+    stat = path.stat()
+    return get_current_spart_index(path, stat.st_size, stat.st_mtime_ns)
+
+
+def read_spart_element(path: Path, index: SpartIndex, element: ElementRange):
+    """Parse a single indexed element of the file, with its children."""
+    from xml.etree import ElementTree as ET
+
+    with open(path, "rb") as file:
+        file.seek(element.start)
+        data = file.read(element.stop - element.start)
+    data = data[: data.rindex(b">") + 1]
+    if index.encoding:
+        declaration = f'<?xml version="1.0" encoding="{index.encoding}"?>'
+        data = declaration.encode("ascii") + data
+    return ET.fromstring(data)
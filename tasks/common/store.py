@@ -0,0 +1,506 @@
+"""SPART contents kept in a local SQLite database.
+
+Each individual, spartition, subset, membership, concordance, concordant
+limit and score is a row of its own, so that questions like which subset
+pairs are apart by one kind of evidence but not another are a query away,
+and saving a dataset again only rewrites the rows that changed.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+
+# Bump when the schema changes; stores of other versions are refused.
+STORE_VERSION = 1
+
+# Paths with these suffixes are stores, anything else is SPART XML.
+STORE_SUFFIXES = frozenset([".sqlite", ".db"])
+
+# Entries of a spartition that are not kept among its scores.
+SPARTITION_KEYS = frozenset(["label", "remarks", "subsets", "concordances"])
+
+# Attributes of a concordant limit, by the column that holds them.
+LIMIT_COLUMNS = {
+    "subset_a": "subsetnumberA",
+    "subset_b": "subsetnumberB",
+    "individuals_a": "NIndividualsSubsetA",
+    "individuals_b": "NIndividualsSubsetB",
+    "support": "concordanceSupport",
+}
+
+SCHEMA = """
+CREATE TABLE header (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE individuals (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE spartitions (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL,
+    remarks TEXT,
+    membership TEXT NOT NULL
+);
+CREATE TABLE scores (
+    spartition_id INTEGER NOT NULL REFERENCES spartitions ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    number REAL,
+    PRIMARY KEY (spartition_id, key)
+);
+CREATE INDEX scores_key ON scores (key, number);
+CREATE TABLE subsets (
+    id INTEGER PRIMARY KEY,
+    spartition_id INTEGER NOT NULL REFERENCES spartitions ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (spartition_id, label)
+);
+CREATE TABLE memberships (
+    subset_id INTEGER NOT NULL REFERENCES subsets ON DELETE CASCADE,
+    individual_id INTEGER NOT NULL REFERENCES individuals ON DELETE CASCADE,
+    data TEXT NOT NULL,
+    PRIMARY KEY (subset_id, individual_id)
+);
+CREATE INDEX memberships_individual ON memberships (individual_id);
+CREATE TABLE concordances (
+    id INTEGER PRIMARY KEY,
+    spartition_id INTEGER NOT NULL REFERENCES spartitions ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    UNIQUE (spartition_id, name)
+);
+CREATE INDEX concordances_name ON concordances (name);
+CREATE TABLE concordant_limits (
+    concordance_id INTEGER NOT NULL REFERENCES concordances ON DELETE CASCADE,
+    subset_a TEXT NOT NULL,
+    subset_b TEXT NOT NULL,
+    individuals_a INTEGER,
+    individuals_b INTEGER,
+    support,
+    data TEXT NOT NULL
+);
+CREATE INDEX concordant_limits_pair
+    ON concordant_limits (concordance_id, subset_a, subset_b);
+"""
+
+
+def is_store_path(path: Path) -> bool:
+    return path.suffix.lower() in STORE_SUFFIXES
+
+
+def get_digest(content: object) -> str:
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def get_number(value: object) -> float | None:
+    """Numeric value of a score, so that scores can be compared in queries
+    whether they were written as numbers or as text."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SpartStore:
+    """A SPART dataset in an SQLite database, created on first write.
+
+    Use as a context manager, or close it when done. Spartitions and
+    individuals are matched by label, which must be unique. Values are
+    stored as JSON, except for concordant limits, where they are columns.
+    """
+
+    def __init__(self, path: Path, create: bool = False):
+        if not create and not path.exists():
+            raise FileNotFoundError(f"No such store: {str(path)}")
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            with self.connection:
+                self.connection.executescript(SCHEMA)
+                self.connection.execute(f"PRAGMA user_version = {STORE_VERSION}")
+        elif version != STORE_VERSION:
+            self.connection.close()
+            raise ValueError(f"Unsupported store version {version}: {str(path)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get_individuals(self) -> list[str]:
+        rows = self.connection.execute(
+            "SELECT label FROM individuals ORDER BY position"
+        )
+        return [label for (label,) in rows]
+
+    def get_spartitions(self) -> list[str]:
+        rows = self.connection.execute(
+            "SELECT label FROM spartitions ORDER BY position"
+        )
+        return [label for (label,) in rows]
+
+    def get_scores(self) -> dict[str, dict[str, object]]:
+        """The scores of every spartition, in order, by spartition label."""
+        scores = {label: {} for label in self.get_spartitions()}
+        rows = self.connection.execute(
+            "SELECT spartitions.label, key, value FROM scores "
+            "JOIN spartitions ON spartitions.id = spartition_id "
+            "ORDER BY scores.rowid"
+        )
+        for label, key, value in rows:
+            scores[label][key] = json.loads(value)
+        return scores
+
+    def get_subsets(
+        self, labels: list[str] | None = None
+    ) -> dict[str, dict[str, list[str]]]:
+        """The individuals of each subset, by subset label, for each of the
+        given spartitions or all of them, by spartition label."""
+        query = (
+            "SELECT spartitions.label, subsets.label, individuals.label "
+            "FROM subsets "
+            "JOIN spartitions ON spartitions.id = subsets.spartition_id "
+            "LEFT JOIN memberships ON memberships.subset_id = subsets.id "
+            "LEFT JOIN individuals ON individuals.id = memberships.individual_id "
+        )
+        parameters = []
+        if labels is not None:
+            query += f"WHERE spartitions.label IN ({', '.join('?' * len(labels))}) "
+            parameters = labels
+        query += "ORDER BY spartitions.position, subsets.id, memberships.rowid"
+
+        subsets = defaultdict(dict)
+        for spartition, subset, individual in self.connection.execute(
+            query, parameters
+        ):
+            members = subsets[spartition].setdefault(subset, [])
+            if individual is not None:
+                members.append(individual)
+        return subsets
+
+    def read(self, labels: list[str] | None = None):
+        """Load the dataset into a Spart, with all the spartitions or only
+        those with the given labels, in the order they are stored."""
+        from itaxotools.spart_parser import Spart
+
+        rows = self.connection.execute("SELECT key, value FROM header ORDER BY rowid")
+        spartDict = {key: json.loads(value) for key, value in rows}
+
+        rows = self.connection.execute(
+            "SELECT label, data FROM individuals ORDER BY position"
+        )
+        spartDict["individuals"] = {label: json.loads(data) for label, data in rows}
+
+        query = "SELECT id, label, remarks FROM spartitions "
+        parameters = []
+        if labels is not None:
+            query += f"WHERE label IN ({', '.join('?' * len(labels))}) "
+            parameters = labels
+        spartitions = self.connection.execute(
+            query + "ORDER BY position", parameters
+        ).fetchall()
+
+        spartDict["spartitions"] = {}
+        for number, (id, label, remarks) in enumerate(spartitions, start=1):
+            spartition = dict(label=label, remarks=remarks)
+            rows = self.connection.execute(
+                "SELECT key, value FROM scores WHERE spartition_id = ? "
+                "ORDER BY rowid",
+                (id,),
+            )
+            spartition.update({key: json.loads(value) for key, value in rows})
+            spartition["subsets"] = {}
+            rows = self.connection.execute(
+                "SELECT subsets.label, subsets.data, individuals.label, "
+                "memberships.data FROM subsets "
+                "LEFT JOIN memberships ON memberships.subset_id = subsets.id "
+                "LEFT JOIN individuals ON individuals.id = memberships.individual_id "
+                "WHERE subsets.spartition_id = ? "
+                "ORDER BY subsets.id, memberships.rowid",
+                (id,),
+            )
+            for subset, data, individual, membership in rows:
+                if subset not in spartition["subsets"]:
+                    spartition["subsets"][subset] = dict(
+                        json.loads(data), individuals={}
+                    )
+                if individual is not None:
+                    individuals = spartition["subsets"][subset]["individuals"]
+                    individuals[individual] = json.loads(membership)
+            spartDict["spartitions"][str(number)] = spartition
+
+        spart = Spart(spartDict)
+        for id, label, _ in spartitions:
+            self.read_concordances(spart, id, label)
+        return spart
+
+    def read_concordances(self, spart, id: int, label: str):
+        concordances = self.connection.execute(
+            "SELECT id, name, data FROM concordances WHERE spartition_id = ? "
+            "ORDER BY position",
+            (id,),
+        ).fetchall()
+        for concordance_id, name, data in concordances:
+            spart.addConcordance(label, name, **json.loads(data))
+            rows = self.connection.execute(
+                f"SELECT {', '.join(LIMIT_COLUMNS)}, data FROM concordant_limits "
+                "WHERE concordance_id = ? ORDER BY rowid",
+                (concordance_id,),
+            )
+            for *values, extra in rows:
+                limit = dict(zip(LIMIT_COLUMNS.values(), values))
+                # SQLite has no booleans, but supports are never integers.
+                if isinstance(limit["concordanceSupport"], int):
+                    limit["concordanceSupport"] = bool(limit["concordanceSupport"])
+                limit.update(json.loads(extra))
+                spart.addConcordantLimit(
+                    spartitionLabel=label, concordanceLabel=name, **limit
+                )
+
+    def write(self, spart) -> int:
+        """Make the store hold the same dataset as the Spart, in a single
+        transaction. Rows that already match are left alone, and anything
+        the Spart does not have is deleted. Returns how many rows changed.
+        Raises ValueError if two spartitions share a label."""
+        labels = spart.getSpartitions()
+        if len(set(labels)) != len(labels):
+            raise ValueError("Spartition labels must be unique in a store")
+
+        before = self.connection.total_changes
+        with self.connection:
+            self.write_header(spart)
+            individuals = self.write_individuals(spart)
+            existing = {
+                label: (id, position, remarks, membership)
+                for id, label, position, remarks, membership in self.connection.execute(
+                    "SELECT id, label, position, remarks, membership FROM spartitions"
+                )
+            }
+            for position, spartition in enumerate(
+                spart.spartDict["spartitions"].values()
+            ):
+                id = self.write_spartition(
+                    spartition, position, existing.pop(spartition["label"], None)
+                )
+                self.write_subsets(spartition, id, individuals)
+                self.write_scores(spartition, id)
+                self.write_concordances(spart, spartition["label"], id)
+            self.connection.executemany(
+                "DELETE FROM spartitions WHERE id = ?",
+                [(id,) for id, *_ in existing.values()],
+            )
+        return self.connection.total_changes - before
+
+    def write_header(self, spart):
+        header = {
+            key: json.dumps(value)
+            for key, value in spart.spartDict.items()
+            if key not in ["individuals", "spartitions"]
+        }
+        self.connection.executemany(
+            "INSERT INTO header (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value "
+            "WHERE value != excluded.value",
+            header.items(),
+        )
+        stored = self.connection.execute("SELECT key FROM header").fetchall()
+        self.connection.executemany(
+            "DELETE FROM header WHERE key = ?",
+            [(key,) for (key,) in stored if key not in header],
+        )
+
+    def write_individuals(self, spart) -> dict[str, int]:
+        """Returns the row id of each individual, by label."""
+        rows = [
+            (label, position, json.dumps(data))
+            for position, (label, data) in enumerate(
+                spart.spartDict["individuals"].items()
+            )
+        ]
+        self.connection.executemany(
+            "INSERT INTO individuals (label, position, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (label) DO UPDATE "
+            "SET position = excluded.position, data = excluded.data "
+            "WHERE position != excluded.position OR data != excluded.data",
+            rows,
+        )
+        ids = dict(self.connection.execute("SELECT label, id FROM individuals"))
+        self.connection.executemany(
+            "DELETE FROM individuals WHERE id = ?",
+            [
+                (ids.pop(label),)
+                for label in list(ids)
+                if label not in spart.spartDict["individuals"]
+            ],
+        )
+        return ids
+
+    def write_spartition(
+        self, spartition: dict, position: int, existing: tuple | None
+    ) -> int:
+        """Returns the row id of the spartition. Its subsets are dropped
+        if their membership changed, to be written again from scratch."""
+        membership = get_digest(spartition["subsets"])
+        if existing is None:
+            return self.connection.execute(
+                "INSERT INTO spartitions (label, position, remarks, membership) "
+                "VALUES (?, ?, ?, ?)",
+                (spartition["label"], position, spartition.get("remarks"), membership),
+            ).lastrowid
+
+        id, *stored = existing
+        if stored != [position, spartition.get("remarks"), membership]:
+            self.connection.execute(
+                "UPDATE spartitions SET position = ?, remarks = ?, membership = ? "
+                "WHERE id = ?",
+                (position, spartition.get("remarks"), membership, id),
+            )
+        if stored[2] != membership:
+            self.connection.execute(
+                "DELETE FROM subsets WHERE spartition_id = ?", (id,)
+            )
+        return id
+
+    def write_subsets(self, spartition: dict, id: int, individuals: dict[str, int]):
+        """Written only if the spartition has none yet."""
+        if self.connection.execute(
+            "SELECT 1 FROM subsets WHERE spartition_id = ? LIMIT 1", (id,)
+        ).fetchone():
+            return
+        for label, subset in spartition["subsets"].items():
+            data = {key: value for key, value in subset.items() if key != "individuals"}
+            subset_id = self.connection.execute(
+                "INSERT INTO subsets (spartition_id, label, data) VALUES (?, ?, ?)",
+                (id, label, json.dumps(data)),
+            ).lastrowid
+            unknown = set(subset["individuals"]) - set(individuals)
+            if unknown:
+                raise ValueError(
+                    f"Individuals of subset {repr(label)} of spartition "
+                    f"{repr(spartition['label'])} are not listed: {sorted(unknown)}"
+                )
+            self.connection.executemany(
+                "INSERT INTO memberships (subset_id, individual_id, data) "
+                "VALUES (?, ?, ?)",
+                [
+                    (subset_id, individuals[individual], json.dumps(data))
+                    for individual, data in subset["individuals"].items()
+                ],
+            )
+
+    def write_scores(self, spartition: dict, id: int):
+        scores = {
+            key: value
+            for key, value in spartition.items()
+            if key not in SPARTITION_KEYS
+        }
+        self.connection.executemany(
+            "INSERT INTO scores (spartition_id, key, value, number) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (spartition_id, key) DO UPDATE "
+            "SET value = excluded.value, number = excluded.number "
+            "WHERE value != excluded.value",
+            [
+                (id, key, json.dumps(value), get_number(value))
+                for key, value in scores.items()
+            ],
+        )
+        stored = self.connection.execute(
+            "SELECT key FROM scores WHERE spartition_id = ?", (id,)
+        ).fetchall()
+        self.connection.executemany(
+            "DELETE FROM scores WHERE spartition_id = ? AND key = ?",
+            [(id, key) for (key,) in stored if key not in scores],
+        )
+
+    def write_concordances(self, spart, label: str, id: int):
+        """A concordance is written again whenever anything in it changed,
+        along with all of its limits."""
+        stored = {
+            name: (concordance_id, position, digest)
+            for concordance_id, name, position, digest in self.connection.execute(
+                "SELECT id, name, position, digest FROM concordances "
+                "WHERE spartition_id = ?",
+                (id,),
+            )
+        }
+        for position, name in enumerate(spart.getSpartitionConcordances(label)):
+            data = spart.getConcordanceData(label, name)
+            limits = spart.getConcordantLimits(label, name)
+            digest = get_digest([data, limits])
+            if name in stored:
+                concordance_id, stored_position, stored_digest = stored.pop(name)
+                if stored_digest == digest:
+                    if stored_position != position:
+                        self.connection.execute(
+                            "UPDATE concordances SET position = ? WHERE id = ?",
+                            (position, concordance_id),
+                        )
+                    continue
+                self.connection.execute(
+                    "DELETE FROM concordances WHERE id = ?", (concordance_id,)
+                )
+            concordance_id = self.connection.execute(
+                "INSERT INTO concordances (spartition_id, name, position, data, digest) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (id, name, position, json.dumps(data), digest),
+            ).lastrowid
+            self.connection.executemany(
+                f"INSERT INTO concordant_limits ({', '.join(LIMIT_COLUMNS)}, "
+                "concordance_id, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        *(limit.get(key) for key in LIMIT_COLUMNS.values()),
+                        concordance_id,
+                        json.dumps(
+                            {
+                                key: value
+                                for key, value in limit.items()
+                                if key not in LIMIT_COLUMNS.values()
+                            }
+                        ),
+                    )
+                    for limit in limits
+                ],
+            )
+        self.connection.executemany(
+            "DELETE FROM concordances WHERE id = ?",
+            [(concordance_id,) for concordance_id, *_ in stored.values()],
+        )
+
+
+def read_spart(path: Path):
+    """Load a SPART file or a store into a Spart."""
+    from itaxotools.spart_parser import Spart
+
+    if not is_store_path(path):
+        return Spart.fromXML(path)
+    with SpartStore(path) as store:
+        return store.read()
+
+
+def write_spart(spart, path: Path) -> int | None:
+    """Write a Spart as a SPART file, or into a store, which is created if
+    needed and otherwise only updated where it differs. Returns how many
+    rows changed for a store, None for a file."""
+    if not is_store_path(path):
+        spart.toXML(path)
+        return None
+    with SpartStore(path, create=True) as store:
+        return store.write(spart)
@@ -19,9 +19,61 @@ def column_label(index: int) -> str:
     return label
 
 
+class StageStats(NamedTuple):
+    """Where the time of one stage of a task went, and how much work it did.
+
+    CPU time includes pool workers that exited during the stage. Counters
+    are free-form, such as the number of spartitions or subset pairs.
+    """
+
+    name: str
+    wall_seconds: float
+    cpu_seconds: float
+    calls: int
+    counters: dict[str, int]
+
+
+class ElementRange(NamedTuple):
+    """Bytes of a SPART file holding one element, from its start tag up to
+    whatever follows its end tag, which is only ever whitespace."""
+
+    label: str | None
+    start: int
+    stop: int
+
+
+class SpartitionRange(NamedTuple):
+    """Where a spartition is in a SPART file, and its subsets and concordances.
+
+    Subsets are labelled by their label, concordances by their evidence name.
+    """
+
+    label: str | None
+    start: int
+    stop: int
+    subsets: list[ElementRange]
+    concordances: list[ElementRange]
+
+
+class SpartIndex(NamedTuple):
+    """Byte ranges of the parts of a SPART file, for reading just those.
+
+    Sections are the elements right under the root, by lowercase tag, such
+    as individuals or locations. Spartitions are listed in file order. The
+    size and modification time of the file tell whether it changed since.
+    """
+
+    size: int
+    mtime_ns: int
+    encoding: str | None
+    sections: dict[str, ElementRange]
+    spartitions: list[SpartitionRange]
+
+
 class Results(NamedTuple):
     output_path: Path
     seconds_taken: float
+    stages: tuple[StageStats, ...] = ()
 
 
 class WarnResults(NamedTuple):
@@ -42,6 +42,10 @@ class Model(BlastTaskModel):
 
     co_ocurrence_threshold = Property(float, 5.0)
     morphometrics_threshold = Property(float, 0.05)
+    workers = Property(int, 0)
+
+    asap_cache_path = Property(Path, process.ASAP_CACHE_PATH)
+    asap_cache_size = Property(int, process.ASAP_CACHE_SIZE)
 
     def __init__(self, name=None):
         super().__init__(name)
@@ -107,6 +111,9 @@ class Model(BlastTaskModel):
             morphometrics_threshold=self.morphometrics_threshold,
             asapy_mode=self.asapy_mode,
             asapy_options=self.asapy_options.as_dict(),
+            workers=self.workers,
+            asap_cache_path=self.path_or_none(self.asap_cache_path),
+            asap_cache_size=self.asap_cache_size,
         )
 
     def onDone(self, report: ReportDone):
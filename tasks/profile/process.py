@@ -1,8 +1,62 @@
+import hashlib
+import json
+import os
+import shutil
 from pathlib import Path
 from time import perf_counter
 from tempfile import TemporaryDirectory
 
-from ..common.types import Results
+from ..common.process import StageRecorder, cpu_time, pool_map, print_stages
+from ..common.columnar import export_columnar
+from ..common.store import read_spart, write_spart
+from ..common.types import Results, StageStats
+from .types import EvidenceStage, StageInput
+
+# Where evidence stage results are kept between runs, per spartition.
+EVIDENCE_CACHE_PATH = Path.home() / ".cache" / "concordance-pilot" / "evidence"
+
+# Bump whenever the evidence functions in core change their output,
+# so that older cache entries are no longer used.
+EVIDENCE_CACHE_VERSION = 1
+
+# Where ASAP output is kept between runs, per input file and options.
+ASAP_CACHE_PATH = Path.home() / ".cache" / "concordance-pilot" / "asap"
+
+# Disk space for ASAP output in megabytes. Least recently used files
+# are dropped to make room for new ones.
+ASAP_CACHE_SIZE = 256
+
+ASAP_CACHE_VERSION = 1
+
+# Every option that changes what ASAP writes.
+ASAP_OPTION_KEYS = [
+    "sequence_length",
+    "number",
+    "seuil_pvalue",
+    "seed",
+    "method",
+    "kimura_rate",
+]
+
+CONCORDANCE_KEYS = [
+    "evidenceType",
+    "evidenceDataType",
+    "evidenceDiscriminationType",
+    "evidenceDiscriminationDataType",
+    "evidenceDiscriminationUnit",
+]
+
+LIMIT_KEYS = [
+    "subsetnumberA",
+    "subsetnumberB",
+    "NIndividualsSubsetA",
+    "NIndividualsSubsetB",
+    "concordanceSupport",
+]
+
+# What one stage adds to one spartition: for each concordance in order,
+# its label, its data and its concordant limits.
+StageResult = list[tuple[str, dict[str, object], list[dict[str, object]]]]
 
 
 def initialize():
@@ -14,17 +68,205 @@ def initialize():
     import itaxotools.spart_parser  # noqa
 
 
-def execute(
-    subset_path: Path,
-    output_path: Path,
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_membership(spart, spartition: str) -> str:
+    """Digest of the subsets of a spartition and the individuals in each."""
+    membership = [
+        [subset, sorted(spart.getSubsetIndividuals(spartition, subset))]
+        for subset in spart.getSpartitionSubsets(spartition)
+    ]
+    return hashlib.sha256(json.dumps(membership).encode()).hexdigest()
+
+
+class EvidenceCache:
+    """Stage results stored as one JSON file per stage and spartition.
+
+    Entries are addressed by the hash of everything that goes into them, so
+    they never need invalidating: a changed input simply maps elsewhere.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def get_key(self, stage: StageInput, input_hash: str, membership: str) -> str:
+        content = [
+            EVIDENCE_CACHE_VERSION,
+            stage.stage.key,
+            input_hash,
+            stage.parameters,
+            membership,
+        ]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    def get_entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def load(self, key: str) -> StageResult | None:
+        try:
+            with open(self.get_entry_path(key)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, result: StageResult):
+        path = self.get_entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp, "w") as file:
+            json.dump(result, file)
+        os.replace(temp, path)
+
+
+class AsapCache:
+    """ASAP output stored as one SPART file per input and options.
+
+    Files are touched whenever they are used, so that the least recently
+    used ones can be evicted once the cache outgrows its size limit.
+    """
+
+    def __init__(self, path: Path, size: int):
+        self.path = path
+        self.limit = size * 1024 * 1024
+
+    def get_key(self, input_hash: str, options: dict[str, object]) -> str:
+        content = [ASAP_CACHE_VERSION, input_hash]
+        content += [options[key] for key in ASAP_OPTION_KEYS]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    def get_entry_path(self, key: str) -> Path:
+        return self.path / f"{key}.xml"
+
+    def load(self, key: str) -> Path | None:
+        path = self.get_entry_path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, key: str, source: Path) -> Path | None:
+        """Copy the file into the cache, or return None if it cannot fit."""
+        size = source.stat().st_size
+        if size > self.limit:
+            return None
+        self.evict(self.limit - size)
+        path = self.get_entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        shutil.copyfile(source, temp)
+        os.replace(temp, path)
+        return path
+
+    def evict(self, limit: int):
+        """Remove the least recently used files until the rest fit the limit."""
+        entries = []
+        for path in self.path.glob("*.xml"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+
+def run_asap(options: dict[str, object], target: Path) -> Path:
+    """Run ASAP on the input sequences and return the SPART file it wrote."""
+    from itaxotools.asapy import PartitionAnalysis
+
+    a = PartitionAnalysis(options.input_path)
+    a.params.general.sequence_length = options.sequence_length
+    a.params.advanced.number = options.number
+    a.params.advanced.seuil_pvalue = options.seuil_pvalue
+    a.params.advanced.seed = options.seed
+    a.params.distance.method = options.method
+    a.params.distance.rate = options.kimura_rate
+
+    a.target = target.as_posix()
+
+    a.run()
+
+    xml_files = list(target.glob("*.xml"))
+    if not xml_files:
+        raise Exception("ASAPy did not generate any XML files, exiting...")
+    return xml_files[0]
+
+
+def get_stages(
     coord_path: Path | None,
     morphometrics_path: Path | None,
     sequence_paths: list[Path],
     co_ocurrence_threshold: float,
     morphometrics_threshold: float,
-    asapy_mode: bool,
-    asapy_options: dict[str, object],
-) -> Results:
+) -> list[StageInput]:
+    """The evidence stages to run, in the order their results are written."""
+    stages = []
+    if coord_path:
+        stages.append(StageInput(EvidenceStage.Polygons, coord_path, {}))
+        stages.append(
+            StageInput(
+                EvidenceStage.Coocurrences,
+                coord_path,
+                dict(threshold=co_ocurrence_threshold),
+            )
+        )
+    if morphometrics_path:
+        stages.append(
+            StageInput(
+                EvidenceStage.Morphometrics,
+                morphometrics_path,
+                dict(alpha=morphometrics_threshold),
+            )
+        )
+    for sequence_path in sequence_paths:
+        stages.append(
+            StageInput(
+                EvidenceStage.Haplostats,
+                sequence_path,
+                dict(label=sequence_path.stem),
+            )
+        )
+    return stages
+
+
+def reduce_spart(spart, spartitions: list[str]):
+    """A copy holding nothing but the individuals and the given spartitions."""
+    from itaxotools.spart_parser import Spart
+
+    reduced = Spart()
+    reduced.spartDict["individuals"] = spart.spartDict.get("individuals", {})
+    for number, spartition in enumerate(spartitions, start=1):
+        source = spart.getSpartitionFromLabel(spartition)
+        reduced.spartDict["spartitions"][str(number)] = {
+            key: source[key] for key in ["label", "subsets"]
+        }
+    return reduced
+
+
+def compute_stage(
+    job: tuple[StageInput, object],
+) -> tuple[dict[str, StageResult], StageStats]:
+    """Run one stage of core on a reduced Spart, for use on a worker pool.
+
+    Results are read back per spartition, so that they can be cached and
+    merged independently of the other stages. The stage is timed here,
+    on whichever worker it ran.
+    """
     from core import (
         read_latlons_from_spart,
         read_latlons_from_tabfile,
@@ -36,50 +278,195 @@ def execute(
     )
     from itaxotools.taxi2.sequences import SequenceHandler, Sequences
     from itaxotools.taxi2.files import is_tabfile
-    from itaxotools.spart_parser import Spart
-    from itaxotools.asapy import PartitionAnalysis
+
+    stage, reduced = job
 
     ts = perf_counter()
+    cs = cpu_time()
 
-    if asapy_mode:
-        a = PartitionAnalysis(asapy_options.input_path)
-        a.params.general.sequence_length = asapy_options.sequence_length
-        a.params.advanced.number = asapy_options.number
-        a.params.advanced.seuil_pvalue = asapy_options.seuil_pvalue
-        a.params.advanced.seed = asapy_options.seed
-        a.params.distance.method = asapy_options.method
-        a.params.distance.rate = asapy_options.kimura_rate
+    if stage.stage in [EvidenceStage.Polygons, EvidenceStage.Coocurrences]:
+        if is_tabfile(stage.path):
+            latlons = read_latlons_from_tabfile(stage.path)
+        else:
+            latlons = read_latlons_from_spart(stage.path)
+        if stage.stage == EvidenceStage.Polygons:
+            pairs = process_polygons(reduced, latlons)
+        else:
+            threshold = stage.parameters["threshold"]
+            pairs = process_coocurrences(reduced, latlons, threshold)
+    elif stage.stage == EvidenceStage.Morphometrics:
+        morphometrics = read_morphometrics_from_tabfile(stage.path)
+        pairs = process_morphometrics_multiple(
+            reduced, morphometrics, stage.parameters["alpha"]
+        )
+    elif stage.stage == EvidenceStage.Haplostats:
+        sequences = Sequences.fromPath(stage.path, SequenceHandler.Fasta)
+        pairs = process_haplostats(reduced, sequences, label=stage.parameters["label"])
 
-        temp = TemporaryDirectory(prefix="asap_")
-        a.target = Path(temp.name).as_posix()
+    results = {
+        spartition: read_stage_result(reduced, spartition)
+        for spartition in reduced.getSpartitions()
+    }
 
-        a.run()
+    tf = perf_counter()
+    cf = cpu_time()
 
-        xml_files = list(Path(temp.name).glob("*.xml"))
-        if not xml_files:
-            raise Exception("ASAPy did not generate any XML files, exiting...")
-        subset_path = xml_files[0]
+    counters = dict(spartitions=len(results), pairs=pairs)
+    return results, StageStats(stage.name, tf - ts, cf - cs, 1, counters)
 
-    spart = Spart.fromXML(subset_path)
 
-    if coord_path:
-        if is_tabfile(coord_path):
-            latlons = read_latlons_from_tabfile(coord_path)
+def read_stage_result(spart, spartition: str) -> StageResult:
+    result = []
+    for concordance in spart.getSpartitionConcordances(spartition):
+        data = spart.getConcordanceData(spartition, concordance)
+        limits = spart.getConcordantLimits(spartition, concordance)
+        result.append(
+            (
+                concordance,
+                {key: data[key] for key in CONCORDANCE_KEYS if data.get(key)},
+                [{key: limit[key] for key in LIMIT_KEYS} for limit in limits],
+            )
+        )
+    return result
+
+
+def write_stage_result(spart, spartition: str, result: StageResult):
+    for concordance, data, limits in result:
+        spart.addConcordance(spartition, concordance, **data)
+        for limit in limits:
+            spart.addConcordantLimit(
+                spartitionLabel=spartition, concordanceLabel=concordance, **limit
+            )
+
+
+def execute(
+    subset_path: Path,
+    output_path: Path,
+    coord_path: Path | None,
+    morphometrics_path: Path | None,
+    sequence_paths: list[Path],
+    co_ocurrence_threshold: float,
+    morphometrics_threshold: float,
+    asapy_mode: bool,
+    asapy_options: dict[str, object],
+    cache_path: Path | None = EVIDENCE_CACHE_PATH,
+    workers: int = 0,
+    asap_cache_path: Path | None = ASAP_CACHE_PATH,
+    asap_cache_size: int = ASAP_CACHE_SIZE,
+    columnar_format: str | None = None,
+) -> Results:
+    ts = perf_counter()
+    recorder = StageRecorder()
+
+    if asapy_mode:
+        asap_cache = None
+        if asap_cache_path and asap_cache_size > 0:
+            asap_cache = AsapCache(asap_cache_path, asap_cache_size)
+            asap_key = asap_cache.get_key(
+                hash_file(asapy_options.input_path), asapy_options
+            )
+            subset_path = asap_cache.load(asap_key)
+
+        if asap_cache and subset_path:
+            print(f"ASAP: reusing cached result from {asap_cache_path}")
+            recorder.add(StageStats("ASAP", 0.0, 0.0, 0, dict(cache_hits=1)))
         else:
-            latlons = read_latlons_from_spart(coord_path)
-        process_polygons(spart, latlons)
-        process_coocurrences(spart, latlons, co_ocurrence_threshold)
+            with recorder.stage("ASAP"):
+                temp = TemporaryDirectory(prefix="asap_")
+                subset_path = run_asap(asapy_options, Path(temp.name))
+                if asap_cache:
+                    stored = asap_cache.store(asap_key, subset_path)
+                    subset_path = stored or subset_path
 
-    if morphometrics_path:
-        morphometrics = read_morphometrics_from_tabfile(morphometrics_path)
-        process_morphometrics_multiple(spart, morphometrics, morphometrics_threshold)
+    with recorder.stage("Read") as counters:
+        spart = read_spart(subset_path)
+        spartitions = spart.getSpartitions()
+        counters["spartitions"] = len(spartitions)
 
-    for sequence_path in sequence_paths:
-        sequences = Sequences.fromPath(sequence_path, SequenceHandler.Fasta)
-        process_haplostats(spart, sequences, label=sequence_path.stem)
+    stages = get_stages(
+        coord_path,
+        morphometrics_path,
+        sequence_paths,
+        co_ocurrence_threshold,
+        morphometrics_threshold,
+    )
+
+    cache = EvidenceCache(cache_path) if cache_path else None
+
+    stage_results: list[dict[str, StageResult]] = []
+    stage_keys: list[dict[str, str]] = []
+    jobs = []
+    with recorder.stage("Cache lookup") as counters:
+        if cache:
+            print(f"Evidence cache: {cache_path}")
+            memberships = {
+                spartition: hash_membership(spart, spartition)
+                for spartition in spartitions
+            }
+
+        for stage in stages:
+            results: dict[str, StageResult] = {}
+            keys: dict[str, str] = {}
+            if cache:
+                input_hash = hash_file(stage.path)
+                for spartition in spartitions:
+                    key = cache.get_key(stage, input_hash, memberships[spartition])
+                    result = cache.load(key)
+                    if result is not None:
+                        results[spartition] = result
+                    else:
+                        keys[spartition] = key
+
+            missing = [
+                spartition for spartition in spartitions if spartition not in results
+            ]
+            if missing:
+                jobs.append((stage, reduce_spart(spart, missing)))
 
-    spart.toXML(output_path)
+            print(
+                f"{stage.name}: {len(spartitions) - len(missing)} cached, "
+                f"{len(missing)} computed"
+            )
+            counters["cache_hits"] += len(spartitions) - len(missing)
+            counters["cache_misses"] += len(missing) if cache else 0
+            stage_results.append(results)
+            stage_keys.append(keys)
+
+    # Stages share nothing but the subsets, so they run side by side.
+    with recorder.stage("Evidence") as counters:
+        computed = iter(pool_map(compute_stage, jobs, workers))
+        counters["stages"] = len(jobs)
+    for stage, results, keys in zip(stages, stage_results, stage_keys):
+        if len(results) == len(spartitions):
+            continue
+        computed_results, stats = next(computed)
+        recorder.add(stats)
+        for spartition, result in computed_results.items():
+            results[spartition] = result
+            if cache:
+                cache.store(keys[spartition], result)
+
+    # Stage by stage, which is the order core would have written them in.
+    with recorder.stage("Merge") as counters:
+        for results in stage_results:
+            for spartition in spartitions:
+                result = results[spartition]
+                write_stage_result(spart, spartition, result)
+                counters["limits"] += sum(len(limits) for _, _, limits in result)
+
+    # A store already holding an earlier run only gets the rows that changed.
+    with recorder.stage("Write") as counters:
+        rows = write_spart(spart, output_path)
+        if rows is not None:
+            counters["rows"] = rows
+
+    if columnar_format:
+        with recorder.stage("Columnar") as counters:
+            counters.update(export_columnar(spart, output_path, columnar_format))
 
     tf = perf_counter()
 
-    return Results(output_path, tf - ts)
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return Results(output_path, tf - ts, stages)
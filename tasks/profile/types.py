@@ -1,4 +1,6 @@
-from enum import IntEnum
+from enum import Enum, IntEnum
+from pathlib import Path
+from typing import NamedTuple
 
 
 class SubstitutionModel(IntEnum):
@@ -16,3 +18,28 @@ class SubstitutionModel(IntEnum):
 
     def __str__(self):
         return f"{self.description} ({self.value})"
+
+
+class EvidenceStage(Enum):
+    Polygons = "polygons", "Polygons"
+    Coocurrences = "coocurrences", "Co-occurrences"
+    Morphometrics = "morphometrics", "Morphometrics"
+    Haplostats = "haplostats", "Haplostats"
+
+    def __init__(self, key: str, label: str):
+        self.key = key
+        self.label = label
+
+
+class StageInput(NamedTuple):
+    """One evidence stage to run: its kind, input file and parameters."""
+
+    stage: EvidenceStage
+    path: Path
+    parameters: dict[str, object]
+
+    @property
+    def name(self) -> str:
+        if "label" in self.parameters:
+            return f"{self.stage.label} ({self.parameters['label']})"
+        return self.stage.label
@@ -14,6 +14,7 @@ from ..common.view import (
     BlastTaskView,
     GraphicTitleCard,
     PathSelector,
+    PathDirectorySelector,
     BatchSequenceSelector,
 )
 from ..common.types import Results
@@ -39,7 +40,7 @@ class PathFileOutSelector(PathSelector):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(
             parent=self.window(),
             caption=f"{app.config.title} - Save file",
-            filter="SPART XML (*.xml)",
+            filter="SPART XML (*.xml);;SPART store (*.sqlite)",
         )
         if not filename:
             return
@@ -85,6 +86,18 @@ class OptionsSelector(Card):
         self.controls.morphometrics_threshold = field
         row += 1
 
+        name = QtWidgets.QLabel("Parallel stages:")
+        field = IntPropertyLineEdit()
+        description = QtWidgets.QLabel(
+            "Evidence stages computed at once, or 0 for one per processor."
+        )
+        description.setStyleSheet("QLabel { font-style: italic; }")
+        options_layout.addWidget(name, row, 1)
+        options_layout.addWidget(field, row, 2)
+        options_layout.addWidget(description, row, 3)
+        self.controls.workers = field
+        row += 1
+
         self.addLayout(title_layout)
         self.addLayout(options_layout)
 
@@ -258,6 +271,35 @@ class AsapSelector(PathFileSelector):
         self.addLayout(layout)
 
 
+class AsapCacheSelector(PathDirectorySelector):
+    def __init__(self, text, parent=None):
+        super().__init__(text, parent)
+        self.draw_options()
+
+    def draw_options(self):
+        layout = QtWidgets.QGridLayout()
+        layout.setColumnMinimumWidth(0, 16)
+        layout.setColumnMinimumWidth(1, 54)
+        layout.setColumnStretch(3, 1)
+        layout.setHorizontalSpacing(32)
+        layout.setVerticalSpacing(8)
+        row = 0
+
+        name = QtWidgets.QLabel("Cache size (MB):")
+        field = IntPropertyLineEdit()
+        description = QtWidgets.QLabel(
+            "Disk space for earlier ASAP results, or 0 to always run ASAP again."
+        )
+        description.setStyleSheet("QLabel { font-style: italic; }")
+        layout.addWidget(name, row, 1)
+        layout.addWidget(field, row, 2)
+        layout.addWidget(description, row, 3)
+        self.controls.size = field
+        row += 1
+
+        self.addLayout(layout)
+
+
 class View(BlastTaskView):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -271,6 +313,7 @@ class View(BlastTaskView):
         self.cards.progress = ProgressCard(self)
         self.cards.mode = ModeSelector("\u25CF  Spartitions", self)
         self.cards.asapy = AsapSelector("\u25C0  ASAP Sequences", self)
+        self.cards.asap_cache = AsapCacheSelector("\u25E6  ASAP Cache", self)
         self.cards.subsets = PathFileSelector("\u25C0  Subsets", self)
         self.cards.output = PathFileOutSelector("\u25B6  Output", self)
         self.cards.coords = PathFileSelector("\u25E6  Coordinates", self)
@@ -279,6 +322,9 @@ class View(BlastTaskView):
         self.cards.options = OptionsSelector(self)
 
         self.cards.asapy.set_placeholder_text("FASTA file to be processed by ASAPy")
+        self.cards.asap_cache.set_placeholder_text(
+            "Folder keeping earlier ASAP results, leave empty to disable"
+        )
         self.cards.subsets.set_placeholder_text("SPART XML file describing all subsets")
         self.cards.output.set_placeholder_text(
             "Resulting SPART XML file with concordance information"
@@ -294,6 +340,7 @@ class View(BlastTaskView):
         )
 
         self.cards.asapy.roll = VerticalRollAnimation(self.cards.asapy)
+        self.cards.asap_cache.roll = VerticalRollAnimation(self.cards.asap_cache)
         self.cards.subsets.roll = VerticalRollAnimation(self.cards.subsets)
 
         layout = QtWidgets.QVBoxLayout()
@@ -322,6 +369,9 @@ class View(BlastTaskView):
         self.binder.bind(
             object.properties.asapy_mode, self.cards.asapy.roll.setAnimatedVisible
         )
+        self.binder.bind(
+            object.properties.asapy_mode, self.cards.asap_cache.roll.setAnimatedVisible
+        )
         self.binder.bind(
             object.properties.asapy_mode,
             self.cards.subsets.roll.setAnimatedVisible,
@@ -338,6 +388,16 @@ class View(BlastTaskView):
             self.cards.asapy.selectedPath, object.asapy_options.properties.input_path
         )
 
+        self.binder.bind(
+            object.properties.asap_cache_path, self.cards.asap_cache.set_path
+        )
+        self.binder.bind(
+            self.cards.asap_cache.selectedPath, object.properties.asap_cache_path
+        )
+        self.cards.asap_cache.controls.size.bind_property(
+            object.properties.asap_cache_size
+        )
+
         self.binder.bind(object.properties.output_path, self.cards.output.set_path)
         self.binder.bind(self.cards.output.selectedPath, object.properties.output_path)
 
@@ -359,6 +419,7 @@ class View(BlastTaskView):
         self.cards.options.controls.morphometrics_threshold.bind_property(
             object.properties.morphometrics_threshold
         )
+        self.cards.options.controls.workers.bind_property(object.properties.workers)
 
         self.cards.asapy.controls.number.bind_property(
             object.asapy_options.properties.number
@@ -2,6 +2,8 @@ from PySide6 import QtCore, QtGui
 
 from pathlib import Path
 
+import numpy as np
+
 from itaxotools.common.bindings import Instance, Property
 from itaxotools.taxi_gui.model.tasks import SubtaskModel
 from itaxotools.taxi_gui.threading import ReportDone
@@ -15,6 +17,10 @@ from .types import (
     SORT_ARROW_ASCENDING,
     SORT_ARROW_DESCENDING,
     ExportResults,
+    Ranking,
+    SOURCE_COLUMN,
+    ScoreColumn,
+    ScoreTable,
 )
 
 
@@ -28,6 +34,14 @@ class ExportSubtaskModel(SubtaskModel):
         self.busy = False
 
 
+class PreviewSubtaskModel(ExportSubtaskModel):
+    task_name = "PreviewSubtask"
+
+
+class RankingSubtaskModel(ExportSubtaskModel):
+    task_name = "RankingSubtask"
+
+
 class SpartitionTableModel(QtCore.QAbstractTableModel):
     """Spartitions are columns and scores are rows, as in the Visualize task.
 
@@ -35,22 +49,41 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
     proxy. It is kept here in `order` and rebuilt on demand, which also makes
     it the single source of truth for the export order.
 
+    Scores are kept by column in a ScoreTable, and `order` holds indices into
+    it. Sort keys for all spartitions are cached for each score and direction,
+    so that neither sorting nor removing spartitions goes through the scores
+    one by one. Cell text is formatted once, when first painted.
+
+    All spartitions are kept sorted in `sequence`, and `order` is the part of
+    it that is neither removed nor filtered out. A filter therefore keeps its
+    place through sorting, and clearing it brings back the rest in order.
+
     Columns are headed by a short letter rather than the full spartition name,
     which would be far too wide. The letter is assigned in file order and
     travels with its spartition through sorting, so it stays a stable handle
     and matches the letter the Visualize task gives the same spartition.
+
+    Rankings add derived rows, computed once over all spartitions in the file
+    and stored as extra score columns, so they sort and filter like the rest.
     """
 
     def __init__(self, parent=None):
         super().__init__(parent)
         # A copy: rows are removable, and SCORE_COLUMNS is shared module state.
         self.score_rows = list(SCORE_COLUMNS)
-        self.order: list[str] = []
-        self.labels: dict[str, str] = {}
-        self.scores: dict[str, dict[str, float | bool | None]] = {}
+        self.scores = ScoreTable.empty()
+        self.sequence = np.empty(0, dtype=np.intp)
+        self.removed = np.empty(0, dtype=bool)
+        self.matches = np.empty(0, dtype=bool)
+        self.order = np.empty(0, dtype=np.intp)
+        self.labels: list[str] = []
+        self.filter: process.ScoreFilter | None = None
+        self.rankings: dict[str, Ranking] = {}
         self.sort_row: int | None = None
         self.sort_by_name = False
         self.sort_ascending = True
+        self._sort_keys: dict[tuple[str | None, bool], np.ndarray] = {}
+        self._strings: dict[str, list[str | None]] = {}
 
     def rowCount(self, parent=QtCore.QModelIndex()):
         return len(self.score_rows)
@@ -70,9 +103,16 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
             return f"{value:.3f}"
         return str(value)
 
-    @staticmethod
-    def sort_key(value: float | bool) -> float:
-        return float(value)
+    def get_string(self, column: ScoreColumn, index: int) -> str:
+        strings = self._strings.get(column.name)
+        if strings is None:
+            strings = [None] * len(self.scores.spartitions)
+            self._strings[column.name] = strings
+        string = strings[index]
+        if string is None:
+            string = self.format_value(self.scores.get_value(column, index))
+            strings[index] = string
+        return string
 
     def data(self, index, role=QtCore.Qt.DisplayRole):
         if not index.isValid():
@@ -80,16 +120,16 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
 
         spartition = self.order[index.column()]
         column = self.score_rows[index.row()]
-        value = self.scores[spartition].get(column.name, None)
 
         if role == QtCore.Qt.UserRole:
-            return value
+            return self.scores.get_value(column, spartition)
         if role == QtCore.Qt.DisplayRole:
-            return self.format_value(value)
+            return self.get_string(column, spartition)
         if role == QtCore.Qt.TextAlignmentRole:
             return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
         if role == QtCore.Qt.ToolTipRole:
-            return f"{spartition}\n{column.name}: {self.format_value(value)}"
+            name = self.scores.spartitions[spartition]
+            return f"{name}\n{column.name}: {self.get_string(column, spartition)}"
 
         return None
 
@@ -101,7 +141,7 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
             if role == QtCore.Qt.DisplayRole:
                 return self.labels[spartition]
             if role == QtCore.Qt.ToolTipRole:
-                return spartition
+                return self.scores.spartitions[spartition]
             if role == QtCore.Qt.TextAlignmentRole:
                 return QtCore.Qt.AlignCenter
             return None
@@ -127,38 +167,103 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
                 return font
             return None
         if role == QtCore.Qt.ToolTipRole:
+            if column.name in self.rankings:
+                return self.rankings[column.name].describe()
+            if column is SOURCE_COLUMN:
+                return "The file each spartition came from, numbered from 1"
             if column.key is None:
                 return f"{column.name} (derived from the spartition)"
             return f"{column.name} ({column.key})"
 
         return None
 
-    def set_data(self, score_table: dict[str, dict[str, float | bool | None]]):
+    def set_data(self, scores: ScoreTable):
         self.beginResetModel()
         self.score_rows = list(SCORE_COLUMNS)
-        self.order = list(score_table)
-        self.labels = {
-            spartition: column_label(index)
-            for index, spartition in enumerate(self.order)
-        }
-        self.scores = score_table
+        if SOURCE_COLUMN.name in scores.columns:
+            self.score_rows.insert(0, SOURCE_COLUMN)
+        self.scores = scores
+        self.sequence = np.arange(len(scores.spartitions))
+        self.removed = np.zeros(len(scores.spartitions), dtype=bool)
+        self.rankings = {}
+        self.matches = self.get_matches()
+        self.order = self.get_shown()
+        self.labels = [column_label(index) for index in range(len(self.sequence))]
         self.sort_row = None
         self.sort_by_name = False
         self.sort_ascending = True
+        self._sort_keys = {}
+        self._strings = {}
         self.endResetModel()
 
     def clear(self):
         self.beginResetModel()
-        self.order = []
-        self.labels = {}
-        self.scores = {}
+        self.scores = ScoreTable.empty()
+        self.sequence = np.empty(0, dtype=np.intp)
+        self.removed = np.empty(0, dtype=bool)
+        self.matches = np.empty(0, dtype=bool)
+        self.order = np.empty(0, dtype=np.intp)
+        self.labels = []
+        self.rankings = {}
         self.sort_row = None
         self.sort_by_name = False
+        self._sort_keys = {}
+        self._strings = {}
+        self.endResetModel()
+
+    def get_matches(self) -> np.ndarray:
+        if self.filter is not None:
+            try:
+                return self.filter(self.scores)
+            except KeyError:
+                # The filter names a ranking that belonged to another file.
+                self.filter = None
+        return np.ones(len(self.scores.spartitions), dtype=bool)
+
+    def get_shown(self) -> np.ndarray:
+        shown = self.matches & ~self.removed
+        return self.sequence[shown[self.sequence]]
+
+    def set_filter(self, text: str):
+        """Show only the spartitions matching a ScoreFilter expression, or
+        all of them if the text is blank. Raises ValueError if the expression
+        is malformed, leaving the current filter in place."""
+        filter = None
+        if text.strip():
+            filter = process.ScoreFilter(text, names=self.scores.columns)
+        self.beginResetModel()
+        self.filter = filter
+        self.matches = self.get_matches()
+        self.order = self.get_shown()
+        self.endResetModel()
+
+    def set_ranking(self, ranking: Ranking, values: np.ndarray):
+        """Add the derived row of a ranking, or replace the row left by an
+        earlier ranking of the same method. A row sorted or filtered on is
+        sorted and filtered again with the new values."""
+        name = ranking.name
+
+        self.beginResetModel()
+        self.scores = self.scores._replace(
+            columns={**self.scores.columns, name: values}
+        )
+        self.rankings[name] = ranking
+        if name not in (column.name for column in self.score_rows):
+            self.score_rows.append(ScoreColumn(name, None, "int"))
+        self._sort_keys = {
+            key: keys for key, keys in self._sort_keys.items() if key[0] != name
+        }
+        self._strings.pop(name, None)
+        self.matches = self.get_matches()
+        self.order = self.get_shown()
         self.endResetModel()
 
+        if self.sort_row is not None and self.score_rows[self.sort_row].name == name:
+            self.reorder()
+
     def sort_by_score(self, section: int):
         """Order the spartition columns by the given score row."""
-        if not self.order:
+        if not len(self.order):
             return
         if self.sort_row == section and not self.sort_by_name:
             self.sort_ascending = not self.sort_ascending
@@ -169,7 +274,7 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
         self.reorder()
 
     def sort_by_spartition_name(self):
-        if not self.order:
+        if not len(self.order):
             return
         if self.sort_by_name:
             self.sort_ascending = not self.sort_ascending
@@ -179,35 +284,55 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
             self.sort_ascending = True
         self.reorder()
 
+    def get_sort_keys(self, name: str | None, ascending: bool) -> np.ndarray:
+        """Sort key of every spartition for the named score, or for the
+        spartition name if None. Equal values get equal keys, so that a
+        stable sort leaves ties in the order they are currently shown.
+        Computed once per score and direction."""
+        key = (name, ascending)
+        if key not in self._sort_keys:
+            if name is None:
+                names = [label.casefold() for label in self.scores.spartitions]
+                permutation = sorted(
+                    range(len(names)), key=names.__getitem__, reverse=not ascending
+                )
+                permutation = np.array(permutation, dtype=np.intp)
+                values = np.array(names, dtype=object)[permutation]
+                changes = values[1:] != values[:-1]
+            else:
+                permutation = self.scores.argsort(name, not ascending)
+                values = self.scores.columns[name][permutation]
+                missing = np.isnan(values)
+                changes = (values[1:] != values[:-1]) & ~(missing[1:] & missing[:-1])
+            ranks = np.zeros(len(permutation), dtype=np.intp)
+            ranks[1:] = np.cumsum(changes)
+            keys = np.empty(len(permutation), dtype=np.intp)
+            keys[permutation] = ranks
+            self._sort_keys[key] = keys
+        return self._sort_keys[key]
+
     def reorder(self):
         if self.sort_by_name:
-            order = sorted(
-                self.order, key=str.casefold, reverse=not self.sort_ascending
-            )
+            keys = self.get_sort_keys(None, self.sort_ascending)
         elif self.sort_row is not None:
             name = self.score_rows[self.sort_row].name
-            present = [s for s in self.order if self.scores[s].get(name) is not None]
-            missing = [s for s in self.order if self.scores[s].get(name) is None]
-            present.sort(
-                key=lambda s: self.sort_key(self.scores[s][name]),
-                reverse=not self.sort_ascending,
-            )
-            # Spartitions missing the score stay at the end either way.
-            order = present + missing
+            keys = self.get_sort_keys(name, self.sort_ascending)
         else:
             return
 
         self.beginResetModel()
-        self.order = order
+        self.sequence = self.sequence[np.argsort(keys[self.sequence], kind="stable")]
+        self.order = self.get_shown()
         self.endResetModel()
 
     def remove_columns(self, columns: list[int]):
         """Drop the given spartition columns from the view, not from the file."""
-        chosen = {self.order[c] for c in columns if 0 <= c < len(self.order)}
-        if not chosen:
+        columns = [c for c in columns if 0 <= c < len(self.order)]
+        if not columns:
             return
         self.beginResetModel()
-        self.order = [s for s in self.order if s not in chosen]
+        self.removed[self.order[columns]] = True
+        self.order = self.get_shown()
         self.endResetModel()
 
     def remove_rows(self, rows: list[int]):
@@ -234,7 +359,7 @@ class SpartitionTableModel(QtCore.QAbstractTableModel):
 
     def get_spartitions(self) -> list[str]:
         """Every spartition still shown, in the order the table shows them."""
-        return list(self.order)
+        return [self.scores.spartitions[index] for index in self.order]
 
     def get_keys(self) -> list[str]:
         """The SPART keys of every score row still shown."""
@@ -245,10 +370,12 @@ class Model(BlastTaskModel):
     task_name = title
 
     report_saved = QtCore.Signal(object)
+    report_preview = QtCore.Signal(str, object)
+    report_ranked = QtCore.Signal(object)
 
-    concordance_path = Property(Path, Path())
+    concordance_paths = Property(list, [])
     individual_list = Property(list, [])
-    subset_table = Property(dict, {})
+    origins = Property(dict, {})
     spartitions = Property(SpartitionTableModel, Instance)
 
     def __init__(self, name=None):
@@ -264,6 +391,17 @@ class Model(BlastTaskModel):
         self.subtask_export = ExportSubtaskModel(self, bind_busy=True)
         self.binder.bind(self.subtask_export.done, self._handle_export_done)
 
+        # Subsets are read from the file only when a spartition is previewed.
+        self.subtask_preview = PreviewSubtaskModel(self, bind_busy=False)
+        self.binder.bind(self.subtask_preview.done, self._handle_preview_done)
+        self.preview_spartition: str | None = None
+
+        # Rankings of many spartitions take seconds, so they are computed
+        # off the GUI thread, and only added to the table once done.
+        self.subtask_ranking = RankingSubtaskModel(self, bind_busy=True)
+        self.binder.bind(self.subtask_ranking.done, self._handle_ranking_done)
+        self.pending_ranking: tuple[Ranking, object] | None = None
+
     def isReady(self):
         return True
 
@@ -272,28 +410,31 @@ class Model(BlastTaskModel):
 
         self.exec(
             process.execute,
-            concordance_path=self.concordance_path,
+            concordance_paths=self.concordance_paths,
         )
 
     def onDone(self, report: ReportDone):
         self.individual_list = report.result.individual_list
-        self.subset_table = report.result.subset_table
-        self.spartitions.set_data(report.result.score_table)
+        self.origins = dict(
+            zip(report.result.scores.spartitions, report.result.origins)
+        )
+        self.spartitions.set_data(report.result.scores)
         self.report_results.emit(self.task_name, report.result)
         self.busy = False
         self.done = True
 
-    def open(self, path: Path):
-        self.concordance_path = path
+    def open(self, *paths: Path):
+        """Review one or more files, merged into a single table."""
+        self.concordance_paths = list(paths)
         self.start()
 
     def clear(self):
-        """Restore the table by reading the file again."""
+        """Restore the table by reading the files again."""
         super().clear()
-        if self.concordance_path == Path():
+        if not self.concordance_paths:
             self.spartitions.clear()
             self.individual_list = []
-            self.subset_table = {}
+            self.origins = {}
             return
         self.start()
 
@@ -306,12 +447,50 @@ class Model(BlastTaskModel):
 
         self.subtask_export.start(
             process.export,
-            self.concordance_path,
+            self.concordance_paths,
             path,
-            spartitions,
+            [self.origins[spartition] for spartition in spartitions],
             keys,
         )
 
+    def preview(self, spartition: str):
+        """Read the subsets of a spartition, then report them for preview.
+        Ignored while another preview is still being read."""
+        if self.subtask_preview.busy or spartition not in self.origins:
+            return
+        source, position = self.origins[spartition]
+        self.preview_spartition = spartition
+        self.subtask_preview.start(
+            process.read_subsets,
+            self.concordance_paths[source],
+            position,
+        )
+
+    def add_ranking(self, ranking: Ranking):
+        """Compute the derived row of a ranking, then add it to the table.
+        Ignored while another ranking is still being computed."""
+        if self.subtask_ranking.busy:
+            return
+        scores = self.spartitions.scores
+        self.pending_ranking = (ranking, scores.spartitions)
+        # Only the scores being ranked are sent to the subtask.
+        criteria = scores._replace(
+            columns={name: scores.columns[name] for name, _ in ranking.criteria}
+        )
+        self.subtask_ranking.start(process.get_ranking, criteria, ranking)
+
+    def _handle_preview_done(self, report: ReportDone):
+        self.report_preview.emit(self.preview_spartition, report.result)
+
+    def _handle_ranking_done(self, report: ReportDone):
+        ranking, spartitions = self.pending_ranking
+        self.pending_ranking = None
+        # The ranking is of no use if another file was read meanwhile.
+        if self.spartitions.scores.spartitions is not spartitions:
+            return
+        self.spartitions.set_ranking(ranking, report.result)
+        self.report_ranked.emit(ranking)
+
     def _handle_export_done(self, report: ReportDone):
         results: ExportResults = report.result
         self.report_saved.emit(results)
@@ -1,9 +1,34 @@
 from pathlib import Path
 from time import perf_counter
-from collections import defaultdict
+from collections import Counter, defaultdict
+from bisect import bisect_left, bisect_right
 from math import comb
-
-from .types import SCORE_COLUMNS, STRUCTURAL_KEYS, ExportResults, Results
+from typing import Callable, Iterable
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from ..common.process import (
+    StageRecorder,
+    get_spart_index,
+    pool_map,
+    print_stages,
+    read_spart_element,
+)
+from ..common.store import SpartStore, is_store_path, read_spart, write_spart
+from .types import (
+    SCORE_COLUMNS,
+    SOURCE_COLUMN,
+    STRUCTURAL_KEYS,
+    ExportResults,
+    Ranking,
+    Results,
+    ScoreTable,
+    SourceTable,
+)
 
 
 def initialize():
@@ -32,90 +57,776 @@ def get_score_bool(data: dict, label: str) -> bool | None:
     return value
 
 
+FILTER_TOKEN = re.compile(
+    r"\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<word>[A-Za-z_]\w*)"
+    r"|(?P<symbol><=|>=|==|!=|<|>|=|\(|\)|-))"
+)
+
+FILTER_COMPARISONS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "=": np.equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+FILTER_KEYWORDS = {"and", "or", "not", "between", "is", "missing", "true", "false"}
+
+
+class ScoreFilter:
+    """A filter expression over the review scores, compiled once.
+
+    Scores are named as in SCORE_COLUMNS, or as any other column given,
+    and compared with numbers or with
+    each other, for example:
+
+        BayesPP > 0.05 and Nsub between 5 and 12 and not (CSWm is missing)
+
+    A score on its own holds where it is present and not zero. Comparisons
+    never hold where a score is missing. Calling the filter on a ScoreTable
+    gives a boolean mask over its spartitions, computed a column at a time.
+    """
+
+    def __init__(self, text: str, names: Iterable[str] | None = None):
+        if names is None:
+            names = [column.name for column in SCORE_COLUMNS]
+        self.names = {name.lower(): name for name in names}
+        self.text = text
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.evaluate = self.parse_or()
+        if self.peek() is not None:
+            self.fail("Expected the end of the filter")
+
+    def __call__(self, scores: ScoreTable) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            mask = self.evaluate(scores.columns)
+        return np.broadcast_to(mask, (len(scores.spartitions),)).copy()
+
+    @staticmethod
+    def tokenize(text: str) -> list[tuple[str, str, int]]:
+        tokens = []
+        position = 0
+        while text[position:].strip():
+            match = FILTER_TOKEN.match(text, position)
+            if match is None:
+                start = len(text) - len(text[position:].lstrip())
+                raise ValueError(
+                    f"Unexpected {repr(text[start])} at position {start + 1}"
+                )
+            kind = match.lastgroup
+            value = match.group(kind)
+            start = match.start(kind)
+            if kind == "word" and value.lower() in FILTER_KEYWORDS:
+                kind, value = "keyword", value.lower()
+            tokens.append((kind, value, start))
+            position = match.end()
+        return tokens
+
+    def peek(self) -> tuple[str, str, int] | None:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def accept(self, kind: str, value: str | None = None) -> str | None:
+        token = self.peek()
+        if token is None or token[0] != kind:
+            return None
+        if value is not None and token[1] != value:
+            return None
+        self.position += 1
+        return token[1]
+
+    def expect(self, kind: str, value: str, description: str):
+        if self.accept(kind, value) is None:
+            self.fail(f"Expected {description}")
+
+    def fail(self, message: str):
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"{message} at the end of the filter")
+        raise ValueError(f"{message} at position {token[2] + 1}, got {repr(token[1])}")
+
+    def parse_or(self) -> Callable:
+        left = self.parse_and()
+        while self.accept("keyword", "or"):
+            right = self.parse_and()
+            left = (lambda a, b: lambda c: a(c) | b(c))(left, right)
+        return left
+
+    def parse_and(self) -> Callable:
+        left = self.parse_not()
+        while self.accept("keyword", "and"):
+            right = self.parse_not()
+            left = (lambda a, b: lambda c: a(c) & b(c))(left, right)
+        return left
+
+    def parse_not(self) -> Callable:
+        if self.accept("keyword", "not"):
+            inner = self.parse_not()
+            return lambda c: ~inner(c)
+        return self.parse_condition()
+
+    def parse_condition(self) -> Callable:
+        if self.accept("symbol", "("):
+            inner = self.parse_or()
+            self.expect("symbol", ")", "a closing parenthesis")
+            return inner
+
+        left = self.parse_value()
+
+        token = self.peek()
+        if token is not None and token[1] in FILTER_COMPARISONS:
+            self.position += 1
+            compare = FILTER_COMPARISONS[token[1]]
+            right = self.parse_value()
+            return lambda c: (
+                compare(left(c), right(c)) & ~np.isnan(left(c)) & ~np.isnan(right(c))
+            )
+
+        if self.accept("keyword", "between"):
+            low = self.parse_value()
+            self.expect("keyword", "and", "'and'")
+            high = self.parse_value()
+            return lambda c: (left(c) >= low(c)) & (left(c) <= high(c))
+
+        if self.accept("keyword", "is"):
+            negated = self.accept("keyword", "not")
+            self.expect("keyword", "missing", "'missing'")
+            if negated:
+                return lambda c: ~np.isnan(left(c))
+            return lambda c: np.isnan(left(c))
+
+        return lambda c: ~np.isnan(left(c)) & (left(c) != 0)
+
+    def parse_value(self) -> Callable:
+        if self.accept("symbol", "-"):
+            number = self.accept("number")
+            if number is None:
+                self.fail("Expected a number")
+            value = -float(number)
+            return lambda c: value
+
+        number = self.accept("number")
+        if number is not None:
+            value = float(number)
+            return lambda c: value
+
+        if self.accept("keyword", "true"):
+            return lambda c: 1.0
+        if self.accept("keyword", "false"):
+            return lambda c: 0.0
+
+        token = self.peek()
+        if token is None or token[0] != "word":
+            self.fail("Expected a score or a number")
+        name = self.names.get(token[1].lower())
+        if name is None:
+            raise ValueError(
+                f"Unknown score {repr(token[1])} at position {token[2] + 1}"
+            )
+        self.position += 1
+        return lambda c: c[name]
+
+
+def get_dense_ranks(values: np.ndarray) -> np.ndarray:
+    """Rank of each value counting from 0, equal values sharing a rank."""
+    _, inverse = np.unique(values, return_inverse=True)
+    return inverse.reshape(-1)
+
+
+def get_fronts_2d(points: np.ndarray) -> np.ndarray:
+    """Fronts of two criteria sorted lexicographically, in O(n log n).
+
+    Each front is represented by its last point, which has the lowest
+    second criterion in it. These tails are ordered across fronts, so the
+    first front that does not dominate a point is found by bisection.
+    """
+    fronts = np.empty(len(points), dtype=np.intp)
+    tails = []
+    for index, (x, y) in enumerate(points.tolist()):
+        front = bisect_left(tails, (y, x))
+        if front == len(tails):
+            tails.append((y, x))
+        else:
+            tails[front] = (y, x)
+        fronts[index] = front
+    return fronts
+
+
+def get_fronts_3d(points: np.ndarray) -> np.ndarray:
+    """Fronts of three criteria sorted lexicographically.
+
+    As for two criteria, but each front keeps a staircase of the points
+    not dominated within it over the last two criteria, with the second
+    rising and the third falling. Whether a front dominates a point comes
+    down to a bisection of its staircase.
+    """
+    fronts = np.empty(len(points), dtype=np.intp)
+    stairs: list[tuple[list, list, list]] = []
+
+    def dominated(front: int, x: float, y: float, z: float) -> bool:
+        ys, zs, xs = stairs[front]
+        step = bisect_right(ys, y) - 1
+        if step < 0 or zs[step] > z:
+            return False
+        if zs[step] < z or ys[step] < y:
+            return True
+        return xs[step] < x
+
+    for index, (x, y, z) in enumerate(points.tolist()):
+        low, high = 0, len(stairs)
+        while low < high:
+            middle = (low + high) // 2
+            if dominated(middle, x, y, z):
+                low = middle + 1
+            else:
+                high = middle
+        fronts[index] = low
+        if low == len(stairs):
+            stairs.append(([], [], []))
+        ys, zs, xs = stairs[low]
+        start = bisect_left(ys, y)
+        if start < len(ys) and ys[start] == y and zs[start] == z:
+            # Identical to a point already on the staircase.
+            continue
+        end = start
+        while end < len(ys) and zs[end] >= z:
+            end += 1
+        ys[start:end] = [y]
+        zs[start:end] = [z]
+        xs[start:end] = [x]
+    return fronts
+
+
+def get_fronts_nd(points: np.ndarray) -> np.ndarray:
+    """Fronts of any number of criteria sorted lexicographically.
+
+    This is the efficient non-dominated sort with binary search (ENS-BS).
+    Points only ever get dominated by points before them, and a point
+    dominated by some front is dominated by all fronts before that one,
+    so each point takes a bisection over the fronts found so far. Front
+    members are stored by criterion, and narrowed down one criterion at
+    a time; the first never needs checking, thanks to the sort.
+    """
+    fronts = np.empty(len(points), dtype=np.intp)
+    criteria = points.shape[1]
+    members: list[np.ndarray] = []
+    sizes: list[int] = []
+
+    def dominated(front: int, point: np.ndarray) -> bool:
+        others = members[front][:, : sizes[front]]
+        candidates = np.flatnonzero(others[1] <= point[1])
+        for criterion in range(2, criteria):
+            if not len(candidates):
+                return False
+            values = others[criterion][candidates]
+            candidates = candidates[values <= point[criterion]]
+        if not len(candidates):
+            return False
+        # Any candidate that is not identical to the point dominates it.
+        return bool(np.any(others[:, candidates] < point[:, np.newaxis]))
+
+    for index, point in enumerate(points):
+        low, high = 0, len(members)
+        while low < high:
+            middle = (low + high) // 2
+            if dominated(middle, point):
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(members):
+            members.append(np.empty((criteria, 16)))
+            sizes.append(0)
+        if sizes[low] == members[low].shape[1]:
+            members[low] = np.concatenate(
+                [members[low], np.empty_like(members[low])], axis=1
+            )
+        members[low][:, sizes[low]] = point
+        sizes[low] += 1
+        fronts[index] = low
+    return fronts
+
+
+def get_pareto_fronts(values: np.ndarray) -> np.ndarray:
+    """Pareto front of each row of a matrix of scores to be minimised.
+
+    Rows on the first front are dominated by no other row, rows on the
+    second front only by rows of the first, and so on. Rows missing any
+    of the scores are left out and get NaN.
+    """
+    fronts = np.full(len(values), np.nan)
+    present = ~np.isnan(values).any(axis=1)
+    points = values[present]
+    if not len(points):
+        return fronts
+
+    order = np.lexsort(points.T[::-1])
+    points = points[order]
+    if points.shape[1] == 1:
+        sorted_fronts = get_dense_ranks(points[:, 0])
+    elif points.shape[1] == 2:
+        sorted_fronts = get_fronts_2d(points)
+    elif points.shape[1] == 3:
+        sorted_fronts = get_fronts_3d(points)
+    else:
+        sorted_fronts = get_fronts_nd(points)
+
+    result = np.empty(len(points))
+    result[order] = sorted_fronts + 1
+    fronts[present] = result
+    return fronts
+
+
+def get_borda_ranks(values: np.ndarray) -> np.ndarray:
+    """Borda rank of each row of a matrix of scores to be minimised.
+
+    For every score, a row earns a point for each row it beats and half a
+    point for each row it ties with. Missing scores lose to all others.
+    Rows are ranked by their total from 1, with equal totals sharing the
+    better rank.
+    """
+    count = len(values)
+    points = np.zeros(count)
+    for column in values.T:
+        present = ~np.isnan(column)
+        scores = column[present]
+        ordered = np.sort(scores)
+        before = np.searchsorted(ordered, scores, side="left")
+        after = np.searchsorted(ordered, scores, side="right")
+        missing = count - len(scores)
+        points[present] += (len(scores) - after) + (after - before - 1) / 2 + missing
+        points[~present] += (missing - 1) / 2
+
+    ordered = np.sort(points)
+    return 1.0 + count - np.searchsorted(ordered, points, side="right")
+
+
+def get_ranking(scores: ScoreTable, ranking: Ranking) -> np.ndarray:
+    """Values of the derived row for a ranking, one per spartition."""
+    values = np.column_stack(
+        [
+            -scores.columns[name] if higher else scores.columns[name]
+            for name, higher in ranking.criteria
+        ]
+    )
+    if ranking.method == "pareto":
+        return get_pareto_fronts(values)
+    return get_borda_ranks(values)
+
+
+def hash_subsets(subsets: list[list[str]]) -> str:
+    """Digest of the individuals in each subset of a spartition. Unlike the
+    membership hash of the Profile task, subset labels do not count, so the
+    same grouping under other labels gives the same digest."""
+    membership = sorted(sorted(individuals) for individuals in subsets)
+    return hashlib.sha256(json.dumps(membership).encode()).hexdigest()
+
+
+def read_source(concordance_path: Path) -> SourceTable:
+    """Tabulate the spartitions of a single file, for use on a worker pool.
+
+    The file is streamed through rather than parsed into a Spart, keeping
+    only spartition attributes and memberships, and skipping concordances
+    and everything else that no score is derived from. Stores are queried
+    for just the same.
+    """
+    from xml.etree import ElementTree as ET
+
+    recorder = StageRecorder()
+
+    individual_list = []
+    spartition_list = []
+    attributes: list[dict[str, str]] = []
+    memberships = []
+    derived: list[dict[str, int]] = []
+
+    def add_subsets(subsets: list[list[str]]):
+        nsub = len(subsets)
+        nind = sum(len(individuals) for individuals in subsets)
+        derived.append({"Nind": nind, "Nsub": nsub, "Ncomp": comb(nsub, 2)})
+        memberships.append(hash_subsets(subsets))
+
+    with recorder.stage("Read") as counters:
+        if is_store_path(concordance_path):
+            with SpartStore(concordance_path) as store:
+                individual_list = store.get_individuals()
+                scores = store.get_scores()
+                store_subsets = store.get_subsets()
+            for label, data in scores.items():
+                spartition_list.append(label)
+                attributes.append({key.lower(): value for key, value in data.items()})
+                add_subsets(list(store_subsets[label].values()))
+        else:
+            path = []
+            elements = []
+            subsets = None
+            for event, element in ET.iterparse(concordance_path, ("start", "end")):
+                if event == "start":
+                    path.append(get_tag(element))
+                    elements.append(element)
+                    if path[1:] == ["individuals", "individual"]:
+                        individual_list.append(element.get("id"))
+                    elif path[1:] == ["spartitions", "spartition"]:
+                        spartition_list.append(element.get("label"))
+                        attributes.append(
+                            {key.lower(): value for key, value in element.items()}
+                        )
+                        subsets = []
+                    elif path[3:] == ["subsets", "subset"]:
+                        subsets.append([])
+                    elif path[3:] == ["subsets", "subset", "individual"]:
+                        subsets[-1].append(element.get("ref"))
+                    continue
+
+                if path[1:] == ["spartitions", "spartition"]:
+                    add_subsets(subsets)
+                path.pop()
+                elements.pop()
+                # Everything needed is copied out as it is read.
+                if elements:
+                    elements[-1].remove(element)
+        counters["individuals"] = len(individual_list)
+
+    with recorder.stage("Tabulate") as counters:
+        columns = {
+            column.name: np.full(len(spartition_list), np.nan)
+            for column in SCORE_COLUMNS
+        }
+
+        for index, data in enumerate(attributes):
+            for column in SCORE_COLUMNS:
+                if column.key is None:
+                    value = derived[index][column.name]
+                elif column.kind == "bool":
+                    value = get_score_bool(data, column.key.lower())
+                else:
+                    value = get_score_float(data, column.key.lower())
+                if value is not None:
+                    columns[column.name][index] = value
+
+        counters["spartitions"] = len(spartition_list)
+
+    return SourceTable(
+        individual_list,
+        spartition_list,
+        columns,
+        memberships,
+        recorder.get_stages(),
+    )
+
+
+def get_unique_names(origins: list[tuple[int, str]], sources: list[str]) -> list[str]:
+    """Spartition labels, followed by their file name where the same label
+    came from more than one file, and numbered if that is not enough."""
+    counts = Counter(label for _, label in origins)
+    names = [
+        label if counts[label] == 1 else f"{label} ({sources[source]})"
+        for source, label in origins
+    ]
+    seen = Counter()
+    unique = []
+    for name in names:
+        seen[name] += 1
+        unique.append(name if seen[name] == 1 else f"{name} #{seen[name]}")
+    return unique
+
+
 def execute(
-    concordance_path: Path,
+    concordance_paths: list[Path],
+    workers: int = 0,
+    deduplicate: bool = True,
 ) -> Results:
-    from itaxotools.spart_parser import Spart
+    """Tabulate the spartitions of every file, in the order given.
 
+    Files are read side by side on a worker pool. A spartition that groups
+    the individuals exactly like one in an earlier file is dropped, unless
+    `deduplicate` is off, so the first file wins. Individuals are merged
+    in the order they are first seen.
+    """
     ts = perf_counter()
+    recorder = StageRecorder()
+
+    with recorder.stage("Parse") as counters:
+        tables = pool_map(read_source, list(concordance_paths), workers)
+        counters["files"] = len(tables)
+    for table in tables:
+        for stats in table.stages:
+            recorder.add(stats)
+
+    with recorder.stage("Merge") as counters:
+        sources = [path.name for path in concordance_paths]
+        individual_list = list(
+            dict.fromkeys(
+                individual for table in tables for individual in table.individual_list
+            )
+        )
+
+        seen = set()
+        origins: list[tuple[int, int]] = []
+        labels: list[tuple[int, str]] = []
+        kept: list[np.ndarray] = []
+        for source, table in enumerate(tables):
+            indices = []
+            for index, membership in enumerate(table.memberships):
+                if deduplicate and membership in seen:
+                    counters["duplicates"] += 1
+                    continue
+                indices.append(index)
+                origins.append((source, index))
+                labels.append((source, table.labels[index]))
+            # Within a file, every spartition is kept as it was.
+            seen.update(table.memberships)
+            kept.append(np.array(indices, dtype=np.intp))
+
+        columns = {
+            column.name: np.concatenate(
+                [np.empty(0)]
+                + [table.columns[column.name][k] for table, k in zip(tables, kept)]
+            )
+            for column in SCORE_COLUMNS
+        }
+        if len(tables) > 1:
+            columns[SOURCE_COLUMN.name] = np.concatenate(
+                [np.empty(0)]
+                + [np.full(len(k), source + 1.0) for source, k in enumerate(kept)]
+            )
 
-    subset_table: dict[str, dict[str, str]] = defaultdict(dict)
-    score_table: dict[str, dict[str, float | bool | None]] = defaultdict(dict)
+        names = get_unique_names(labels, sources)
+        scores = ScoreTable(names, columns, tuple(sources))
+        counters["spartitions"] = len(names)
 
-    spart = Spart.fromXML(concordance_path)
+    tf = perf_counter()
 
-    individual_list = spart.getIndividuals()
+    stages = recorder.get_stages()
+    print_stages(stages)
 
-    for spartition in spart.getSpartitions():
-        table = {individual: None for individual in individual_list}
+    return Results(individual_list, scores, origins, tf - ts, stages)
 
-        nsub = len(spart.getSpartitionSubsets(spartition))
-        nind = 0
 
-        for subset in spart.getSpartitionSubsets(spartition):
-            individuals = spart.getSubsetIndividuals(spartition, subset)
-            nind += len(individuals)
-            for individual in individuals:
-                table[individual] = subset
+# Written before the spartitions, in this order, as the SPART writer does.
+HEADER_ORDER = ["project_name", "date", "individuals"]
 
-        subset_table[spartition] = table
+# Children of these are pooled across files, by the attribute given.
+HEADER_MERGE_KEYS = {"individuals": "id", "locations": "locality"}
 
-        data = spart.getSpartitionData(spartition)
-        derived = {"Nind": nind, "Nsub": nsub, "Ncomp": comb(nsub, 2)}
 
-        scores = {}
-        for column in SCORE_COLUMNS:
-            if column.key is None:
-                scores[column.name] = derived[column.name]
-            elif column.kind == "bool":
-                scores[column.name] = get_score_bool(data, column.key)
-            else:
-                scores[column.name] = get_score_float(data, column.key)
+def get_tag(element) -> str:
+    """Tag of an element, which the SPART parser matches in any case."""
+    return element.tag.lower()
 
-        score_table[spartition] = scores
 
-    tf = perf_counter()
+def write_element(file, element, level: int):
+    """Write an element on its own line, indented like the SPART writer."""
+    from xml.etree import ElementTree as ET
+
+    element.tail = None
+    ET.indent(element, space="\t", level=level)
+    file.write("\n" + "\t" * level + ET.tostring(element, encoding="unicode"))
+
 
-    return Results(individual_list, dict(subset_table), dict(score_table), tf - ts)
+def prune_spartition(element, kept: set[str]):
+    """Drop the attributes and children of a spartition not in `kept`."""
+    for key in list(element.attrib):
+        if key.lower() not in kept:
+            del element.attrib[key]
+    for child in list(element):
+        if get_tag(child) not in kept:
+            element.remove(child)
+
+
+def get_missing(source: Path, position: int) -> ValueError:
+    return ValueError(f"Spartition not found in {source.name}: #{position + 1}")
+
+
+def read_subsets(concordance_path: Path, position: int) -> dict[str, str]:
+    """The subset of each individual in the spartition at the position,
+    counting from zero in file order, read through the index of the file.
+    Raises ValueError if there is none."""
+    if is_store_path(concordance_path):
+        with SpartStore(concordance_path) as store:
+            labels = store.get_spartitions()
+            if not 0 <= position < len(labels):
+                raise get_missing(concordance_path, position)
+            label = labels[position]
+            subsets = store.get_subsets([label])
+        return {
+            individual: subset
+            for subset, individuals in subsets[label].items()
+            for individual in individuals
+        }
+
+    index = get_spart_index(concordance_path)
+    if not 0 <= position < len(index.spartitions):
+        raise get_missing(concordance_path, position)
+
+    element = read_spart_element(concordance_path, index, index.spartitions[position])
+    subsets = {}
+    for child in element:
+        if get_tag(child) != "subsets":
+            continue
+        for subset in child:
+            if get_tag(subset) != "subset":
+                continue
+            for individual in subset:
+                if get_tag(individual) == "individual":
+                    subsets[individual.get("ref")] = subset.get("label")
+    return subsets
+
+
+def read_chosen(
+    source: Path, positions: list[int], kept: set[str], counters: dict
+) -> tuple[list, dict]:
+    """Read every top level element of a SPART file but the spartition list,
+    and of the spartitions only those at the given positions, seeking to each
+    through the index of the file. Raises ValueError if any is missing."""
+    if is_store_path(source):
+        return read_chosen_from_store(source, positions, kept, counters)
+
+    index = get_spart_index(source)
+    header = [
+        read_spart_element(source, index, section)
+        for tag, section in index.sections.items()
+        if tag != "spartitions"
+    ]
+
+    chosen = {}
+    for position in positions:
+        if not 0 <= position < len(index.spartitions):
+            raise get_missing(source, position)
+        element = read_spart_element(source, index, index.spartitions[position])
+        prune_spartition(element, kept)
+        chosen[position] = element
+        counters["spartitions"] += 1
+    return header, chosen
+
+
+def read_chosen_from_store(
+    source: Path, positions: list[int], kept: set[str], counters: dict
+) -> tuple[list, dict]:
+    """Same as read_chosen, for a store. The spartitions are loaded into
+    a Spart and written out as SPART, to be read back as elements. Labels
+    are unique within a store, so they stand in for the positions."""
+    from tempfile import TemporaryDirectory
+    from xml.etree import ElementTree as ET
+
+    with SpartStore(source) as store:
+        labels = store.get_spartitions()
+        for position in positions:
+            if not 0 <= position < len(labels):
+                raise get_missing(source, position)
+        spart = store.read([labels[position] for position in positions])
+    positions_by_label = {labels[position]: position for position in positions}
+
+    with TemporaryDirectory(prefix="review_") as temp:
+        path = Path(temp) / "chosen.xml"
+        spart.toXML(path)
+        root = ET.parse(path).getroot()
+
+    header = []
+    chosen = {}
+    for element in root:
+        if get_tag(element) != "spartitions":
+            header.append(element)
+            continue
+        for spartition in element:
+            prune_spartition(spartition, kept)
+            chosen[positions_by_label[spartition.get("label")]] = spartition
+            counters["spartitions"] += 1
+    return header, chosen
+
+
+def merge_header(merged: dict, header: list):
+    """Add the top level elements of another file. Individuals and locations
+    are pooled, keeping the first entry for each id or locality, while
+    anything else comes from the first file that has it."""
+    for element in header:
+        tag = get_tag(element)
+        if tag not in merged:
+            merged[tag] = element
+            continue
+        key = HEADER_MERGE_KEYS.get(tag)
+        if key is None:
+            continue
+        known = {child.get(key) for child in merged[tag]}
+        for child in element:
+            if child.get(key) not in known:
+                merged[tag].append(child)
+                known.add(child.get(key))
 
 
 def export(
-    concordance_path: Path,
+    concordance_paths: list[Path],
     output_path: Path,
-    spartitions: list[str],
+    spartitions: list[tuple[int, int]],
     keys: list[str],
 ) -> ExportResults:
     """Write a SPART file holding only the given spartitions and score keys.
 
-    Spartitions are written in the order given, which is the order the user
-    sorted them into, since the XML writer follows insertion order.
+    Each spartition is given as the index of its file and its position in
+    that file, counting from zero, as in the origins of Results. They
+    are written in the order given, which is the order the user sorted them
+    into, and renamed as in the review table if their labels clash. Only
+    the chosen spartitions and the elements outside the spartition list are
+    read, through the index of each file, so both time and memory follow
+    the output rather than the input, once the index is there. Stores,
+    which need no index, are read and written by way of a Spart instead.
     """
-    from itaxotools.spart_parser import Spart
-
     ts = perf_counter()
-
-    spart = Spart.fromXML(concordance_path)
-
-    reduced = Spart()
-    for key in [
-        "project_name",
-        "date",
-        "individuals",
-        "locations",
-        "location_synonyms",
-    ]:
-        reduced.spartDict[key] = spart.spartDict.get(key, {})
-
-    kept = STRUCTURAL_KEYS | set(keys)
-
-    for number, label in enumerate(spartitions, start=1):
-        source = spart.getSpartitionFromLabel(label)
-        reduced.spartDict["spartitions"][str(number)] = {
-            key: value for key, value in source.items() if key in kept
-        }
-
-    reduced.toXML(output_path)
+    recorder = StageRecorder()
+
+    kept = {key.lower() for key in STRUCTURAL_KEYS | set(keys)}
+    wanted: dict[int, list[int]] = defaultdict(list)
+    for source, position in spartitions:
+        wanted[source].append(position)
+
+    with recorder.stage("Read") as counters:
+        merged = {}
+        found = {}
+        for source in sorted(wanted):
+            header, chosen = read_chosen(
+                concordance_paths[source], wanted[source], kept, counters
+            )
+            merge_header(merged, header)
+            found.update({(source, p): e for p, e in chosen.items()})
+            counters["files"] += 1
+
+    temp = output_path.with_suffix(f".{os.getpid()}.tmp")
+    with recorder.stage("Write") as counters:
+        try:
+            with open(temp, "w", encoding="utf-8") as file:
+                file.write('<?xml version="1.0" ?>\n<root>')
+                for tag in HEADER_ORDER:
+                    if tag in merged:
+                        write_element(file, merged.pop(tag), 1)
+                file.write("\n\t<spartitions>")
+                origins = list(dict.fromkeys(spartitions))
+                sources = [path.name for path in concordance_paths]
+                labels = [
+                    (source, found[source, p].get("label")) for source, p in origins
+                ]
+                names = get_unique_names(labels, sources)
+                for origin, name in zip(origins, names):
+                    found[origin].set("label", name)
+                    write_element(file, found[origin], 2)
+                file.write("\n\t</spartitions>")
+                for element in merged.values():
+                    write_element(file, element, 1)
+                file.write("\n</root>")
+            if is_store_path(output_path):
+                write_spart(read_spart(temp), output_path)
+            else:
+                os.replace(temp, output_path)
+        finally:
+            temp.unlink(missing_ok=True)
+        counters["spartitions"] = len(found)
 
     tf = perf_counter()
 
-    return ExportResults(output_path, len(spartitions), tf - ts)
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return ExportResults(output_path, len(found), tf - ts, stages)
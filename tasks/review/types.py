@@ -3,6 +3,10 @@ from __future__ import annotations
 from pathlib import Path
 from typing import NamedTuple
 
+import numpy as np
+
+from ..common.types import StageStats
+
 # The arrow points the way the spartition columns are ordered.
 SORT_ARROW_ASCENDING = "\u25b6"
 SORT_ARROW_DESCENDING = "\u25c0"
@@ -37,20 +41,128 @@ SCORE_COLUMNS = [
     ScoreColumn("CSU", "CSU", "float"),
     ScoreColumn("CSW", "CSW", "float"),
     ScoreColumn("CSWC", "CSWC", "float"),
+    ScoreColumn("CC", "CC", "bool"),
+    ScoreColumn("HC", "HC", "bool"),
 ]
 
+# Shown before the scores when spartitions come from several files.
+SOURCE_COLUMN = ScoreColumn("Source", None, "source")
+
+# Scores where a lower value is better, which is the default when ranking.
+LOWER_IS_BETTER = {"asap", "BIC", "AIC"}
+
+# Names of the derived rows, by ranking method.
+RANKING_METHODS = {
+    "pareto": "Pareto",
+    "borda": "Borda",
+}
+
 # Keys that describe the spartition itself, always kept when exporting.
 STRUCTURAL_KEYS = {"label", "remarks", "subsets", "concordances"}
 
 
+class ScoreTable(NamedTuple):
+    """Scores of every spartition, stored by column.
+
+    Each score name maps to a float array with one value per spartition,
+    in file order, and NaN where the spartition has no such score. Integer
+    and boolean scores are stored as floats too, and converted back by
+    `get_value` according to their column kind. The source column holds
+    the number of the file each spartition came from, counting from one,
+    and `sources` the names of those files.
+    """
+
+    spartitions: list[str]
+    columns: dict[str, np.ndarray]
+    sources: tuple[str, ...] = ()
+
+    @classmethod
+    def empty(cls) -> ScoreTable:
+        return cls([], {column.name: np.empty(0) for column in SCORE_COLUMNS})
+
+    def get_value(self, column: ScoreColumn, index: int) -> float | bool | str | None:
+        value = self.columns[column.name][index]
+        if np.isnan(value):
+            return None
+        if column.kind == "source":
+            return self.sources[int(value) - 1]
+        if column.kind == "int":
+            return int(value)
+        if column.kind == "bool":
+            return bool(value)
+        return float(value)
+
+    def get_scores(self, index: int) -> dict[str, float | bool | None]:
+        """All scores of one spartition, by score name."""
+        return {column.name: self.get_value(column, index) for column in SCORE_COLUMNS}
+
+    def argsort(self, name: str, descending: bool = False) -> np.ndarray:
+        """Spartition indices ordered by a score, with spartitions missing
+        the score at the end either way. Ties keep their file order."""
+        values = self.columns[name]
+        if descending:
+            values = -values
+        return np.argsort(values, kind="stable")
+
+
+class Ranking(NamedTuple):
+    """A derived row ranking the spartitions by several scores at once.
+
+    Each criterion names a score and whether higher values are better.
+    The Pareto method gives the number of the non-dominated front each
+    spartition is on, the Borda method its rank by Borda count.
+    """
+
+    method: str
+    criteria: list[tuple[str, bool]]
+
+    @property
+    def name(self) -> str:
+        return RANKING_METHODS[self.method]
+
+    def describe(self) -> str:
+        criteria = ", ".join(
+            f"{name} {'higher' if higher else 'lower'}"
+            for name, higher in self.criteria
+        )
+        if self.method == "pareto":
+            return f"Pareto front by {criteria}"
+        return f"Borda rank by {criteria}"
+
+
+class SourceTable(NamedTuple):
+    """What the review table needs from a single SPART file.
+
+    Spartitions are listed in file order, with their scores and membership
+    digest at the same index in each list or column. Subsets themselves are
+    left in the file, and read again for the one spartition previewed.
+    """
+
+    individual_list: list[str]
+    labels: list[str]
+    columns: dict[str, np.ndarray]
+    memberships: list[str]
+    stages: tuple[StageStats, ...] = ()
+
+
 class Results(NamedTuple):
+    """Spartitions of one or more files, merged into a single table.
+
+    Spartition names are their labels, unless the same label came up more
+    than once. `origins` gives the source file index of each spartition and
+    its position in that file, counting from zero, which is what export
+    needs to find it again, even if another spartition has the same label.
+    """
+
     individual_list: list[str]
-    subset_table: dict[str, dict[str, str]]
-    score_table: dict[str, dict[str, float | bool | None]]
+    scores: ScoreTable
+    origins: list[tuple[int, int]]
     seconds_taken: float
+    stages: tuple[StageStats, ...] = ()
 
 
 class ExportResults(NamedTuple):
     output_path: Path
     spartition_count: int
     seconds_taken: float
+    stages: tuple[StageStats, ...] = ()
@@ -1,5 +1,7 @@
 from PySide6 import QtCore, QtWidgets
 
+import numpy as np
+
 from pathlib import Path
 
 from itaxotools.taxi_gui import app
@@ -7,8 +9,16 @@ from itaxotools.taxi_gui.utility import human_readable_seconds
 from itaxotools.taxi_gui.view.tasks import TaskView
 
 from ..visualize.model import Model as VisualizeModel
+from ..visualize.types import SubsetMatrix
 from ..visualize.view import Visualizer
-from .types import ExportResults, Results
+from .types import (
+    LOWER_IS_BETTER,
+    RANKING_METHODS,
+    SOURCE_COLUMN,
+    ExportResults,
+    Ranking,
+    Results,
+)
 
 
 class ReviewTableView(QtWidgets.QTableView):
@@ -73,6 +83,122 @@ class ReviewTableView(QtWidgets.QTableView):
         return [index.row() for index in self.selectionModel().selectedRows()]
 
 
+class FilterBar(QtWidgets.QWidget):
+    """An expression over the scores that narrows the spartitions shown.
+
+    The filter is applied on Enter, or as soon as the text is cleared. The
+    label beside it counts what is shown, or explains what is wrong with
+    the expression.
+    """
+
+    filterRequested = QtCore.Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.edit = QtWidgets.QLineEdit()
+        self.edit.setPlaceholderText(
+            "Filter spartitions, e.g. BayesPP > 0.05 and Nsub between 5 and 12"
+        )
+        self.edit.setToolTip(
+            "Compare scores with numbers or with each other using "
+            "< <= > >= = !=, 'between ... and ...' or 'is missing'.\n"
+            "Combine conditions with and, or, not and parentheses.\n"
+            "A score on its own means present and not zero, so a flag such "
+            "as CC or HC on its own means present and true."
+        )
+        self.edit.setClearButtonEnabled(True)
+        self.edit.returnPressed.connect(self._handle_return_pressed)
+        self.edit.textChanged.connect(self._handle_text_changed)
+
+        self.status = QtWidgets.QLabel()
+
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.edit, 1)
+        layout.addWidget(self.status)
+        layout.setSpacing(12)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+    def _handle_return_pressed(self):
+        self.filterRequested.emit(self.edit.text())
+
+    def _handle_text_changed(self, text: str):
+        if not text.strip():
+            self.filterRequested.emit("")
+
+    def set_status(self, text: str, error: bool = False):
+        self.status.setStyleSheet("QLabel { color: #c00; }" if error else "")
+        self.status.setText(text)
+
+
+class RankingDialog(QtWidgets.QDialog):
+    """Choose a ranking method and the scores it combines.
+
+    Each score can be ranked with lower or higher values as better. Only
+    scores present for at least one spartition are offered.
+    """
+
+    def __init__(self, names: list[str], parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"{app.config.title} - Rank spartitions")
+
+        self.method = QtWidgets.QComboBox()
+        self.method.addItem("Pareto fronts", "pareto")
+        self.method.addItem("Borda count", "borda")
+        self.method.setToolTip(
+            "Pareto: the number of the non-dominated front of each spartition, "
+            "starting from 1.\n"
+            "Borda: the rank of each spartition by the points it wins "
+            "against the others, score by score."
+        )
+
+        self.checks: dict[str, QtWidgets.QCheckBox] = {}
+        self.directions: dict[str, QtWidgets.QComboBox] = {}
+        grid = QtWidgets.QGridLayout()
+        for row, name in enumerate(names):
+            check = QtWidgets.QCheckBox(name)
+            direction = QtWidgets.QComboBox()
+            direction.addItem("higher is better", True)
+            direction.addItem("lower is better", False)
+            direction.setCurrentIndex(1 if name in LOWER_IS_BETTER else 0)
+            direction.setEnabled(False)
+            check.toggled.connect(direction.setEnabled)
+            check.toggled.connect(self._update_buttons)
+            grid.addWidget(check, row, 0)
+            grid.addWidget(direction, row, 1)
+            self.checks[name] = check
+            self.directions[name] = direction
+
+        self.buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel
+        )
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        self._update_buttons()
+
+        form = QtWidgets.QFormLayout()
+        form.addRow("Method:", self.method)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(form)
+        layout.addLayout(grid)
+        layout.addWidget(self.buttons)
+        self.setLayout(layout)
+
+    def _update_buttons(self):
+        button = self.buttons.button(QtWidgets.QDialogButtonBox.Ok)
+        button.setEnabled(any(check.isChecked() for check in self.checks.values()))
+
+    def get_ranking(self) -> Ranking:
+        criteria = [
+            (name, self.directions[name].currentData())
+            for name, check in self.checks.items()
+            if check.isChecked()
+        ]
+        return Ranking(self.method.currentData(), criteria)
+
+
 class PreviewDialog(QtWidgets.QDialog):
     """A single spartition drawn in the same style as the Visualize task."""
 
@@ -91,7 +217,8 @@ class PreviewDialog(QtWidgets.QDialog):
         self.resize(520, 720)
 
         visualizer = Visualizer(self)
-        visualizer.set_data(individual_list, {spartition: subset}, {spartition: scores})
+        subsets = SubsetMatrix.from_table(individual_list, {spartition: subset})
+        visualizer.set_data(individual_list, subsets, {spartition: scores})
 
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(visualizer, 1)
@@ -110,12 +237,27 @@ class View(TaskView):
         self.draw()
 
     def draw(self):
+        self.filter_bar = FilterBar(self)
+        self.filter_bar.filterRequested.connect(self.apply_filter)
+
+        self.rank_button = QtWidgets.QPushButton("Rank\u2026")
+        self.rank_button.setToolTip(
+            "Add a row ranking the spartitions by several scores at once"
+        )
+        self.rank_button.clicked.connect(self.rank)
+
         self.table = ReviewTableView(self)
         self.table.spartitionActivated.connect(self.show_preview)
         self.table.scoreClicked.connect(self.sort_by_score)
         self.table.deleteRequested.connect(self.remove_selection)
 
+        bar = QtWidgets.QHBoxLayout()
+        bar.addWidget(self.filter_bar, 1)
+        bar.addWidget(self.rank_button)
+        bar.setSpacing(6)
+
         layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(bar)
         layout.addWidget(self.table, 1)
         layout.setSpacing(6)
         layout.setContentsMargins(6, 6, 6, 6)
@@ -129,6 +271,8 @@ class View(TaskView):
         self.binder.bind(object.notification, self.showNotification)
         self.binder.bind(object.report_results, self.report_results)
         self.binder.bind(object.report_saved, self.report_saved)
+        self.binder.bind(object.report_preview, self.open_preview)
+        self.binder.bind(object.report_ranked, self.report_ranked)
 
         self.set_model(object.spartitions)
 
@@ -155,9 +299,48 @@ class View(TaskView):
         self.source_model.sort_by_spartition_name()
         self.table.resizeColumnsToContents()
 
+    def apply_filter(self, text: str):
+        if not self.source_model:
+            return
+        try:
+            self.source_model.set_filter(text)
+        except ValueError as exception:
+            self.filter_bar.set_status(str(exception), error=True)
+        else:
+            self.update_filter_status()
+        self.table.resizeColumnsToContents()
+
+    def rank(self):
+        if not self.source_model or not len(self.source_model.scores.spartitions):
+            return
+        scores = self.source_model.scores
+        names = [
+            name
+            for name in scores.columns
+            if name not in RANKING_METHODS.values()
+            and name != SOURCE_COLUMN.name
+            and not np.isnan(scores.columns[name]).all()
+        ]
+        dialog = RankingDialog(names, self.window())
+        if not dialog.exec():
+            return
+        self.object.add_ranking(dialog.get_ranking())
+
+    def report_ranked(self, ranking: Ranking):
+        self.update_filter_status()
+        self.table.resizeColumnsToContents()
+
+    def update_filter_status(self):
+        if not self.source_model:
+            return
+        shown = self.source_model.columnCount()
+        total = len(self.source_model.scores.spartitions)
+        self.filter_bar.set_status(f"{shown} of {total} spartitions shown")
+
     def report_results(self, task_name: str, results: Results):
         self.results = results
-        self.table.resizeColumnsToContents()
+        # Rankings are gone with the old file, and a filter may have named one.
+        self.apply_filter(self.filter_bar.edit.text())
 
     def report_saved(self, results: ExportResults):
         msgBox = QtWidgets.QMessageBox(self.window())
@@ -196,16 +379,20 @@ class View(TaskView):
             return
         if not self.results.individual_list:
             return
+        self.object.preview(spartition)
 
-        subset = self.results.subset_table.get(spartition, None)
-        if subset is None:
+    def open_preview(self, spartition: str, subset: dict[str, str]):
+        if self.results is None:
+            return
+        scores = self.results.scores
+        if spartition not in scores.spartitions:
             return
 
         dialog = PreviewDialog(
             spartition,
             self.results.individual_list,
             subset,
-            self.results.score_table.get(spartition, {}),
+            scores.get_scores(scores.spartitions.index(spartition)),
             self.window(),
         )
         dialog.destroyed.connect(lambda: self.previews.remove(dialog))
@@ -213,13 +400,13 @@ class View(TaskView):
         dialog.show()
 
     def open(self):
-        filename, _ = QtWidgets.QFileDialog.getOpenFileName(
+        filenames, _ = QtWidgets.QFileDialog.getOpenFileNames(
             parent=self.window(),
-            caption=f"{app.config.title} - Open file",
+            caption=f"{app.config.title} - Open files",
         )
-        if not filename:
+        if not filenames:
             return
-        self.object.open(Path(filename))
+        self.object.open(*(Path(filename) for filename in filenames))
 
     def remove_selection(self):
         if not self.source_model:
@@ -237,12 +424,13 @@ class View(TaskView):
             self.source_model.remove_columns(columns)
 
         self.table.clearSelection()
+        self.update_filter_status()
 
     def clear(self):
         self.object.clear()
 
     def save(self, key=None):
-        if not self.source_model or not self.source_model.order:
+        if not self.source_model or not len(self.source_model.order):
             return
 
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(
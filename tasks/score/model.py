@@ -8,7 +8,7 @@ from itaxotools.taxi_gui.threading import ReportDone
 from itaxotools.taxi_gui.types import Notification
 from . import process, title
 from ..common.model import BlastTaskModel
-from .types import OpenResults
+from .types import BootstrapMode, OpenResults
 
 
 class VersionSubtaskModel(SubtaskModel):
@@ -362,6 +362,10 @@ class Model(BlastTaskModel):
     evidence_types = Property(EvidenceTypeModel, Instance)
     bool_only = Property(bool, True)
 
+    bootstrap_mode = Property(BootstrapMode, BootstrapMode.Off)
+    bootstrap_replicates = Property(int, 1000)
+    bootstrap_seed = Property(int, -1)
+
     def __init__(self, name=None):
         super().__init__(name)
         self.can_open = True
@@ -375,6 +379,8 @@ class Model(BlastTaskModel):
         for handle in [
             self.properties.concordance_path,
             self.properties.output_path,
+            self.properties.bootstrap_mode,
+            self.properties.bootstrap_replicates,
         ]:
             self.binder.bind(handle, self.checkReady)
         self.checkReady()
@@ -418,6 +424,8 @@ class Model(BlastTaskModel):
             return False
         if self.output_path == Path():
             return False
+        if self.bootstrap_mode != BootstrapMode.Off and self.bootstrap_replicates < 1:
+            return False
         return True
 
     def start(self):
@@ -448,6 +456,9 @@ class Model(BlastTaskModel):
             evidence_types_behaviours=self.evidence_types.get_behaviours(),
             conspecific_constraints=conspecific_constraints,
             heterospecific_constraints=heterospecific_constraints,
+            bootstrap_mode=self.bootstrap_mode,
+            bootstrap_replicates=self.bootstrap_replicates,
+            bootstrap_seed=self.bootstrap_seed,
         )
 
     def _parse_constraints_list(self, text: str) -> list[list[str]]:
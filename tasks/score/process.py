@@ -2,9 +2,43 @@ from pathlib import Path
 from time import perf_counter
 import math
 from collections import defaultdict
+from functools import partial
 
+from ..common.process import StageRecorder, pool_map, print_stages
+from ..common.columnar import export_columnar
+from ..common.store import read_spart, write_spart
 from ..common.types import Results
-from .types import OpenResults
+from .types import BootstrapMode, OpenResults, SpartitionLimits
+
+# Assumed concordance rate for a real boundary (H1) vs random (H0),
+# used for the log Bayes factor score.
+THETA_1 = 0.8
+THETA_0 = 0.5
+LOG_BF_SUPPORT = math.log(THETA_1 / THETA_0)
+LOG_BF_NO_SUPPORT = math.log((1 - THETA_1) / (1 - THETA_0))
+
+# Prior penalty per species for BayesPP (PDF 1).
+# Higher λ = stronger preference for fewer species.
+LAMBDA = 0.1
+
+# Strength of the size-based neutral chance model used by BayesMeanCC.
+# A pair of subsets with n_a, n_b individuals is assigned a chance
+# concordance rate 1 / (1 + n_a·n_b / (β·N)): smaller subsets look
+# "distinct" by chance more easily, so the mean chance rate rises with the
+# number of subsets. Smaller β = higher assumed chance rate = stronger
+# discount. Tune to taste, or replace θ0 with an empirical estimate from
+# reshuffled partitions (see SCORES.md).
+CHANCE_BETA = 0.05
+
+# Below this many spartitions, scoring serially beats starting a pool.
+PARALLEL_MIN_SPARTITIONS = 32
+
+# Scores that get a bootstrap interval, and how wide it is.
+BOOTSTRAP_SCORES = ["CSWm", "BayesMeanC", "BayesMeanCC", "BayesPP"]
+BOOTSTRAP_CONFIDENCE = 0.95
+
+# Cap on replicates × resampled units held in memory at once.
+BOOTSTRAP_CHUNK_CELLS = 1_000_000
 
 
 def initialize():
@@ -17,12 +51,10 @@ def initialize():
 
 
 def open_spart(path: Path):
-    from itaxotools.spart_parser import Spart
-
     if not path.is_file():
         return OpenResults({}, {})
 
-    spart = Spart.fromXML(path)
+    spart = read_spart(path)
 
     concordance_data: dict[str, dict[str, object]] = {}
 
@@ -40,6 +72,376 @@ def open_spart(path: Path):
     return OpenResults(concordance_data, individuals_list)
 
 
+def read_spartition_limits(
+    spart, spartition: str, concordance_weights: dict[str, float]
+) -> SpartitionLimits:
+    """Gather what scoring needs from one spartition, and nothing else."""
+    concordances: list[tuple[str, str]] = []
+    limits: list[tuple[int, str, str, bool, int, int]] = []
+
+    for concordance in spart.getSpartitionConcordances(spartition):
+        if concordance not in concordance_weights:
+            continue
+        data = spart.getConcordanceData(spartition, concordance)
+        index = len(concordances)
+        concordances.append((concordance, data["evidenceType"]))
+        for limit in spart.getConcordantLimits(spartition, concordance):
+            concordant = limit["concordanceSupport"]
+            if not isinstance(concordant, bool):
+                raise TypeError(
+                    f"concordanceSupport for '{concordance}' is {type(concordant).__name__}, "
+                    "not bool — only Boolean concordances should be scored"
+                )
+            limits.append(
+                (
+                    index,
+                    limit["subsetnumberA"],
+                    limit["subsetnumberB"],
+                    concordant,
+                    limit["NIndividualsSubsetA"],
+                    limit["NIndividualsSubsetB"],
+                )
+            )
+
+    return SpartitionLimits(
+        spartition,
+        len(spart.getSpartitionSubsets(spartition)),
+        concordances,
+        limits,
+    )
+
+
+def get_line_weights(
+    spartition: SpartitionLimits,
+    concordance_weights: dict[str, float],
+    evidence_types_weights: dict[str, float],
+    evidence_types_behaviours: dict[str, bool],
+) -> list[float]:
+    """The final weight of each concordance, after evidence type weighting."""
+    evidence_types_totals: dict[str, int] = defaultdict(lambda: 0)
+    for concordance, evidence_type in spartition.concordances:
+        evidence_types_totals[evidence_type] += concordance_weights[concordance]
+
+    line_weights = []
+    for concordance, evidence_type in spartition.concordances:
+        weight = concordance_weights[concordance]
+        weight *= evidence_types_weights[evidence_type]
+        if not evidence_types_behaviours[evidence_type]:
+            weight /= evidence_types_totals[evidence_type]
+        line_weights.append(weight)
+    return line_weights
+
+
+def score_spartition(
+    spartition: SpartitionLimits,
+    N: int,
+    concordance_weights: dict[str, float],
+    evidence_types_weights: dict[str, float],
+    evidence_types_behaviours: dict[str, bool],
+) -> tuple[dict[str, float], float | None]:
+    """Score a single spartition, independently of all others.
+
+    Returns the spartition data to write, in order, and the unnormalized
+    log-posterior for BayesPP, or None if no pair of subsets was tested.
+    """
+    score: int = 0
+    score_c: float = 0.0
+    support_table: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
+    support_table_cap: dict[tuple[int, int], int] = defaultdict(lambda: 0)
+    # total weight per pair (concordant + non-concordant), for Bayesian scoring
+    weighted_total_table: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
+    # accumulated log Bayes factor per pair
+    log_bf_table: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
+    # weight-weighted sum of the neutral chance rate, over every test
+    # (line × pair), for BayesMeanCC
+    chance_weighted: float = 0.0
+    combinations = math.comb(spartition.subset_count, 2)
+    line_weights = get_line_weights(
+        spartition,
+        concordance_weights,
+        evidence_types_weights,
+        evidence_types_behaviours,
+    )
+
+    for index, sub_a, sub_b, concordant, n_a, n_b in spartition.limits:
+        sub_a, sub_b = sorted([sub_a, sub_b])
+        weight = line_weights[index]
+        support = weight if concordant else 0.0
+        score += support
+        support_table[(sub_a, sub_b)] += support
+        support_table_cap[(sub_a, sub_b)] += 1
+        weighted_total_table[(sub_a, sub_b)] += weight
+        log_bf_table[(sub_a, sub_b)] += weight * (
+            LOG_BF_SUPPORT if concordant else LOG_BF_NO_SUPPORT
+        )
+        chance_weighted += weight * (1.0 / (1.0 + (n_a * n_b) / (CHANCE_BETA * N)))
+    for limit in support_table:
+        score_c += support_table[limit] * (
+            support_table_cap[limit] / len(concordance_weights)
+        )
+
+    data = dict(
+        CSU=score,
+        CSW=score / combinations,
+        CSWm=score / combinations / spartition.subset_count,
+        CSWC=score_c / combinations,
+    )
+
+    if not support_table:
+        return data, None
+
+    # Per-pair Bayesian posterior using a Jeffreys Beta(0.5, 0.5) prior.
+    # Rate = weighted support fraction in [0,1]; count (n) = number of
+    # concordances that actually tested this pair (unweighted). Separating
+    # rate from count ensures large total weights don't push posteriors to
+    # floor — n governs uncertainty, rate governs the estimate.
+    # Neutral value (n=0): 0.5 / 1 = 0.5.
+    pair_posteriors = {}
+    for pair in support_table:
+        n = support_table_cap[pair]
+        rate = support_table[pair] / weighted_total_table[pair]
+        pair_posteriors[pair] = (rate * n + 0.5) / (n + 1.0)
+
+    # BayesMean: geometric mean of all pair posteriors.
+    # High when most boundaries are consistently well-supported.
+    log_sum = sum(math.log(p) for p in pair_posteriors.values())
+    bayes_mean = math.exp(log_sum / len(pair_posteriors))
+
+    # BayesMin: minimum pair posterior.
+    # High only when every boundary has support — weakest-link criterion.
+    bayes_min = min(pair_posteriors.values())
+
+    # BayesLogFactor: per-pair log Bayes factor scaled by concordance count
+    # (H1: real boundary, expected rate=0.8; H0: random, rate=0.5), then
+    # mean across pairs and converted to probability via sigmoid.
+    pair_log_bfs = {}
+    for pair in support_table:
+        n = support_table_cap[pair]
+        rate = support_table[pair] / weighted_total_table[pair]
+        pair_log_bfs[pair] = n * (
+            rate * LOG_BF_SUPPORT + (1.0 - rate) * LOG_BF_NO_SUPPORT
+        )
+    mean_log_bf = sum(pair_log_bfs.values()) / len(pair_log_bfs)
+    bayes_log_factor = 1.0 / (1.0 + math.exp(-mean_log_bf))
+
+    data.update(
+        BayesMean=bayes_mean,
+        BayesMin=bayes_min,
+        BayesLogFactor=bayes_log_factor,
+    )
+
+    # Partition-level scores (PDF 1 & PDF 2).
+    # p_hat is the true weighted concordance rate in [0,1]: weighted
+    # concordant tests over weighted total tests. It is independent of K,
+    # so large partitions are not penalised merely for having more pairs.
+    # E (effective evidence lines) = total concordance weight, also
+    # independent of C(K,2), so likelihood magnitudes stay comparable across
+    # partitions. S = p_hat * E. Laplace smoothing keeps p strictly inside
+    # (0,1) so log(p) and log(1-p) are always defined.
+    weighted_total = sum(weighted_total_table.values())
+    p_hat = score / weighted_total if weighted_total else 0.0
+    E = sum(line_weights)
+    S = p_hat * E
+    K = spartition.subset_count
+    p = (S + 0.5) / (E + 1.0)
+    log_L = S * math.log(p) + (E - S) * math.log(1.0 - p)
+
+    # BayesMeanC (Fix 1): composition/coverage-invariant "corrected
+    # BayesMean". A single Jeffreys Beta(0.5, 0.5) posterior on the
+    # pooled concordance rate p_hat, with prior strength E (evidence
+    # lines, independent of K) instead of the per-pair coverage that
+    # makes plain BayesMean drift with subset count. Any two partitions
+    # with the same weighted concordance proportion get an identical
+    # score, whatever their number or composition of subsets. Neutral
+    # value (p_hat=0.5): 0.5. Higher is better.
+    bayes_mean_c = (S + 0.5) / (E + 1.0)
+
+    # BayesMeanCC (Fix 2): BayesMeanC additionally corrected for the
+    # chance that more (hence smaller) subsets score "yes" more readily.
+    # theta_0 is the weighted mean neutral chance rate; it rises with K.
+    # kappa is the excess concordance over chance (Cohen's-kappa form),
+    # then Jeffreys-smoothed exactly like BayesMeanC. Perfect support
+    # (p_hat=1) always gives kappa=1, but partial support is discounted
+    # more heavily the larger K is. Higher is better; 0.5/(E+1) means
+    # "no better than chance".
+    theta_0 = chance_weighted / weighted_total if weighted_total else 0.0
+    kappa = max(0.0, (p_hat - theta_0) / (1.0 - theta_0)) if theta_0 < 1.0 else 0.0
+    bayes_mean_cc = (kappa * E + 0.5) / (E + 1.0)
+
+    data.update(
+        BayesMeanC=bayes_mean_c,
+        BayesMeanCC=bayes_mean_cc,
+    )
+
+    # BIC / AIC: lower is better.
+    log_N = math.log(N) if N > 1 else 1.0
+    data.update(
+        BIC=-2.0 * log_L + K * log_N,
+        AIC=-2.0 * log_L + 2.0 * K,
+    )
+
+    # Unnormalized log-posterior for BayesPP.
+    # Prior exp(-λK) penalizes many species (over-splitting).
+    return data, log_L + (-LAMBDA * K)
+
+
+def bootstrap_spartition(
+    spartition: SpartitionLimits,
+    seed,
+    mode: BootstrapMode,
+    replicates: int,
+    N: int,
+    concordance_weights: dict[str, float],
+    evidence_types_weights: dict[str, float],
+    evidence_types_behaviours: dict[str, bool],
+):
+    """Replicate the partition-level scores over resampled evidence.
+
+    Each replicate draws the concordances (or the subset pairs) with
+    replacement. Every test is a cell of the pairs × concordances matrix, and
+    the partition-level scores only ever need its weighted margins, so each
+    replicate reduces to a dot product of its draw counts with those margins.
+    All replicates are drawn and scored at once, a chunk at a time.
+
+    Returns the replicated CSWm, BayesMeanC and BayesMeanCC, and the
+    unnormalized BayesPP log-posterior, which the caller normalizes across
+    spartitions one replicate at a time.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+
+    weights = np.asarray(
+        get_line_weights(
+            spartition,
+            concordance_weights,
+            evidence_types_weights,
+            evidence_types_behaviours,
+        ),
+        dtype=float,
+    )
+    K = spartition.subset_count
+    combinations = math.comb(K, 2)
+
+    index, sub_a, sub_b, concordant, n_a, n_b = zip(*spartition.limits)
+    pair_ids: dict[tuple[str, str], int] = {}
+    pair = np.fromiter(
+        (
+            pair_ids.setdefault((a, b) if a <= b else (b, a), len(pair_ids))
+            for a, b in zip(sub_a, sub_b)
+        ),
+        dtype=np.intp,
+        count=len(sub_a),
+    )
+    line = np.asarray(index, dtype=np.intp)
+    weight = weights[line]
+    support = weight * np.asarray(concordant, dtype=float)
+    chance = weight / (
+        1.0
+        + np.asarray(n_a, dtype=float)
+        * np.asarray(n_b, dtype=float)
+        / (CHANCE_BETA * N)
+    )
+
+    if mode is BootstrapMode.Pairs:
+        units = np.asarray(pair)
+        unit_count = len(pair_ids)
+    else:
+        units = line
+        unit_count = len(weights)
+
+    margins = np.stack(
+        [
+            np.bincount(units, weights=support, minlength=unit_count),
+            np.bincount(units, weights=weight, minlength=unit_count),
+            np.bincount(units, weights=chance, minlength=unit_count),
+        ],
+        axis=1,
+    )
+
+    rows = max(1, BOOTSTRAP_CHUNK_CELLS // max(1, unit_count))
+    probabilities = np.full(unit_count, 1.0 / unit_count)
+    sums = []
+    lines = []
+    for start in range(0, replicates, rows):
+        size = min(rows, replicates - start)
+        counts = rng.multinomial(unit_count, probabilities, size=size)
+        counts = counts.astype(float)
+        sums.append(counts @ margins)
+        if mode is BootstrapMode.Concordances:
+            lines.append(counts @ weights)
+    sums = np.concatenate(sums)
+    score, total, chance_weighted = sums[:, 0], sums[:, 1], sums[:, 2]
+
+    # Resampling pairs leaves every evidence line in place.
+    if mode is BootstrapMode.Concordances:
+        E = np.concatenate(lines)
+    else:
+        E = np.full(replicates, weights.sum())
+
+    p_hat = np.divide(score, total, out=np.zeros(replicates), where=total > 0)
+    S = p_hat * E
+    p = (S + 0.5) / (E + 1.0)
+    log_L = S * np.log(p) + (E - S) * np.log(1.0 - p)
+
+    theta_0 = np.divide(
+        chance_weighted, total, out=np.zeros(replicates), where=total > 0
+    )
+    kappa = np.divide(
+        p_hat - theta_0,
+        1.0 - theta_0,
+        out=np.zeros(replicates),
+        where=theta_0 < 1.0,
+    )
+    kappa = np.maximum(0.0, kappa)
+
+    replicated = {
+        "CSWm": score / combinations / K,
+        "BayesMeanC": p,
+        "BayesMeanCC": (kappa * E + 0.5) / (E + 1.0),
+    }
+    return replicated, log_L + (-LAMBDA * K)
+
+
+def get_interval(values) -> tuple[float, float]:
+    """Percentile interval holding BOOTSTRAP_CONFIDENCE of the values."""
+    import numpy as np
+
+    tail = (1.0 - BOOTSTRAP_CONFIDENCE) / 2.0
+    lower, upper = np.quantile(values, [tail, 1.0 - tail])
+    return float(lower), float(upper)
+
+
+def evaluate_spartition(
+    job: tuple[SpartitionLimits, object],
+    bootstrap_mode: BootstrapMode,
+    bootstrap_replicates: int,
+    **kwargs,
+) -> tuple[dict[str, float], float | None, object | None]:
+    """Score one spartition, with bootstrap intervals if requested.
+
+    The BayesPP replicates are returned as they are, since they can only be
+    normalized once every spartition is done.
+    """
+    spartition, seed = job
+    data, log_posterior = score_spartition(spartition, **kwargs)
+
+    if bootstrap_mode is BootstrapMode.Off or log_posterior is None:
+        return data, log_posterior, None
+
+    replicated, log_posteriors = bootstrap_spartition(
+        spartition, seed, bootstrap_mode, bootstrap_replicates, **kwargs
+    )
+    data.update(
+        BootstrapMode=bootstrap_mode.key,
+        BootstrapReplicates=bootstrap_replicates,
+    )
+    for key, values in replicated.items():
+        data[f"{key}Lower"], data[f"{key}Upper"] = get_interval(values)
+
+    return data, log_posterior, log_posteriors
+
+
 def execute(
     concordance_path: Path,
     output_path: Path,
@@ -48,9 +450,12 @@ def execute(
     evidence_types_behaviours: dict[str, bool],
     conspecific_constraints: list[list[str]],
     heterospecific_constraints: list[list[str]],
+    bootstrap_mode: BootstrapMode = BootstrapMode.Off,
+    bootstrap_replicates: int = 1000,
+    bootstrap_seed: int = -1,
+    workers: int = 0,
+    columnar_format: str | None = None,
 ) -> Results:
-    from itaxotools.spart_parser import Spart
-
     print(f"{concordance_weights=}")
     print(f"{evidence_types_weights=}")
     print(f"{evidence_types_behaviours=}")
@@ -58,209 +463,67 @@ def execute(
     print(f"{heterospecific_constraints=}")
 
     ts = perf_counter()
-
-    spart = Spart.fromXML(concordance_path)
-
-    N = len(spart.getIndividuals())
-
-    # Assumed concordance rate for a real boundary (H1) vs random (H0),
-    # used for the log Bayes factor score.
-    THETA_1 = 0.8
-    THETA_0 = 0.5
-    LOG_BF_SUPPORT = math.log(THETA_1 / THETA_0)
-    LOG_BF_NO_SUPPORT = math.log((1 - THETA_1) / (1 - THETA_0))
-
-    # Prior penalty per species for BayesPP (PDF 1).
-    # Higher λ = stronger preference for fewer species.
-    LAMBDA = 0.1
-
-    # Strength of the size-based neutral chance model used by BayesMeanCC.
-    # A pair of subsets with n_a, n_b individuals is assigned a chance
-    # concordance rate 1 / (1 + n_a·n_b / (β·N)): smaller subsets look
-    # "distinct" by chance more easily, so the mean chance rate rises with the
-    # number of subsets. Smaller β = higher assumed chance rate = stronger
-    # discount. Tune to taste, or replace θ0 with an empirical estimate from
-    # reshuffled partitions (see SCORES.md).
-    CHANCE_BETA = 0.05
+    recorder = StageRecorder()
+
+    with recorder.stage("Read") as counters:
+        spart = read_spart(concordance_path)
+        N = len(spart.getIndividuals())
+        counters["individuals"] = N
+
+    # Spartitions are scored independently of each other, each on a worker
+    # that only receives its own limits. Everything that needs the whole
+    # file, like the constraints and the BayesPP normalization, stays here.
+    with recorder.stage("Gather limits") as counters:
+        inputs = [
+            read_spartition_limits(spart, spartition, concordance_weights)
+            for spartition in spart.getSpartitions()
+            if len(spart.getSpartitionSubsets(spartition)) >= 2
+        ]
+        counters["spartitions"] = len(inputs)
+        counters["limits"] = sum(len(spartition.limits) for spartition in inputs)
+
+    # One independent stream per spartition, so that the intervals do not
+    # depend on how the spartitions were spread over the workers.
+    seeds = [None] * len(inputs)
+    if bootstrap_mode is not BootstrapMode.Off:
+        import numpy as np
+
+        root = np.random.SeedSequence(None if bootstrap_seed < 0 else bootstrap_seed)
+        seeds = root.spawn(len(inputs))
+
+    if len(inputs) < PARALLEL_MIN_SPARTITIONS:
+        workers = 1
+    with recorder.stage("Score") as counters:
+        outputs = pool_map(
+            partial(
+                evaluate_spartition,
+                bootstrap_mode=bootstrap_mode,
+                bootstrap_replicates=bootstrap_replicates,
+                N=N,
+                concordance_weights=concordance_weights,
+                evidence_types_weights=evidence_types_weights,
+                evidence_types_behaviours=evidence_types_behaviours,
+            ),
+            list(zip(inputs, seeds)),
+            workers,
+        )
+        counters["spartitions"] = len(outputs)
+        counters["replicates"] = sum(
+            bootstrap_replicates for *_, replicates in outputs if replicates is not None
+        )
 
     # Collected per-spartition for BayesPP normalization after the main loop.
     bayes_pp_data: list[tuple[str, float]] = []
+    bayes_pp_replicates: list[tuple[str, object]] = []
 
-    for spartition in spart.getSpartitions():
-        subsets = spart.getSpartitionSubsets(spartition)
-        if len(subsets) < 2:
-            continue
-
-        score: int = 0
-        score_c: float = 0.0
-        support_table: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
-        support_table_cap: dict[tuple[int, int], int] = defaultdict(lambda: 0)
-        # total weight per pair (concordant + non-concordant), for Bayesian scoring
-        weighted_total_table: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
-        # accumulated log Bayes factor per pair
-        log_bf_table: dict[tuple[int, int], float] = defaultdict(lambda: 0.0)
-        # weight-weighted sum of the neutral chance rate, over every test
-        # (line × pair), for BayesMeanCC
-        chance_weighted: float = 0.0
-        combinations = math.comb(len(subsets), 2)
-        evidence_types_totals: dict[str, int] = defaultdict(lambda: 0)
-        concordance_evidence_types: dict[str, str] = {}
-        final_concordance_weights: dict[str, float] = {}
-
-        for concordance in spart.getSpartitionConcordances(spartition):
-            if concordance not in concordance_weights:
-                continue
-            data = spart.getConcordanceData(spartition, concordance)
-            evidence_type = data["evidenceType"]
-            concordance_evidence_types[concordance] = evidence_type
-            evidence_types_totals[evidence_type] += concordance_weights[concordance]
-
-        for concordance, evidence_type in concordance_evidence_types.items():
-            weight = concordance_weights[concordance]
-            weight *= evidence_types_weights[evidence_type]
-            if not evidence_types_behaviours[evidence_type]:
-                weight /= evidence_types_totals[evidence_type]
-            final_concordance_weights[concordance] = weight
-
-        for concordance in spart.getSpartitionConcordances(spartition):
-            if concordance not in concordance_weights:
-                continue
-            for limit in spart.getConcordantLimits(spartition, concordance):
-                sub_a = limit["subsetnumberA"]
-                sub_b = limit["subsetnumberB"]
-                sub_a, sub_b = sorted([sub_a, sub_b])
-                concordant = limit["concordanceSupport"]
-                if not isinstance(concordant, bool):
-                    raise TypeError(
-                        f"concordanceSupport for '{concordance}' is {type(concordant).__name__}, "
-                        "not bool — only Boolean concordances should be scored"
-                    )
-                weight = final_concordance_weights[concordance]
-                support = weight if concordant else 0.0
-                score += support
-                support_table[(sub_a, sub_b)] += support
-                support_table_cap[(sub_a, sub_b)] += 1
-                weighted_total_table[(sub_a, sub_b)] += weight
-                log_bf_table[(sub_a, sub_b)] += weight * (
-                    LOG_BF_SUPPORT if concordant else LOG_BF_NO_SUPPORT
-                )
-                n_a = limit["NIndividualsSubsetA"]
-                n_b = limit["NIndividualsSubsetB"]
-                chance_weighted += weight * (
-                    1.0 / (1.0 + (n_a * n_b) / (CHANCE_BETA * N))
-                )
-        for limit in support_table:
-            score_c += support_table[limit] * (
-                support_table_cap[limit] / len(concordance_weights)
-            )
-
-        spart.addSpartitionData(
-            spartition,
-            CSU=score,
-            CSW=score / combinations,
-            CSWm=score / combinations / len(subsets),
-            CSWC=score_c / combinations,
-        )
-
-        if support_table:
-            # Per-pair Bayesian posterior using a Jeffreys Beta(0.5, 0.5) prior.
-            # Rate = weighted support fraction in [0,1]; count (n) = number of
-            # concordances that actually tested this pair (unweighted). Separating
-            # rate from count ensures large total weights don't push posteriors to
-            # floor — n governs uncertainty, rate governs the estimate.
-            # Neutral value (n=0): 0.5 / 1 = 0.5.
-            pair_posteriors = {}
-            for pair in support_table:
-                n = support_table_cap[pair]
-                rate = support_table[pair] / weighted_total_table[pair]
-                pair_posteriors[pair] = (rate * n + 0.5) / (n + 1.0)
-
-            # BayesMean: geometric mean of all pair posteriors.
-            # High when most boundaries are consistently well-supported.
-            log_sum = sum(math.log(p) for p in pair_posteriors.values())
-            bayes_mean = math.exp(log_sum / len(pair_posteriors))
-
-            # BayesMin: minimum pair posterior.
-            # High only when every boundary has support — weakest-link criterion.
-            bayes_min = min(pair_posteriors.values())
-
-            # BayesLogFactor: per-pair log Bayes factor scaled by concordance count
-            # (H1: real boundary, expected rate=0.8; H0: random, rate=0.5), then
-            # mean across pairs and converted to probability via sigmoid.
-            pair_log_bfs = {}
-            for pair in support_table:
-                n = support_table_cap[pair]
-                rate = support_table[pair] / weighted_total_table[pair]
-                pair_log_bfs[pair] = n * (
-                    rate * LOG_BF_SUPPORT + (1.0 - rate) * LOG_BF_NO_SUPPORT
-                )
-            mean_log_bf = sum(pair_log_bfs.values()) / len(pair_log_bfs)
-            bayes_log_factor = 1.0 / (1.0 + math.exp(-mean_log_bf))
-
-            spart.addSpartitionData(
-                spartition,
-                BayesMean=bayes_mean,
-                BayesMin=bayes_min,
-                BayesLogFactor=bayes_log_factor,
-            )
-
-            # Partition-level scores (PDF 1 & PDF 2).
-            # p_hat is the true weighted concordance rate in [0,1]: weighted
-            # concordant tests over weighted total tests. It is independent of K,
-            # so large partitions are not penalised merely for having more pairs.
-            # E (effective evidence lines) = total concordance weight, also
-            # independent of C(K,2), so likelihood magnitudes stay comparable across
-            # partitions. S = p_hat * E. Laplace smoothing keeps p strictly inside
-            # (0,1) so log(p) and log(1-p) are always defined.
-            weighted_total = sum(weighted_total_table.values())
-            p_hat = score / weighted_total if weighted_total else 0.0
-            E = sum(final_concordance_weights.values())
-            S = p_hat * E
-            K = len(subsets)
-            p = (S + 0.5) / (E + 1.0)
-            log_L = S * math.log(p) + (E - S) * math.log(1.0 - p)
-
-            # BayesMeanC (Fix 1): composition/coverage-invariant "corrected
-            # BayesMean". A single Jeffreys Beta(0.5, 0.5) posterior on the
-            # pooled concordance rate p_hat, with prior strength E (evidence
-            # lines, independent of K) instead of the per-pair coverage that
-            # makes plain BayesMean drift with subset count. Any two partitions
-            # with the same weighted concordance proportion get an identical
-            # score, whatever their number or composition of subsets. Neutral
-            # value (p_hat=0.5): 0.5. Higher is better.
-            bayes_mean_c = (S + 0.5) / (E + 1.0)
-
-            # BayesMeanCC (Fix 2): BayesMeanC additionally corrected for the
-            # chance that more (hence smaller) subsets score "yes" more readily.
-            # theta_0 is the weighted mean neutral chance rate; it rises with K.
-            # kappa is the excess concordance over chance (Cohen's-kappa form),
-            # then Jeffreys-smoothed exactly like BayesMeanC. Perfect support
-            # (p_hat=1) always gives kappa=1, but partial support is discounted
-            # more heavily the larger K is. Higher is better; 0.5/(E+1) means
-            # "no better than chance".
-            theta_0 = chance_weighted / weighted_total if weighted_total else 0.0
-            kappa = (
-                max(0.0, (p_hat - theta_0) / (1.0 - theta_0)) if theta_0 < 1.0 else 0.0
-            )
-            bayes_mean_cc = (kappa * E + 0.5) / (E + 1.0)
-
-            spart.addSpartitionData(
-                spartition,
-                BayesMeanC=bayes_mean_c,
-                BayesMeanCC=bayes_mean_cc,
-            )
+    for spartition_limits, (data, log_posterior, replicates) in zip(inputs, outputs):
+        spartition = spartition_limits.label
+        spart.addSpartitionData(spartition, **data)
 
-            # BIC / AIC: lower is better.
-            log_N = math.log(N) if N > 1 else 1.0
-            spart.addSpartitionData(
-                spartition,
-                BIC=-2.0 * log_L + K * log_N,
-                AIC=-2.0 * log_L + 2.0 * K,
-            )
-
-            # Collect unnormalized log-posterior for BayesPP.
-            # Prior exp(-λK) penalizes many species (over-splitting).
-            bayes_pp_data.append((spartition, log_L + (-LAMBDA * K)))
+        if log_posterior is not None:
+            bayes_pp_data.append((spartition, log_posterior))
+        if replicates is not None:
+            bayes_pp_replicates.append((spartition, replicates))
 
         def check_conspecific() -> bool:
             for subset in spart.getSpartitionSubsets(spartition):
@@ -307,8 +570,36 @@ def execute(
                 BayesPP=math.exp(log_posterior - max_lv) / denom,
             )
 
-    spart.toXML(output_path)
+    # Replicate b of every spartition is normalized against replicate b of
+    # all the others, the same way as the point estimate.
+    if bayes_pp_replicates:
+        import numpy as np
+
+        log_matrix = np.stack([values for _, values in bayes_pp_replicates])
+        log_matrix -= log_matrix.max(axis=0)
+        posterior = np.exp(log_matrix)
+        posterior /= posterior.sum(axis=0)
+        for (spartition_label, _), values in zip(bayes_pp_replicates, posterior):
+            lower, upper = get_interval(values)
+            spart.addSpartitionData(
+                spartition_label,
+                BayesPPLower=lower,
+                BayesPPUpper=upper,
+            )
+
+    # Into a store scored before, only the scores that moved are written.
+    with recorder.stage("Write") as counters:
+        rows = write_spart(spart, output_path)
+        if rows is not None:
+            counters["rows"] = rows
+
+    if columnar_format:
+        with recorder.stage("Columnar") as counters:
+            counters.update(export_columnar(spart, output_path, columnar_format))
 
     tf = perf_counter()
 
-    return Results(output_path, tf - ts)
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return Results(output_path, tf - ts, stages)
@@ -1,14 +1,39 @@
 from __future__ import annotations
 
+from enum import Enum
 from pathlib import Path
 from typing import NamedTuple
 
 
+class BootstrapMode(Enum):
+    Off = "off", "No bootstrap"
+    Concordances = "concordances", "Resample concordances"
+    Pairs = "pairs", "Resample subset pairs"
+
+    def __init__(self, key: str, label: str):
+        self.key = key
+        self.label = label
+
+
 class Results(NamedTuple):
     output_path: Path
     seconds_taken: float
 
 
+class SpartitionLimits(NamedTuple):
+    """The concordant limits of one spartition, in a compact picklable form.
+
+    `concordances` holds (label, evidence type) for every weighted concordance
+    in file order, and each limit refers to one of them by index as
+    (concordance, subset A, subset B, concordant, N in A, N in B).
+    """
+
+    label: str
+    subset_count: int
+    concordances: list[tuple[str, str]]
+    limits: list[tuple[int, str, str, bool, int, int]]
+
+
 class OpenResults(NamedTuple):
     concordance_data: dict[str, dict[str]]
     individuals_list: list[str]
@@ -7,9 +7,10 @@ from itaxotools.taxi_gui import app
 from itaxotools.taxi_gui.tasks.common.view import ProgressCard
 from itaxotools.taxi_gui.view.cards import Card
 from itaxotools.taxi_gui.view.animations import VerticalRollAnimation
+from itaxotools.taxi_gui.view.widgets import NoWheelComboBox
 from itaxotools.taxi_gui.utility import human_readable_seconds
 
-from ..common.widgets import GrowingTextEdit
+from ..common.widgets import GrowingTextEdit, IntPropertyLineEdit
 from ..common.view import (
     BlastTaskView,
     GraphicTitleCard,
@@ -22,6 +23,7 @@ from ..visualize.model import Model as VisualizeModel
 
 from . import long_description, pixmap_medium, title
 from .model import BooleanFilterProxyModel
+from .types import BootstrapMode
 
 
 class PathFileSelector(PathSelector):
@@ -40,7 +42,7 @@ class PathFileOutSelector(PathSelector):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(
             parent=self.window(),
             caption=f"{app.config.title} - Save file",
-            filter="SPART XML (*.xml)",
+            filter="SPART XML (*.xml);;SPART store (*.sqlite)",
         )
         if not filename:
             return
@@ -376,6 +378,80 @@ class IndividualRestrainsView(OptionCard):
         text_edit.ensureCursorVisible()
 
 
+class BootstrapModeCombobox(NoWheelComboBox):
+    valueChanged = QtCore.Signal(BootstrapMode)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for mode in BootstrapMode:
+            self.addItem(mode.label, mode)
+        self.currentIndexChanged.connect(self._handle_index_changed)
+
+    def _handle_index_changed(self, index):
+        self.valueChanged.emit(self.itemData(index))
+
+    def setValue(self, value: BootstrapMode):
+        index = self.findData(value)
+        self.setCurrentIndex(index)
+
+
+class BootstrapSelector(Card):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        label = QtWidgets.QLabel("\u2022  Bootstrap intervals:")
+        label.setStyleSheet("""font-size: 16px;""")
+        label.setMinimumWidth(150)
+
+        title_layout = QtWidgets.QHBoxLayout()
+        title_layout.addWidget(label, 1)
+        title_layout.setSpacing(16)
+
+        options_layout = QtWidgets.QGridLayout()
+        options_layout.setColumnMinimumWidth(0, 16)
+        options_layout.setColumnMinimumWidth(1, 54)
+        options_layout.setColumnStretch(3, 1)
+        options_layout.setHorizontalSpacing(32)
+        options_layout.setVerticalSpacing(8)
+        row = 0
+
+        name = QtWidgets.QLabel("Resampling:")
+        field = BootstrapModeCombobox()
+        description = QtWidgets.QLabel(
+            "Report 95% intervals for CSWm, BayesMeanC, BayesMeanCC and BayesPP."
+        )
+        description.setStyleSheet("QLabel { font-style: italic; }")
+        options_layout.addWidget(name, row, 1)
+        options_layout.addWidget(field, row, 2)
+        options_layout.addWidget(description, row, 3)
+        self.controls.mode = field
+        row += 1
+
+        name = QtWidgets.QLabel("Replicates:")
+        field = IntPropertyLineEdit()
+        description = QtWidgets.QLabel("Number of resamples for each spartition.")
+        description.setStyleSheet("QLabel { font-style: italic; }")
+        options_layout.addWidget(name, row, 1)
+        options_layout.addWidget(field, row, 2)
+        options_layout.addWidget(description, row, 3)
+        self.controls.replicates = field
+        row += 1
+
+        name = QtWidgets.QLabel("Seed:")
+        field = IntPropertyLineEdit()
+        description = QtWidgets.QLabel(
+            "Use fixed seed value. If you don’t want to use a fixed seed value, set to -1."
+        )
+        description.setStyleSheet("QLabel { font-style: italic; }")
+        options_layout.addWidget(name, row, 1)
+        options_layout.addWidget(field, row, 2)
+        options_layout.addWidget(description, row, 3)
+        self.controls.seed = field
+        row += 1
+
+        self.addLayout(title_layout)
+        self.addLayout(options_layout)
+
+
 class View(BlastTaskView):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -401,6 +477,7 @@ class View(BlastTaskView):
         self.cards.heterospecific_constraints = IndividualRestrainsView(
             "Heterospecific constraints", self
         )
+        self.cards.bootstrap = BootstrapSelector(self)
 
         self.cards.concordances.set_placeholder_text(
             "SPART XML file conbtaining concordances"
@@ -509,6 +586,21 @@ class View(BlastTaskView):
             object.heterospecific_constraints_enabled
         )
 
+        self.binder.bind(
+            object.properties.bootstrap_mode,
+            self.cards.bootstrap.controls.mode.setValue,
+        )
+        self.binder.bind(
+            self.cards.bootstrap.controls.mode.valueChanged,
+            object.properties.bootstrap_mode,
+        )
+        self.cards.bootstrap.controls.replicates.bind_property(
+            object.properties.bootstrap_replicates
+        )
+        self.cards.bootstrap.controls.seed.bind_property(
+            object.properties.bootstrap_seed
+        )
+
         self.binder.bind(object.properties.editable, self.setEditable)
 
     def setEditable(self, editable: bool):
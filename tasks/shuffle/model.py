@@ -138,6 +138,7 @@ class Model(BlastTaskModel):
     split_count = Property(int, 0)
     swap_count = Property(int, 0)
     spread = Property(float, 0.6)
+    seed = Property(int, -1)
 
     def __init__(self, name=None):
         super().__init__(name)
@@ -186,6 +187,7 @@ class Model(BlastTaskModel):
             split_count=self.split_count,
             swap_count=self.swap_count,
             spread=self.spread,
+            seed=self.seed,
         )
 
     def onDone(self, report: ReportDone):
@@ -1,7 +1,11 @@
-import random
+import hashlib
+from functools import partial
 from pathlib import Path
 from time import perf_counter
 
+import numpy as np
+
+from ..common.process import StageRecorder, pool_map, print_stages
 from ..common.types import Results
 from .types import OpenResults, PartitionInfo
 
@@ -9,9 +13,16 @@ from .types import OpenResults, PartitionInfo
 # between partitions (occasional large values); lower = flatter, more uniform.
 BELL_SIGMA = 0.6
 
+# Below this many new partitions per base, a pool costs more than it saves.
+PARALLEL_MIN_PARTITIONS = 64
+
+# Rounds of resampling for partitions that turned out to be duplicates,
+# before giving up on the ones still missing.
+MAX_RESAMPLE_ROUNDS = 100
+
 
 def sample_bell(
-    count: int, total: int, rng: random.Random, sigma: float = BELL_SIGMA
+    count: int, total: int, rng: np.random.Generator, sigma: float = BELL_SIGMA
 ) -> list[int]:
     """Sample a bell curve `count` times and scale it to sum to exactly `total`.
 
@@ -26,7 +37,7 @@ def sample_bell(
     if total <= 0:
         return [0] * count
 
-    samples = [max(0.0, rng.gauss(1.0, sigma)) for _ in range(count)]
+    samples = [max(0.0, float(value)) for value in rng.normal(1.0, sigma, count)]
     weight = sum(samples)
     if weight > 0:
         raw = [sample * total / weight for sample in samples]
@@ -71,7 +82,7 @@ def fill_empty_partitions(op_samples: dict[str, list[int]], count: int) -> None:
 def plan_new_partitions(
     new_partitions: int,
     operation_totals: dict[str, int],
-    rng: random.Random,
+    rng: np.random.Generator,
     sigma: float = BELL_SIGMA,
 ) -> tuple[dict[str, list[int]], list[dict[str, int]]]:
     """Plan how many of each operation is applied to each new partition.
@@ -100,58 +111,187 @@ def plan_new_partitions(
     return op_samples, recipes
 
 
-Subsets = list[list[str]]
+class PositionSet:
+    """Subset positions that can be drawn uniformly at random.
+
+    Positions are kept in a compact list, with their index in a dict, so
+    that adding, removing and drawing are all O(1): a removed position is
+    replaced by the last one in the list.
+    """
+
+    def __init__(self, items: list[int], index: dict[int, int]):
+        self.items = items
+        self.index = index
+
+    @classmethod
+    def from_positions(cls, positions: list[int]) -> "PositionSet":
+        return cls(positions, {item: i for i, item in enumerate(positions)})
+
+    def copy(self) -> "PositionSet":
+        return PositionSet(list(self.items), dict(self.index))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item: int):
+        self.index[item] = len(self.items)
+        self.items.append(item)
+
+    def discard(self, item: int):
+        i = self.index.pop(item, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if last != item:
+            self.items[i] = last
+            self.index[last] = i
+
+    def choice(self, rng: np.random.Generator) -> int:
+        return self.items[int(rng.integers(len(self.items)))]
+
+
+class Partition:
+    """A partition of individuals held as arrays, for cheap perturbation.
+
+    Individuals are referred to by their index in `individuals`, which is
+    shared by every copy. `labels` maps each individual to the position of
+    its subset, and `subsets` holds the member indices of each subset, in
+    output order. Merged-away subsets leave a None behind, so positions never
+    shift and no label has to be rewritten outside the subsets involved.
+
+    Member arrays are replaced, never modified in place, which lets copies
+    share them: a copy is one array copy plus a list of references.
+    """
+
+    def __init__(
+        self,
+        individuals: list[str],
+        labels: np.ndarray,
+        subsets: list[np.ndarray | None],
+        live: PositionSet,
+        splittable: PositionSet,
+    ):
+        self.individuals = individuals
+        self.labels = labels
+        self.subsets = subsets
+        self.live = live
+        self.splittable = splittable
+
+    @classmethod
+    def from_subsets(cls, subsets: list[list[str]]) -> "Partition":
+        individuals = [individual for members in subsets for individual in members]
+        labels = np.empty(len(individuals), dtype=np.int32)
+        arrays = []
+        start = 0
+        for position, members in enumerate(subsets):
+            stop = start + len(members)
+            labels[start:stop] = position
+            arrays.append(np.arange(start, stop, dtype=np.int32))
+            start = stop
+        live = PositionSet.from_positions(list(range(len(subsets))))
+        splittable = PositionSet.from_positions(
+            [position for position, members in enumerate(subsets) if len(members) >= 2]
+        )
+        return cls(individuals, labels, arrays, live, splittable)
+
+    def copy(self) -> "Partition":
+        return Partition(
+            self.individuals,
+            self.labels.copy(),
+            list(self.subsets),
+            self.live.copy(),
+            self.splittable.copy(),
+        )
+
+    def random_subset(self, rng: np.random.Generator, splittable: bool = False) -> int:
+        """Position of a uniformly chosen live subset, or splittable one."""
+        return (self.splittable if splittable else self.live).choice(rng)
+
+    def put(self, position: int, members: np.ndarray):
+        """Fill an empty position with members already labelled for it."""
+        self.subsets[position] = members
+        self.live.add(position)
+        if len(members) >= 2:
+            self.splittable.add(position)
 
+    def append(self, members: np.ndarray):
+        position = len(self.subsets)
+        self.labels[members] = position
+        self.subsets.append(None)
+        self.put(position, members)
 
-def choose_operation(remaining: dict[str, int], rng: random.Random) -> str:
+    def remove(self, position: int) -> np.ndarray:
+        members = self.subsets[position]
+        self.subsets[position] = None
+        self.live.discard(position)
+        self.splittable.discard(position)
+        return members
+
+    def members(self) -> list[np.ndarray]:
+        return [members for members in self.subsets if members is not None]
+
+
+def choose_operation(remaining: dict[str, int], rng: np.random.Generator) -> str:
     """Pick the next operation at random, weighted by how many of each remain.
 
     Weighting by the remaining counts consumes each operation at a rate
     proportional to its total, so the rarer ones are spread across the run
     instead of being exhausted early.
     """
-    operations = [name for name, count in remaining.items() if count > 0]
-    weights = [remaining[name] for name in operations]
-    return rng.choices(operations, weights=weights, k=1)[0]
+    pick = int(rng.integers(sum(remaining.values())))
+    for name, count in remaining.items():
+        if pick < count:
+            return name
+        pick -= count
+    raise ValueError("No operations remain")
 
 
-def split_once(subsets: Subsets, rng: random.Random) -> bool:
+def split_once(partition: Partition, rng: np.random.Generator) -> bool:
     """Split a random subset (with >= 2 individuals) at a random point."""
-    candidates = [i for i, members in enumerate(subsets) if len(members) >= 2]
-    if not candidates:
+    if not partition.splittable:
         return False
 
-    members = subsets[rng.choice(candidates)]
-    rng.shuffle(members)
-    cut = rng.randint(1, len(members) - 1)
-    subsets[subsets.index(members)] = members[:cut]
-    subsets.append(members[cut:])
+    position = partition.random_subset(rng, splittable=True)
+    members = rng.permutation(partition.remove(position))
+    cut = int(rng.integers(1, len(members)))
+    # The first part keeps its place, the second goes to the end.
+    partition.put(position, members[:cut])
+    partition.append(members[cut:])
     return True
 
 
-def merge_once(subsets: Subsets, rng: random.Random) -> bool:
+def merge_once(partition: Partition, rng: np.random.Generator) -> bool:
     """Merge two random subsets into one."""
-    if len(subsets) < 2:
+    if len(partition.live) < 2:
         return False
 
-    i, j = rng.sample(range(len(subsets)), 2)
-    merged = subsets[i] + subsets[j]
-    for index in sorted((i, j), reverse=True):
-        subsets.pop(index)
-    subsets.append(merged)
+    i = partition.random_subset(rng)
+    j = partition.random_subset(rng)
+    while j == i:
+        j = partition.random_subset(rng)
+    merged = np.concatenate((partition.remove(i), partition.remove(j)))
+    partition.append(merged)
     return True
 
 
-def swap_once(subsets: Subsets, rng: random.Random) -> bool:
+def swap_once(partition: Partition, rng: np.random.Generator) -> bool:
     """Swap two random individuals, regardless of which subset they are in."""
-    positions = [
-        (si, ii) for si, members in enumerate(subsets) for ii in range(len(members))
-    ]
-    if len(positions) < 2:
+    count = len(partition.labels)
+    if count < 2:
         return False
 
-    (sa, ia), (sb, ib) = rng.sample(positions, 2)
-    subsets[sa][ia], subsets[sb][ib] = subsets[sb][ib], subsets[sa][ia]
+    a, b = rng.choice(count, size=2, replace=False)
+    sa, sb = int(partition.labels[a]), int(partition.labels[b])
+    if sa == sb:
+        return True
+
+    members_a = partition.subsets[sa].copy()
+    members_b = partition.subsets[sb].copy()
+    members_a[members_a == a] = b
+    members_b[members_b == b] = a
+    partition.subsets[sa] = members_a
+    partition.subsets[sb] = members_b
+    partition.labels[a], partition.labels[b] = sb, sa
     return True
 
 
@@ -159,18 +299,150 @@ OPERATIONS = {"split": split_once, "merge": merge_once, "swap": swap_once}
 
 
 def apply_recipe(
-    base_subsets: Subsets, recipe: dict[str, int], rng: random.Random
-) -> Subsets:
-    """Apply a recipe's operations, in random order, to a copy of the subsets."""
-    subsets = [list(members) for members in base_subsets]
+    base: Partition, recipe: dict[str, int], rng: np.random.Generator
+) -> Partition:
+    """Apply a recipe's operations, in random order, to a copy of the base."""
+    partition = base.copy()
     remaining = {name: recipe.get(name, 0) for name in OPERATIONS}
 
     while sum(remaining.values()) > 0:
         name = choose_operation(remaining, rng)
-        OPERATIONS[name](subsets, rng)
+        OPERATIONS[name](partition, rng)
         remaining[name] -= 1
 
-    return subsets
+    return partition
+
+
+def canonical_labels(labels: np.ndarray) -> np.ndarray:
+    """Subset labels of a partition, numbered in the order subsets are first
+    met when walking the individuals in index order.
+
+    Unassigned individuals are labelled -1 and stay so. Two partitions get
+    the same labels exactly when they group the same individuals, however
+    their subsets were ordered or named. Labels are small integers, so the
+    first individual of each subset is found in one unbuffered pass rather
+    than by sorting all of them.
+    """
+    canonical = np.full(len(labels), -1, dtype=np.int32)
+    assigned = np.flatnonzero(labels >= 0)
+    if not len(assigned):
+        return canonical
+    values = labels[assigned]
+    first = np.full(values.max() + 1, len(labels), dtype=np.int64)
+    np.minimum.at(first, values, assigned)
+    used = np.flatnonzero(first < len(labels))
+    rank = np.empty(len(first), dtype=np.int32)
+    rank[used[np.argsort(first[used])]] = np.arange(len(used), dtype=np.int32)
+    canonical[assigned] = rank[values]
+    return canonical
+
+
+def canonical_key(labels: np.ndarray) -> bytes:
+    """Digest of canonical labels, for telling partitions apart."""
+    return hashlib.blake2b(labels.tobytes(), digest_size=16).digest()
+
+
+def get_members(labels: np.ndarray) -> list[np.ndarray]:
+    """Indices of the individuals in each subset of canonical labels, in
+    index order. Sort keys are unique, so no stable sort is needed."""
+    assigned = np.flatnonzero(labels >= 0)
+    values = labels[assigned]
+    order = assigned[np.argsort(values.astype(np.int64) * len(labels) + assigned)]
+    counts = np.bincount(values)
+    return np.split(order, np.cumsum(counts)[:-1])
+
+
+def get_spartition_labels(
+    spart, spartition: str, individual_ids: dict[str, int]
+) -> np.ndarray:
+    """Canonical labels of a spartition read from a Spart."""
+    labels = np.full(len(individual_ids), -1, dtype=np.int32)
+    for number, subset in enumerate(spart.getSpartitionSubsets(spartition)):
+        individuals = spart.getSubsetIndividuals(spartition, subset)
+        labels[[individual_ids[individual] for individual in individuals]] = number
+    return canonical_labels(labels)
+
+
+def generate_partition(
+    job: tuple[dict[str, int], np.random.SeedSequence],
+    base: Partition,
+    ids: np.ndarray,
+    size: int,
+) -> tuple[np.ndarray, bytes]:
+    """Apply one recipe with its own random stream, for use on a worker pool.
+
+    `ids` maps the individuals of the base to indices among all `size`
+    individuals of the file. The subset of each is scattered through it and
+    made canonical, and only that one label vector is sent back, along with
+    its key, without going through the subsets one by one.
+    """
+    recipe, seed = job
+    partition = apply_recipe(base, recipe, np.random.default_rng(seed))
+    labels = np.full(size, -1, dtype=np.int32)
+    labels[ids] = partition.labels
+    labels = canonical_labels(labels)
+    return labels, canonical_key(labels)
+
+
+def generate_unique(
+    base: Partition,
+    ids: np.ndarray,
+    size: int,
+    recipes: list[dict[str, int]],
+    streams: list[np.random.SeedSequence],
+    seen: set[bytes],
+    workers: int,
+) -> tuple[list[np.ndarray | None], int]:
+    """Generate one partition per recipe, none of them already in `seen`.
+
+    Duplicates are drawn again with the same recipe, from a stream spawned
+    off the original one, for up to MAX_RESAMPLE_ROUNDS rounds. Keys are
+    checked in recipe order, so the result does not depend on the number of
+    workers. Returns the canonical labels of the partitions, None for those
+    that never came out unique, and the number of duplicates rejected.
+    """
+    generate = partial(generate_partition, base=base, ids=ids, size=size)
+    results: list[np.ndarray | None] = [None] * len(recipes)
+    pending = [index for index, recipe in enumerate(recipes) if recipe]
+    jobs = [(recipes[index], streams[index]) for index in pending]
+    # Recipes without operations can only ever reproduce the base.
+    rejected = len(recipes) - len(pending)
+
+    for _ in range(MAX_RESAMPLE_ROUNDS):
+        if not pending:
+            break
+        outputs = pool_map(generate, jobs, workers, min_items=PARALLEL_MIN_PARTITIONS)
+        retry = []
+        for index, (labels, key) in zip(pending, outputs):
+            if key in seen:
+                retry.append(index)
+                rejected += 1
+                continue
+            seen.add(key)
+            results[index] = labels
+        pending = retry
+        jobs = [(recipes[index], streams[index].spawn(1)[0]) for index in pending]
+
+    return results, rejected
+
+
+def add_partition(spart, label: str, subsets: list[list[str]]):
+    """Append a spartition by building its entry in the SPART dictionary,
+    as reduce_spart in the Profile task does.
+
+    Spart.addSubset goes through every spartition on each call, which gets
+    quadratic over many new partitions. The entry holds the same keys the
+    Spart methods would give it.
+    """
+    spartitions = spart.spartDict["spartitions"]
+    spartitions[str(len(spartitions) + 1)] = {
+        "subsets": {
+            str(number): {"individuals": {individual: {} for individual in members}}
+            for number, members in enumerate(subsets, start=1)
+        },
+        "label": label,
+        "remarks": None,
+    }
 
 
 def initialize():
@@ -211,17 +483,40 @@ def execute(
     split_count: int,
     swap_count: int,
     spread: float,
+    seed: int = -1,
+    workers: int = 0,
 ) -> Results:
     from itaxotools.spart_parser import Spart
 
     ts = perf_counter()
+    recorder = StageRecorder()
 
-    rng = random.Random()
+    # Planning and every new partition each get an independent stream, so
+    # the output for a given seed does not depend on the number of workers.
+    root = np.random.SeedSequence(None if seed < 0 else seed)
 
-    spart = Spart.fromXML(input_path)
-    spartitions = spart.getSpartitions()
+    with recorder.stage("Read") as counters:
+        spart = Spart.fromXML(input_path)
+        spartitions = spart.getSpartitions()
+        counters["spartitions"] = len(spartitions)
     used_labels = set(spartitions)
 
+    # Every partition in the output must be unique, old ones included.
+    individual_list = spart.getIndividuals()
+    individual_ids = {
+        individual: index for index, individual in enumerate(individual_list)
+    }
+    size = len(individual_ids)
+    names = np.array(individual_list, dtype=object)
+    seen: set[bytes] = set()
+    with recorder.stage("Index existing") as counters:
+        for spartition in spartitions:
+            labels = get_spartition_labels(spart, spartition, individual_ids)
+            seen.add(canonical_key(labels))
+        counters["unique"] = len(seen)
+    total_rejected = 0
+    total_missing = 0
+
     def unique_label(base: str) -> str:
         label = base
         suffix = 2
@@ -233,6 +528,7 @@ def execute(
 
     print(f"Spart file: {input_path.name}")
     print(f"Selected partitions: {len(selected_partitions)}")
+    print(f"Seed: {seed if seed >= 0 else 'random'}")
     print()
 
     for spartition in spartitions:
@@ -244,13 +540,15 @@ def execute(
         if add_partitions <= 0:
             continue
 
+        planning, *streams = root.spawn(add_partitions + 1)
+
         operation_totals = {
             "split": split_count,
             "merge": merge_count,
             "swap": swap_count,
         }
         op_samples, recipes = plan_new_partitions(
-            add_partitions, operation_totals, rng, spread
+            add_partitions, operation_totals, np.random.default_rng(planning), spread
         )
 
         for name, samples in op_samples.items():
@@ -258,33 +556,57 @@ def execute(
                 f"  {name}: {samples} (target {operation_totals[name]}, sum {sum(samples)})"
             )
 
-        base_subsets = [
-            list(spart.getSubsetIndividuals(spartition, subset))
-            for subset in spart.getSpartitionSubsets(spartition)
-        ]
+        base = Partition.from_subsets(
+            [
+                list(spart.getSubsetIndividuals(spartition, subset))
+                for subset in spart.getSpartitionSubsets(spartition)
+            ]
+        )
 
-        print(f"  New partitions ({len(recipes)}):")
-        for recipe in recipes:
-            subsets = apply_recipe(base_subsets, recipe, rng)
+        ids = np.array(
+            [individual_ids[individual] for individual in base.individuals],
+            dtype=np.int64,
+        )
+        with recorder.stage("Generate") as counters:
+            generated, rejected = generate_unique(
+                base, ids, size, recipes, streams, seen, workers
+            )
+            missing = sum(labels is None for labels in generated)
+            counters["partitions"] += len(recipes) - missing
+            counters["duplicates_rejected"] += rejected
+        total_rejected += rejected
+        total_missing += missing
+
+        print(f"  Duplicates rejected: {rejected}")
+        if missing:
+            print(f"  Could not find a unique partition for {missing} recipes")
+
+        print(f"  New partitions ({len(recipes) - missing}):")
+        for recipe, labels in zip(recipes, generated):
+            if labels is None:
+                continue
+            subsets = [names[members].tolist() for members in get_members(labels)]
             counts = "_".join(
                 f"{name}_{recipe.get(name, 0)}" for name in ("merge", "split", "swap")
             )
             label = unique_label(f"{spartition}_{counts}")
 
-            spart.addSpartition(label)
-            for number, members in enumerate(subsets, start=1):
-                spart.addSubset(label, str(number))
-                for individual in members:
-                    spart.addSubsetIndividual(label, str(number), individual)
+            add_partition(spart, label, subsets)
 
-            summary = (
-                ", ".join(f"{name}={count}" for name, count in recipe.items())
-                or "copy (no operations)"
-            )
+            summary = ", ".join(f"{name}={count}" for name, count in recipe.items())
             print(f"    {label}: {len(subsets)} subsets ({summary})")
 
-    spart.toXML(output_path)
+    print()
+    print(f"Duplicates rejected: {total_rejected}")
+    if total_missing:
+        print(f"Partitions left out as duplicates: {total_missing}")
+
+    with recorder.stage("Write"):
+        spart.toXML(output_path)
 
     tf = perf_counter()
 
-    return Results(output_path, tf - ts)
+    stages = recorder.get_stages()
+    print_stages(stages)
+
+    return Results(output_path, tf - ts, stages)
@@ -232,6 +232,26 @@ class ReshuffleOptionsCard(Card):
 
         self.controls["spread"] = spread_field
 
+        seed_row = spread_row + 1
+        seed_label = QtWidgets.QLabel("Seed:")
+        seed_label.setMinimumWidth(90)
+
+        seed_field = GSpinBox()
+        seed_field.setFixedWidth(120)
+        seed_field.setMinimum(-1)
+        seed_field.setMaximum(2147483647)
+
+        seed_hint = QtWidgets.QLabel(
+            "Fixed seed for reproducible partitions, or -1 for a random seed."
+        )
+        seed_hint.setStyleSheet("""color: Palette(Shadow);""")
+
+        grid.addWidget(seed_label, seed_row, 0)
+        grid.addWidget(seed_field, seed_row, 1)
+        grid.addWidget(seed_hint, seed_row, 2)
+
+        self.controls["seed"] = seed_field
+
         layout = QtWidgets.QVBoxLayout()
         layout.setSpacing(12)
         layout.addWidget(title)
@@ -310,6 +330,10 @@ class View(BlastTaskView):
         self.binder.bind(object.properties.spread, spread_field.setValue)
         self.binder.bind(spread_field.valueChangedSafe, object.properties.spread)
 
+        seed_field = self.cards.options.controls["seed"]
+        self.binder.bind(object.properties.seed, seed_field.setValue)
+        self.binder.bind(seed_field.valueChangedSafe, object.properties.seed)
+
         self.binder.bind(object.properties.editable, self.setEditable)
 
     def setEditable(self, editable: bool):
@@ -1,9 +1,18 @@
-from resources import task_pixmaps_large, task_pixmaps_medium
-
 title = "Visualize"
 description = "Display spartitions"
 
-pixmap = task_pixmaps_large.about
-pixmap_medium = task_pixmaps_medium.about
-
 long_description = "Display spartitions."
+
+
+def __getattr__(name: str):
+    # Pixmaps are only loaded on demand, since they pull in Qt,
+    # which the command line runner does without. Any other name fails
+    # before that, so probing for submodules does not load Qt either.
+    if name not in ("pixmap", "pixmap_medium"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from resources import task_pixmaps_large, task_pixmaps_medium
+
+    if name == "pixmap":
+        return task_pixmaps_large.about
+    return task_pixmaps_medium.about
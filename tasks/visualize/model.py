@@ -3,6 +3,7 @@ from pathlib import Path
 from itaxotools.common.bindings import Property
 from itaxotools.taxi_gui.threading import ReportDone
 from . import process, title
+from .types import SubsetMatrix
 from ..common.model import BlastTaskModel
 from itaxotools.taxi_gui.model.tasks import SubtaskModel
 
@@ -12,7 +13,7 @@ class Model(BlastTaskModel):
 
     concordance_path = Property(Path, Path())
     individual_list = Property(list, [])
-    subset_table = Property(dict, [])
+    subset_matrix = Property(SubsetMatrix, None)
     score_table = Property(dict, [])
 
     def __init__(self, name=None):
@@ -37,7 +38,7 @@ class Model(BlastTaskModel):
 
     def onDone(self, report: ReportDone):
         self.individual_list = report.result.individual_list
-        self.subset_table = report.result.subset_table
+        self.subset_matrix = report.result.subset_matrix
         self.score_table = report.result.score_table
         self.report_results.emit(self.task_name, report.result)
         self.busy = False
@@ -2,13 +2,54 @@ from __future__ import annotations
 
 from typing import NamedTuple
 
+import numpy as np
+
+from ..common.types import StageStats
+
 
 class Separator:
     """Marks a horizontal separator between score rows."""
 
 
+def get_code_type(count: int) -> np.dtype:
+    """Smallest signed integer type for subset codes from -1 up to count - 1."""
+    return np.min_scalar_type(-max(count, 1))
+
+
+class SubsetMatrix(NamedTuple):
+    """Subset of each individual in each spartition, encoded compactly.
+
+    Row i of the matrix holds the index of the subset of every individual
+    in `labels[i]`, or -1 for individuals that belong to no subset. The
+    matrix uses the smallest integer type that fits, so the whole table
+    is a single buffer when sent over from the worker.
+    """
+
+    spartitions: list[str]
+    labels: list[list[str]]
+    matrix: np.ndarray
+
+    @classmethod
+    def from_table(
+        cls, individuals: list[str], subset_table: dict[str, dict[str, str | None]]
+    ) -> SubsetMatrix:
+        """Encode subsets given as one dictionary per spartition."""
+        labels = []
+        codes = np.full((len(subset_table), len(individuals)), -1, dtype=np.int64)
+        for row, subsets in enumerate(subset_table.values()):
+            lookup = {}
+            for column, individual in enumerate(individuals):
+                subset = subsets.get(individual, None)
+                if subset is not None:
+                    codes[row, column] = lookup.setdefault(subset, len(lookup))
+            labels.append(list(lookup))
+        count = max((len(row) for row in labels), default=0)
+        return cls(list(subset_table), labels, codes.astype(get_code_type(count)))
+
+
 class Results(NamedTuple):
     individual_list: list[str]
-    subset_table: dict[str, dict[str, str]]
+    subset_matrix: SubsetMatrix
     score_table: dict[str, dict[str, float | bool]]
     seconds_taken: float
+    stages: tuple[StageStats, ...] = ()
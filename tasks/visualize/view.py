@@ -1,12 +1,16 @@
 from PySide6 import QtCore, QtWidgets, QtGui
 
+from collections import OrderedDict
+from math import ceil, floor, gcd
 from pathlib import Path
 
+import numpy as np
+
 from itaxotools.taxi_gui import app
 from itaxotools.taxi_gui.view.tasks import TaskView
 
 from ..common.types import column_label
-from .types import Results, Separator
+from .types import Results, Separator, SubsetMatrix
 
 
 class InstantTooltipTextItem(QtWidgets.QGraphicsTextItem):
@@ -21,24 +25,211 @@ class InstantTooltipTextItem(QtWidgets.QGraphicsTextItem):
         super().hoverEnterEvent(event)
 
 
-class RowOverlay(QtWidgets.QGraphicsRectItem):
-    def __init__(self, rect, parent=None):
-        super().__init__(rect, parent)
-        self.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0, 0)))
+def get_visible_range(start: float, end: float, step: float, count: int):
+    """Indices of the rows or columns of size `step` that overlap the span."""
+    first = max(0, floor(start / step))
+    last = min(count, floor(end / step) + 1)
+    return first, last
+
+
+class IndividualLabels(QtWidgets.QGraphicsItem):
+    """Names of the individuals, one per row. Only names in view are drawn,
+    and only once zoomed in far enough for them to be read."""
+
+    margin = 4
+    min_readable_height = 8
+
+    def __init__(
+        self, names: list[str], font: QtGui.QFont, width: float, y_step: float
+    ):
+        super().__init__()
+        self.names = names
+        self.font = font
+        self.width = width
+        self.y_step = y_step
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self) -> QtCore.QRectF:
+        width = self.width + 2 * self.margin
+        return QtCore.QRectF(0, 0, width, len(self.names) * self.y_step)
+
+    def paint(self, painter: QtGui.QPainter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod * self.y_step < self.min_readable_height:
+            return
+        exposed = option.exposedRect
+        first, last = get_visible_range(
+            exposed.top(), exposed.bottom(), self.y_step, len(self.names)
+        )
+        flags = QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter
+        painter.setFont(self.font)
+        for row in range(first, last):
+            rect = QtCore.QRectF(
+                self.margin, row * self.y_step, self.width, self.y_step
+            )
+            painter.drawText(rect, flags, self.names[row])
+
+
+class RowHighlight(QtWidgets.QGraphicsRectItem):
+    """Shades the row under the mouse across the whole width of the matrix."""
+
+    def __init__(self, rows: int, width: float, y_step: float):
+        super().__init__(QtCore.QRectF(0, 0, width, rows * y_step))
+        self.y_step = y_step
         self.setPen(QtCore.Qt.NoPen)
+        self.setBrush(QtCore.Qt.NoBrush)
         self.setAcceptHoverEvents(True)
 
-    def hoverEnterEvent(self, event):
-        self.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0, 50)))
-        self.setPen(QtCore.Qt.NoPen)
-        super().hoverEnterEvent(event)
+        self.shade = QtWidgets.QGraphicsRectItem(self)
+        self.shade.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0, 50)))
+        self.shade.setPen(QtCore.Qt.NoPen)
+        self.shade.hide()
 
-    def hoverLeaveEvent(self, event):
-        self.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0, 0)))
-        self.setPen(QtCore.Qt.NoPen)
+    def hoverMoveEvent(self, event: QtWidgets.QGraphicsSceneHoverEvent):
+        row = floor(event.pos().y() / self.y_step)
+        width = self.rect().width()
+        self.shade.setRect(QtCore.QRectF(0, row * self.y_step, width, self.y_step))
+        self.shade.show()
+        super().hoverMoveEvent(event)
+
+    def hoverLeaveEvent(self, event: QtWidgets.QGraphicsSceneHoverEvent):
+        self.shade.hide()
         super().hoverLeaveEvent(event)
 
 
+class ColorMatrix(QtWidgets.QGraphicsItem):
+    """Subsets of all spartitions as coloured columns, one row per individual.
+
+    Cells are painted from images holding one pixel row per individual,
+    scaled up to the scene. Images are made for tiles of rows as they come
+    into view and kept for a while. Once rows are smaller than a pixel, a
+    single overview image with a sample of the rows is used instead, and
+    outlines are left out once columns get too narrow. The cost of a
+    repaint depends on the viewport, not on the size of the matrix.
+    """
+
+    tile_rows = 256
+    tile_cache_size = 64
+    overview_rows = 2048
+    min_outlined_width = 8
+
+    def __init__(
+        self,
+        colors: np.ndarray,
+        color_table: list[int],
+        col_width: int,
+        col_spacing: int,
+        y_step: int,
+    ):
+        super().__init__()
+        self.colors = colors
+        self.color_table = color_table + [0]
+        self.transparent = len(color_table)
+        self.col_width = col_width
+        self.pitch = col_width + col_spacing
+        self.y_step = y_step
+
+        unit = gcd(col_width, col_spacing)
+        self.cell_pixels = col_width // unit
+        self.pitch_pixels = self.pitch // unit
+
+        self._tiles: OrderedDict[int, QtGui.QImage] = OrderedDict()
+        self._overview: QtGui.QImage | None = None
+
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self) -> QtCore.QRectF:
+        rows, columns = self.colors.shape
+        width = columns * self.pitch - (self.pitch - self.col_width)
+        return QtCore.QRectF(0, 0, width, rows * self.y_step)
+
+    def _get_image(self, colors: np.ndarray) -> QtGui.QImage:
+        rows, columns = colors.shape
+        pixels = np.full(
+            (rows, columns, self.pitch_pixels), self.transparent, dtype=np.uint8
+        )
+        pixels[:, :, : self.cell_pixels] = colors[:, :, np.newaxis]
+        width = columns * self.pitch_pixels
+        image = QtGui.QImage(
+            pixels.tobytes(), width, rows, width, QtGui.QImage.Format_Indexed8
+        )
+        image.setColorTable(self.color_table)
+        return image.copy()
+
+    def _get_tile(self, tile: int) -> QtGui.QImage:
+        if tile in self._tiles:
+            self._tiles.move_to_end(tile)
+            return self._tiles[tile]
+        start = tile * self.tile_rows
+        image = self._get_image(self.colors[start : start + self.tile_rows])
+        self._tiles[tile] = image
+        if len(self._tiles) > self.tile_cache_size:
+            self._tiles.popitem(last=False)
+        return image
+
+    def _get_overview(self) -> QtGui.QImage:
+        if self._overview is None:
+            stride = ceil(len(self.colors) / self.overview_rows)
+            self._overview = self._get_image(self.colors[::stride])
+        return self._overview
+
+    def _draw_image(
+        self,
+        painter: QtGui.QPainter,
+        image: QtGui.QImage,
+        top: float,
+        height: float,
+        columns: tuple[int, int],
+    ):
+        first, last = columns
+        target = QtCore.QRectF(
+            first * self.pitch, top, (last - first) * self.pitch, height
+        )
+        source = QtCore.QRectF(
+            first * self.pitch_pixels,
+            0,
+            (last - first) * self.pitch_pixels,
+            image.height(),
+        )
+        painter.drawImage(target, image, source)
+
+    def paint(self, painter: QtGui.QPainter, option, widget=None):
+        rows, columns = self.colors.shape
+        exposed = option.exposedRect
+        visible_columns = get_visible_range(
+            exposed.left(), exposed.right(), self.pitch, columns
+        )
+        if visible_columns[0] >= visible_columns[1]:
+            return
+
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod * self.y_step < 1:
+            image = self._get_overview()
+            self._draw_image(painter, image, 0, rows * self.y_step, visible_columns)
+        else:
+            first, last = get_visible_range(
+                exposed.top(), exposed.bottom(), self.y_step, rows
+            )
+            for tile in range(
+                first // self.tile_rows, (last - 1) // self.tile_rows + 1
+            ):
+                image = self._get_tile(tile)
+                top = tile * self.tile_rows * self.y_step
+                height = image.height() * self.y_step
+                self._draw_image(painter, image, top, height, visible_columns)
+
+        if lod * self.col_width < self.min_outlined_width:
+            return
+        painter.setPen(QtGui.QPen(QtCore.Qt.black, 1))
+        painter.setBrush(QtCore.Qt.NoBrush)
+        for column in range(*visible_columns):
+            painter.drawRect(
+                QtCore.QRectF(
+                    column * self.pitch, 0, self.col_width, rows * self.y_step
+                )
+            )
+
+
 class Visualizer(QtWidgets.QGraphicsView):
     _color_list = [
         QtGui.QColor("#e6194b"),  # red
@@ -70,9 +261,9 @@ class Visualizer(QtWidgets.QGraphicsView):
         self.setScene(self._scene)
 
         self.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.setTransformationAnchor(QtWidgets.QGraphicsView.AnchorUnderMouse)
         self.setMinimumSize(500, 400)
 
-        self._palette = {}
         self._font = QtGui.QFont("Arial", 10)  # private font
 
         self.y_step = 24
@@ -81,45 +272,29 @@ class Visualizer(QtWidgets.QGraphicsView):
         self.col_width = 60
         self.col_spacing = 20
 
-    def _get_color_for_group(self, group: str) -> QtGui.QColor:
-        if group not in self._palette:
-            index = len(self._palette) % len(self._color_list)
-            self._palette[group] = self._color_list[index]
-        return self._palette[group]
-
-    def _draw_individual_list(self, individuals: list[str]):
-        y = 0
-        individual_label_items = []
-
-        self._palette.clear()
+        self.zoom_step = 1.25
+        self.zoom_range = (0.001, 10.0)
 
-        for name in individuals:
-            label_item = QtWidgets.QGraphicsTextItem(name)
-            label_item.setFont(self._font)
-            label_item.setPos(0, y)
-            self._scene.addItem(label_item)
-            individual_label_items.append(label_item)
-
-            y += self.y_step
-
-    def _draw_spartition_column(
-        self, col_x: float, individuals: list[str], subset: dict[str, str]
-    ):
-        self._palette.clear()
-        y = 0
-
-        for name in individuals:
-            group = subset.get(name, "Unknown")
-            color = self._get_color_for_group(group)
-            rect = QtCore.QRectF(col_x, y, self.col_width, self.y_step)
-            self._scene.addRect(rect, QtCore.Qt.NoPen, QtGui.QBrush(color))
-
-            y += self.y_step
-
-        outline_rect = QtCore.QRectF(col_x, 0, self.col_width, y)
-        self._scene.addRect(
-            outline_rect, QtGui.QPen(QtCore.Qt.black, 1), QtCore.Qt.NoBrush
-        )
+    def wheelEvent(self, event: QtGui.QWheelEvent):
+        if not event.modifiers() & QtCore.Qt.ControlModifier:
+            super().wheelEvent(event)
+            return
+        factor = self.zoom_step ** (event.angleDelta().y() / 120)
+        zoom = self.transform().m11() * factor
+        if self.zoom_range[0] <= zoom <= self.zoom_range[1]:
+            self.scale(factor, factor)
+        event.accept()
+
+    def _get_color_indices(self, subsets: SubsetMatrix) -> np.ndarray:
+        """Colour of each individual in each spartition, as an index into
+        the colour list. Subsets are coloured in order of appearance."""
+        colors = np.empty(subsets.matrix.shape[::-1], dtype=np.uint8)
+        for column, codes in enumerate(subsets.matrix):
+            _, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+            order = np.empty(len(first), dtype=np.int64)
+            order[np.argsort(first)] = np.arange(len(first))
+            colors[:, column] = order[inverse] % len(self._color_list)
+        return colors
 
     def _draw_scores(self, col_x: float, top_y: float, scores: dict[str, float | bool]):
         y = -self.y_step - self.padding_y
@@ -177,17 +352,10 @@ class Visualizer(QtWidgets.QGraphicsView):
         )
         self._scene.addItem(title_item)
 
-    def _add_row_hover_overlays(self, individual_list: list[str], total_width: float):
-        for row_index, _ in enumerate(individual_list):
-            rect = QtCore.QRectF(0, row_index * self.y_step, total_width, self.y_step)
-            overlay = RowOverlay(rect)
-
-            self._scene.addItem(overlay)
-
     def set_data(
         self,
         individual_list: list[str],
-        subset_table: dict[str, dict[str, str]],
+        subsets: SubsetMatrix,
         score_table: dict[str, dict[str, float | bool]],
     ):
         self._scene.clear()
@@ -198,17 +366,30 @@ class Visualizer(QtWidgets.QGraphicsView):
         )
         col_x = max_name_width + self.padding_x
 
-        self._draw_individual_list(individual_list)
-        total_overlay_width = col_x + len(subset_table) * (
+        total_width = col_x + len(subsets.spartitions) * (
             self.col_width + self.col_spacing
         )
-        self._add_row_hover_overlays(individual_list, total_overlay_width)
+        self._scene.addItem(
+            IndividualLabels(individual_list, self._font, max_name_width, self.y_step)
+        )
+        self._scene.addItem(
+            RowHighlight(len(individual_list), total_width, self.y_step)
+        )
 
-        for index, spartition in enumerate(subset_table):
-            subset = subset_table[spartition]
+        if subsets.spartitions:
+            matrix = ColorMatrix(
+                self._get_color_indices(subsets),
+                [color.rgba() for color in self._color_list],
+                self.col_width,
+                self.col_spacing,
+                self.y_step,
+            )
+            matrix.setPos(col_x, 0)
+            self._scene.addItem(matrix)
+
+        for index, spartition in enumerate(subsets.spartitions):
             scores = score_table.get(spartition, {})
 
-            self._draw_spartition_column(col_x, individual_list, subset)
             y = self._draw_scores(col_x, 0, scores)
             self._draw_column_title(col_x, y, spartition, index)
 
@@ -240,7 +421,7 @@ class View(TaskView):
     def report_results(self, task_name: str, results: Results):
         self.viz.set_data(
             results.individual_list,
-            results.subset_table,
+            results.subset_matrix,
             results.score_table,
         )
 
@@ -0,0 +1,193 @@
+"""Invariants the performance work relies on: parallel runs match serial
+ones, seeds fix the output, and the fast paths agree with the slow ones."""
+
+import os
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from tasks.common.process import (
+    build_spart_index,
+    load_spart_index,
+    read_spart_element,
+    store_spart_index,
+)
+from tasks.review.process import ScoreFilter, get_borda_ranks, get_pareto_fronts
+from tasks.review.types import SCORE_COLUMNS, ScoreTable
+from tasks.score.types import BootstrapMode
+
+EXAMPLES = Path(__file__).parent.parent / "examples"
+SPART_PATH = EXAMPLES / "Lygodactylus_ASAP16S.xml"
+CONCORDANCES_PATH = EXAMPLES / "Lygodactylus_ASAP16S_concordances.xml"
+
+
+def brute_pareto_fronts(values: np.ndarray) -> np.ndarray:
+    fronts = np.full(len(values), np.nan)
+    remaining = set(np.flatnonzero(~np.isnan(values).any(axis=1)))
+    front = 1
+    while remaining:
+        current = [
+            i
+            for i in remaining
+            if not any(
+                (values[j] <= values[i]).all() and (values[j] < values[i]).any()
+                for j in remaining
+            )
+        ]
+        for i in current:
+            fronts[i] = front
+            remaining.discard(i)
+        front += 1
+    return fronts
+
+
+def brute_borda_ranks(values: np.ndarray) -> np.ndarray:
+    points = np.zeros(len(values))
+    for column in values.T:
+        for i, j in product(range(len(values)), repeat=2):
+            a, b = column[i], column[j]
+            if i == j or np.isnan(a):
+                points[i] += 0.5 * (i != j and np.isnan(b))
+            elif np.isnan(b) or a < b:
+                points[i] += 1
+            elif a == b:
+                points[i] += 0.5
+    return np.array([1 + np.sum(points > total) for total in points], dtype=float)
+
+
+def random_scores(rng: np.random.Generator, rows: int, columns: int) -> np.ndarray:
+    """Few distinct values, so that ties and missing scores are common."""
+    values = rng.integers(0, 5, (rows, columns)).astype(float)
+    values[rng.random((rows, columns)) < 0.05] = np.nan
+    return values
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_pareto_fronts_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    values = random_scores(rng, rng.integers(1, 60), rng.integers(1, 6))
+    assert np.array_equal(
+        get_pareto_fronts(values), brute_pareto_fronts(values), equal_nan=True
+    )
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_borda_ranks_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    values = random_scores(rng, rng.integers(1, 30), rng.integers(1, 4))
+    assert np.array_equal(get_borda_ranks(values), brute_borda_ranks(values))
+
+
+def make_scores() -> ScoreTable:
+    columns = {
+        column.name: np.full(4, np.nan) for column in SCORE_COLUMNS if column.key
+    }
+    columns["Nsub"] = np.array([2.0, 6.0, 12.0, 20.0])
+    columns["BayesPP"] = np.array([0.01, 0.5, 0.3, np.nan])
+    columns["CSWm"] = np.array([0.0, 0.2, np.nan, 0.9])
+    columns["CC"] = np.array([1.0, 1.0, 0.0, np.nan])
+    return ScoreTable(["a", "b", "c", "d"], columns)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("BayesPP > 0.05", [False, True, True, False]),
+        ("bayespp <= 0.3", [True, False, True, False]),
+        ("Nsub between 5 and 12", [False, True, True, False]),
+        (
+            "BayesPP > 0.05 and Nsub between 5 and 12 and CC",
+            [False, True, False, False],
+        ),
+        ("not CC", [False, False, True, True]),
+        ("CSWm", [False, True, False, True]),
+        ("CSWm is missing", [False, False, True, False]),
+        ("CSWm is not missing or Nsub = 12", [True, True, True, True]),
+        ("not (BayesPP > 0.05 or Nsub > 15)", [True, False, False, False]),
+        ("CSWm < BayesPP", [True, True, False, False]),
+        ("BayesPP != 0.5", [True, False, True, False]),
+    ],
+)
+def test_score_filter(text, expected):
+    assert ScoreFilter(text)(make_scores()).tolist() == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "BayesPP >", "Unknown > 1", "Nsub between 5", "(CC", "CC CC", "Nsub ? 3"],
+)
+def test_score_filter_rejects(text):
+    with pytest.raises(ValueError):
+        ScoreFilter(text)
+
+
+def test_spart_index_round_trip(tmp_path):
+    path = tmp_path / SPART_PATH.name
+    path.write_bytes(SPART_PATH.read_bytes())
+
+    index = build_spart_index(path)
+    store_spart_index(path, index)
+    assert load_spart_index(path) == index
+
+    labels = [spartition.label for spartition in index.spartitions]
+    assert labels == [
+        read_spart_element(path, index, spartition).get("label")
+        for spartition in index.spartitions
+    ]
+
+    os.utime(path, ns=(index.mtime_ns + 10**9, index.mtime_ns + 10**9))
+    assert load_spart_index(path) is None
+
+
+def run_score(path: Path, output_path: Path, workers: int, **options) -> bytes:
+    from cli import run_score
+
+    run_score(
+        path,
+        output_path,
+        weights={},
+        evidence_weights={},
+        evidence_behaviours={},
+        conspecific_path=None,
+        heterospecific_path=None,
+        workers=workers,
+        **options,
+    )
+    return output_path.read_bytes()
+
+
+@pytest.mark.parametrize("mode", list(BootstrapMode))
+def test_score_parallel_matches_serial(tmp_path, mode):
+    options = dict(bootstrap_mode=mode, bootstrap_replicates=50, bootstrap_seed=1)
+    serial = run_score(CONCORDANCES_PATH, tmp_path / "serial.xml", 1, **options)
+    parallel = run_score(CONCORDANCES_PATH, tmp_path / "parallel.xml", 2, **options)
+    assert serial == parallel
+
+
+def run_shuffle(output_path: Path, seed: int, workers: int) -> bytes:
+    from itaxotools.spart_parser import Spart
+
+    from tasks.shuffle import process
+
+    process.execute(
+        SPART_PATH,
+        output_path,
+        Spart.fromXML(SPART_PATH).getSpartitions(),
+        20,
+        3,
+        3,
+        3,
+        process.BELL_SIGMA,
+        seed=seed,
+        workers=workers,
+    )
+    return output_path.read_bytes()
+
+
+def test_shuffle_seed_determinism(tmp_path):
+    first = run_shuffle(tmp_path / "first.xml", 7, 1)
+    assert first == run_shuffle(tmp_path / "again.xml", 7, 1)
+    assert first == run_shuffle(tmp_path / "parallel.xml", 7, 2)
+    assert first != run_shuffle(tmp_path / "other.xml", 8, 1)